@@ -0,0 +1,256 @@
+"""
+Chạy hàng loạt ván headless có seed để cân bằng độ khó (settings.DIFFICULTIES).
+Mỗi ván là một job độc lập cho ProcessPoolExecutor, nên tốc độ tăng tuyến tính
+theo số nhân. Kết quả từng ván được ghi ngay ra file JSON Lines; bảng tổng hợp
+chỉ giữ thống kê dạng luồng (đếm, trung bình, histogram) nên bộ nhớ không đổi.
+
+Ví dụ:
+    python batch_sim.py --games 500 --bot greedy --out runs.jsonl
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from settings import TILE_SIZE, DIFFICULTIES, LOGIC_DT
+from map import LEVELS, TILE_PELLET, TILE_POWER
+from player import PlayerInput
+from simulation import Simulation, STATUS_PLAY, STATUS_CLEARED, random_inputs
+
+BOTS = ("random", "greedy")
+
+
+@dataclass
+class Job:
+    diff_idx: int
+    level_idx: int
+    seed: int
+    bot: str
+    max_seconds: float
+    dt: float
+
+
+class GreedyBot:
+    """Bot kịch bản: đi tới pellet gần nhất theo bảng dẫn đường của map."""
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.goal: Optional[Tuple[int, int]] = None
+
+    def input_for(self, sim: Simulation, pl) -> PlayerInput:
+        gmap = sim.gmap
+        px, py = pl.pixel_center()
+        cur = (px // TILE_SIZE, py // TILE_SIZE)
+        if self.goal is None or self.goal == cur or not (gmap.pellet_at(*self.goal) or gmap.power_at(*self.goal)):
+            targets = gmap.tiles_with(TILE_PELLET | TILE_POWER)
+            if not len(targets):
+                return PlayerInput()
+            d = np.abs(targets[:, 0] - cur[0]) + np.abs(targets[:, 1] - cur[1])
+            best = np.flatnonzero(d == d.min())
+            x, y = targets[self.rng.choice(best.tolist())]
+            self.goal = (int(x), int(y))
+        nxt = gmap.nav.next_step(cur, self.goal)
+        if nxt is None:
+            self.goal = None
+            return PlayerInput(*self.rng.choice(((1, 0), (-1, 0), (0, 1), (0, -1))))
+        # bám tâm ô kế tiếp theo trục lệch nhiều hơn
+        dx = nxt[0] * TILE_SIZE + TILE_SIZE // 2 - px
+        dy = nxt[1] * TILE_SIZE + TILE_SIZE // 2 - py
+        if abs(dx) >= abs(dy) and dx:
+            return PlayerInput(1 if dx > 0 else -1, 0)
+        if dy:
+            return PlayerInput(0, 1 if dy > 0 else -1)
+        return PlayerInput()
+
+
+def play_game(job: Job) -> dict:
+    """Chạy một ván headless tới khi thua, qua màn hoặc hết giờ."""
+    rng = random.Random(job.seed ^ 0x5EED)
+    sim = Simulation(job.diff_idx, seed=job.seed)
+    sim.start_level(job.level_idx)
+    total = sim.gmap.pellets_remaining()
+    bots = [GreedyBot(rng) for _ in sim.players] if job.bot == "greedy" else None
+    inputs = random_inputs(rng)
+    max_ticks = int(job.max_seconds / job.dt)
+    for tick in range(max_ticks):
+        if bots:
+            inputs = [bot.input_for(sim, pl) for bot, pl in zip(bots, sim.players)]
+        elif tick % 20 == 0:
+            inputs = random_inputs(rng)
+        sim.step(job.dt, inputs)
+        if sim.status != STATUS_PLAY:
+            break
+    return {
+        "difficulty": DIFFICULTIES[job.diff_idx].name,
+        "level": job.level_idx + 1,
+        "seed": job.seed,
+        "bot": job.bot,
+        "outcome": sim.status if sim.status != STATUS_PLAY else "timeout",
+        "survival_time": round(sim.time, 3),
+        "pellets_cleared": total - sim.gmap.pellets_remaining(),
+        "pellets_total": total,
+        "score": sum(pl.score for pl in sim.players),
+        "ticks": sim.ticks,
+    }
+
+
+@dataclass
+class StreamStat:
+    """Thống kê luồng: trung bình/độ lệch (Welford) và histogram theo bin để lấy phân vị."""
+    bin_width: float
+    n: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+    lo: float = math.inf
+    hi: float = -math.inf
+    bins: Dict[int, int] = field(default_factory=dict)
+
+    def add(self, v: float):
+        self.n += 1
+        d = v - self.mean
+        self.mean += d / self.n
+        self.m2 += d * (v - self.mean)
+        self.lo = min(self.lo, v)
+        self.hi = max(self.hi, v)
+        b = int(v // self.bin_width)
+        self.bins[b] = self.bins.get(b, 0) + 1
+
+    def std(self) -> float:
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+    def quantile(self, q: float) -> float:
+        # trả về cận trên của bin chứa phân vị q (sai số tối đa một bin)
+        need = q * self.n
+        acc = 0
+        for b in sorted(self.bins):
+            acc += self.bins[b]
+            if acc >= need:
+                return min(self.hi, (b + 1) * self.bin_width)
+        return self.hi
+
+
+class GroupStats:
+    def __init__(self):
+        self.survival = StreamStat(1.0)
+        self.pellets = StreamStat(1.0)
+        self.score = StreamStat(50.0)
+        self.outcomes: Dict[str, int] = {}
+
+    def add(self, rec: dict):
+        self.survival.add(rec["survival_time"])
+        self.pellets.add(rec["pellets_cleared"])
+        self.score.add(rec["score"])
+        self.outcomes[rec["outcome"]] = self.outcomes.get(rec["outcome"], 0) + 1
+
+    def summary(self) -> dict:
+        def describe(s: StreamStat) -> dict:
+            return {"mean": round(s.mean, 2), "std": round(s.std(), 2), "min": s.lo,
+                    "p50": s.quantile(0.5), "p90": s.quantile(0.9), "max": s.hi}
+        return {
+            "games": self.survival.n,
+            "outcomes": self.outcomes,
+            "survival_time": describe(self.survival),
+            "pellets_cleared": describe(self.pellets),
+            "score": describe(self.score),
+        }
+
+
+def iter_jobs(args) -> Iterator[Job]:
+    seed = args.seed
+    for d in args.difficulties:
+        for lv in args.levels:
+            for _ in range(args.games):
+                yield Job(d, lv, seed, args.bot, args.max_seconds, args.dt)
+                seed += 1
+
+
+def run_batch(args) -> Dict[Tuple[str, int], GroupStats]:
+    groups: Dict[Tuple[str, int], GroupStats] = {}
+    jobs = iter_jobs(args)
+    total = len(args.difficulties) * len(args.levels) * args.games
+    done = 0
+    t0 = time.perf_counter()
+    # Chỉ giữ một số job đang chạy có giới hạn để không dựng sẵn cả danh sách
+    max_in_flight = args.workers * 4
+    with ProcessPoolExecutor(max_workers=args.workers) as pool, open(args.out, "w", encoding="utf-8") as out:
+        pending = set()
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < max_in_flight:
+                job = next(jobs, None)
+                if job is None:
+                    exhausted = True
+                    break
+                pending.add(pool.submit(play_game, job))
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                rec = fut.result()
+                out.write(json.dumps(rec) + "\n")
+                groups.setdefault((rec["difficulty"], rec["level"]), GroupStats()).add(rec)
+                done += 1
+            if not args.quiet:
+                rate = done / max(1e-9, time.perf_counter() - t0)
+                print(f"\r{done}/{total} games ({rate:.1f} games/s)", end="", flush=True)
+    if not args.quiet:
+        print()
+    return groups
+
+
+def print_report(groups: Dict[Tuple[str, int], GroupStats]):
+    header = f"{'difficulty':<10} {'lvl':>3} {'games':>6} {'clear%':>7} " \
+             f"{'surv p50':>9} {'surv p90':>9} {'pellets':>8} {'score p50':>10} {'score p90':>10}"
+    print(header)
+    print("-" * len(header))
+    for (name, lv), g in groups.items():
+        n = g.survival.n
+        clear = 100.0 * g.outcomes.get(STATUS_CLEARED, 0) / max(1, n)
+        print(f"{name:<10} {lv:>3} {n:>6} {clear:>6.1f}% "
+              f"{g.survival.quantile(0.5):>8.0f}s {g.survival.quantile(0.9):>8.0f}s "
+              f"{g.pellets.mean:>8.1f} {g.score.quantile(0.5):>10.0f} {g.score.quantile(0.9):>10.0f}")
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    names = [d.name.lower() for d in DIFFICULTIES]
+    parser = argparse.ArgumentParser(description="Batch headless simulation for difficulty balancing.")
+    parser.add_argument("--games", type=int, default=100, help="số ván cho mỗi cặp (độ khó, level)")
+    parser.add_argument("--difficulty", action="append", choices=names,
+                        help="chỉ chạy độ khó này (lặp lại được); mặc định tất cả")
+    parser.add_argument("--level", action="append", type=int,
+                        help=f"level 1..{len(LEVELS)} (lặp lại được); mặc định tất cả")
+    parser.add_argument("--bot", choices=BOTS, default="random")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-seconds", type=float, default=180.0, help="giới hạn thời gian mỗi ván (giây game)")
+    parser.add_argument("--dt", type=float, default=LOGIC_DT)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="batch_results.jsonl")
+    parser.add_argument("--summary", help="ghi bảng tổng hợp dạng JSON ra file này")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args(argv)
+    args.difficulties = [names.index(n) for n in args.difficulty] if args.difficulty else list(range(len(DIFFICULTIES)))
+    args.levels = [lv - 1 for lv in args.level] if args.level else list(range(len(LEVELS)))
+    return args
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    groups = run_batch(args)
+    print_report(groups)
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump({f"{name}/L{lv}": g.summary() for (name, lv), g in groups.items()}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
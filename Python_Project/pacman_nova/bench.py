@@ -0,0 +1,781 @@
+"""
+Đo hiệu năng các đường nóng của game (chạy headless, không mở cửa sổ).
+Dùng: python bench.py            -> chạy tất cả các phép so sánh
+      python bench.py ghost_pathing
+      python bench.py swarm      -> horde: từng ghost vs cả đàn (GhostSwarm)
+      python bench.py junctions  -> AI ghost: tra mỗi bước vs chỉ tra ở ngã rẽ
+      python bench.py hpa        -> tìm đường trên mê cung 101..1000 ô: A* vs HPA*
+
+Bộ đo hồi quy (--suite): mỗi phép đo một đường nóng (a_star từng level, Ghost.update
+N ghost, GhostSwarm.update cả đàn, HPA* trên mê cung lớn, hạt 1k/10k, GameMap.draw, draw_hud,
+tổng hợp âm thanh, khung mô phỏng đầy đủ),
+lấy thời gian nhanh nhất trong nhiều vòng rồi so với mốc đã lưu; chậm hơn mốc quá
+BENCH_REGRESSION_THRESHOLD thì thoát mã 1.
+      python bench.py --suite --save        -> đo và lưu mốc (BENCH_BASELINE_FILE)
+      python bench.py --suite               -> đo và so với mốc
+      python bench.py --suite frame/ a_star/ --threshold 0.1
+"""
+
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+from functools import partial
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pygame
+
+from settings import (
+    TILE_SIZE, COLOR_P1, COLOR_P2, PARTICLE_CAPACITY, LOGIC_DT, HUD_HEIGHT,
+    BENCH_BASELINE_FILE, BENCH_REGRESSION_THRESHOLD
+)
+from utils import FlowField, SpatialHash, CORRIDOR_CONTINUE, FLOW_DIRS, neighbors_4, a_star
+from map import GameMap, LEVELS
+from mazegen import generate_maze
+from player import Player
+from src.enemy import Ghost, GhostSwarm
+from src.ui import draw_hud, text_cache, HudPanel
+from src.audio import SoundBank
+from src.render import WorldRenderer, window_size
+from particles import ParticleSystem
+from items import Item
+from simulation import Simulation, STATUS_CLEARED, STATUS_LOST, STATUS_PLAY, random_inputs
+import levelcache
+from rollback import Rollback
+from profiler import Profiler
+
+
+def _ms_per_call(fn: Callable[[], None], calls: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - t0) * 1000.0 / calls
+
+
+def _spawn_ghosts(gmap: GameMap, count: int, rng: random.Random):
+    free = [(x, y) for y in range(gmap.h) for x in range(gmap.w) if gmap.nav.node((x, y)) >= 0]
+    return [Ghost(i, rng.choice(free)) for i in range(count)]
+
+
+def _spawn_swarm(gmap: GameMap, count: int, rng: random.Random) -> GhostSwarm:
+    swarm = GhostSwarm(count)
+    swarm.assign(_spawn_ghosts(gmap, count, rng))
+    return swarm
+
+
+def _level_flows(gmap: GameMap, players) -> List[FlowField]:
+    flows = [FlowField(gmap.walkable_mask()) for _ in players]
+    for pl, field in zip(players, flows):
+        px, py = pl.pixel_center()
+        field.retarget((px // TILE_SIZE, py // TILE_SIZE))
+    return flows
+
+
+def bench_ghost_pathing():
+    """Thời gian cập nhật 8 ghost mỗi khung: A* (giữ đường tới khi đích đổi ô) vs NavTable vs flow field chung."""
+    frames = 300
+    dt = 1 / 60
+    for li in range(len(LEVELS)):
+        t0 = time.perf_counter()
+        gmap = GameMap(li)
+        build_ms = (time.perf_counter() - t0) * 1000.0
+        results = {}
+        recomputes = 0
+        for mode in ("a_star", "nav", "flow"):
+            players = [Player(1, gmap.p1_spawn, COLOR_P1), Player(2, gmap.p2_spawn, COLOR_P2)]
+            ghosts = _spawn_ghosts(gmap, 8, random.Random(li))
+            nav = gmap.nav if mode != "a_star" else None
+            flows = [FlowField(gmap.walkable_mask()) for _ in players] if mode == "flow" else None
+            walk = random.Random(li)
+            tick = [0]
+
+            def frame():
+                # người chơi nhảy sang ô lân cận mỗi 15 khung để flow field phải tính lại
+                tick[0] += 1
+                if tick[0] % 15 == 0:
+                    p = players[0]
+                    nx, ny = walk.choice(list(neighbors_4(gmap.w, gmap.h, (p.tx, p.ty))))
+                    if not gmap.is_blocked(nx, ny):
+                        p.tx, p.ty = nx, ny
+                        p.x = nx * TILE_SIZE + TILE_SIZE / 2
+                        p.y = ny * TILE_SIZE + TILE_SIZE / 2
+                if flows:
+                    for pl, field in zip(players, flows):
+                        px, py = pl.pixel_center()
+                        field.retarget((px // TILE_SIZE, py // TILE_SIZE))
+                for g in ghosts:
+                    g.update(dt, gmap.is_blocked, gmap.w, gmap.h, players, ghosts, nav, flows)
+
+            results[mode] = _ms_per_call(frame, frames)
+            if flows:
+                recomputes = sum(f.recomputes for f in flows)
+        print(f"level {li + 1}: a_star {results['a_star']:.3f} | nav {results['nav']:.3f} | "
+              f"flow {results['flow']:.3f} ms/frame "
+              f"(nav build {build_ms:.1f} ms, {gmap.nav.n} tiles, "
+              f"{recomputes} flow recomputes / {frames} frames)")
+
+
+def _magnet_loop(gmap: GameMap, center, rad: float):
+    """Cách cũ trong vòng game: duyệt từng ô trong hình vuông bao quanh bằng Python."""
+    cx, cy = center
+    min_tx = int(max(0, (cx - rad) // TILE_SIZE))
+    max_tx = int(min(gmap.w - 1, (cx + rad) // TILE_SIZE))
+    min_ty = int(max(0, (cy - rad) // TILE_SIZE))
+    max_ty = int(min(gmap.h - 1, (cy + rad) // TILE_SIZE))
+    eaten = []
+    for ty in range(min_ty, max_ty + 1):
+        for tx in range(min_tx, max_tx + 1):
+            if gmap.pellet_at(tx, ty):
+                dx = tx * TILE_SIZE + TILE_SIZE // 2 - cx
+                dy = ty * TILE_SIZE + TILE_SIZE // 2 - cy
+                if dx * dx + dy * dy <= rad * rad and gmap.eat_pellet(tx, ty):
+                    eaten.append((tx, ty))
+    return len(eaten), eaten
+
+
+def bench_magnet():
+    """Hút pellet theo bán kính 2..10 ô: vòng lặp Python cũ vs GameMap.eat_pellets_in_radius."""
+    calls = 400
+    gmap = GameMap(0)
+    snapshot = gmap.save_cells()
+    remaining = gmap.pellets_remaining()
+    rng = random.Random(0)
+    centers = [(rng.randrange(gmap.w * TILE_SIZE), rng.randrange(gmap.h * TILE_SIZE)) for _ in range(calls)]
+    for radius_tiles in (2, 4, 6, 8, 10):
+        rad = radius_tiles * TILE_SIZE
+        # làm ấm cache mặt nạ đĩa như sau vài giây chơi thật
+        for c in centers:
+            gmap.eat_pellets_in_radius(c, rad)
+        results = {}
+        for name, fn in (("loop", lambda c: _magnet_loop(gmap, c, rad)),
+                         ("vector", lambda c: gmap.eat_pellets_in_radius(c, rad))):
+            best = float("inf")
+            for _ in range(3):  # lấy lần nhanh nhất để bớt nhiễu
+                total = 0.0
+                eaten_sets = []
+                for c in centers:
+                    gmap.restore_cells(snapshot, remaining)
+                    gmap.drain_restored()
+                    t0 = time.perf_counter()
+                    _, tiles = fn(c)
+                    total += time.perf_counter() - t0
+                    eaten_sets.append(set(tiles))
+                best = min(best, total)
+            results[name] = (best * 1e6 / calls, eaten_sets)
+        same = results["loop"][1] == results["vector"][1]
+        print(f"radius {radius_tiles:>2} tiles: loop {results['loop'][0]:7.1f} us | "
+              f"vector {results['vector'][0]:6.1f} us | x{results['loop'][0] / results['vector'][0]:.1f}"
+              f"{'' if same else '  (KẾT QUẢ KHÁC!)'}")
+    gmap.drain_eaten()
+
+
+def _draw_particles_uncached(ps: ParticleSystem, surf):
+    """Cách vẽ cũ: mỗi hạt mỗi khung cấp phát một Surface SRCALPHA mới."""
+    n = len(ps)
+    for (x, y), size, col, life in zip(ps.pos[:n].tolist(), ps.size[:n].tolist(),
+                                       ps.color[:n].tolist(), ps.life[:n].tolist()):
+        alpha = max(40, int(255 * min(1.0, life)))
+        s = pygame.Surface((size * 2, size * 2), pygame.SRCALPHA)
+        pygame.draw.circle(s, (*col, alpha), (size, size), size)
+        surf.blit(s, (x - size, y - size))
+
+
+def bench_particles():
+    """ParticleSystem.update/draw với 1k/10k hạt sống; hạt chết được sinh bù để giữ số lượng."""
+    frames = 120
+    dt = 1 / 60
+    screen = pygame.Surface((600, 488))
+    for n in (1000, 10000):
+        ps = ParticleSystem(capacity=max(PARTICLE_CAPACITY, n), seed=0)
+        ps.spawn_explosion((300.0, 200.0), count=n)
+        ps.life[:n] = ps.rng.uniform(0.5, 2.0, n)
+        t_update = t_draw = t_old = 0.0
+        misses = 0
+        for f in range(frames):
+            t0 = time.perf_counter()
+            ps.update(dt)
+            t1 = time.perf_counter()
+            before = ps.sprites.misses
+            ps.draw(screen)
+            t2 = time.perf_counter()
+            if f >= frames // 2:  # nửa sau: trạng thái ổn định
+                misses += ps.sprites.misses - before
+            _draw_particles_uncached(ps, screen)
+            t3 = time.perf_counter()
+            t_update += t1 - t0
+            t_draw += t2 - t1
+            t_old += t3 - t2
+            ps.spawn_explosion((300.0, 200.0), count=n - len(ps))
+        print(f"{n:>6} particles: update {t_update * 1000.0 / frames:.3f} ms | "
+              f"draw cached {t_draw * 1000.0 / frames:.2f} ms vs uncached {t_old * 1000.0 / frames:.2f} ms | "
+              f"sprite allocs/frame (steady) {misses / (frames - frames // 2):.2f}, cache {len(ps.sprites)}")
+
+
+def bench_collision():
+    """Va chạm + bomb/trap + nhặt item mỗi khung: duyệt mọi cặp vs đường trong game
+    (GhostSwarm.rows_within/within cho ghost, SpatialHash của ItemsManager cho item), 5..500 ghost (+ số item bằng nhau)."""
+    frames = 200
+    side = 60 * TILE_SIZE  # vùng chơi 60x60 ô
+    for n in (5, 20, 50, 100, 200, 500):
+        rng = random.Random(n)
+        players = [Player(1, (rng.randrange(60), rng.randrange(60)), COLOR_P1),
+                   Player(2, (rng.randrange(60), rng.randrange(60)), COLOR_P2)]
+        swarm = GhostSwarm(n)
+        ghosts = [swarm.spawn(i, (rng.randrange(60), rng.randrange(60))) for i in range(n)]
+        items = [Item("health", (rng.randrange(60), rng.randrange(60)), i) for i in range(n)]
+        steps = [[(rng.uniform(-2, 2), rng.uniform(-2, 2)) for _ in ghosts] for _ in range(16)]
+
+        def walk(f):
+            for g, (dx, dy) in zip(ghosts, steps[f % 16]):
+                g.x = min(side - 1.0, max(0.0, g.x + dx))
+                g.y = min(side - 1.0, max(0.0, g.y + dy))
+
+        def brute():
+            hits = 0
+            for g in ghosts:
+                for pl in players:
+                    hits += g.hit_player(pl)
+            for r in (TILE_SIZE * 5, TILE_SIZE * 2):  # bomb, trap
+                bx, by = players[0].pixel_center()
+                for g in ghosts:
+                    dx = g.x - bx
+                    dy = g.y - by
+                    hits += dx * dx + dy * dy <= r * r
+            for pl in players:
+                px, py = pl.pixel_center()
+                prect = pygame.Rect(px - TILE_SIZE // 2, py - TILE_SIZE // 2, TILE_SIZE, TILE_SIZE)
+                hits += sum(prect.colliderect(it.rect()) for it in items)
+            return hits
+
+        item_grid = SpatialHash(TILE_SIZE)
+        for it in items:
+            item_grid.insert(it, it.tx * TILE_SIZE + TILE_SIZE // 2, it.ty * TILE_SIZE + TILE_SIZE // 2)
+
+        def game():
+            # như Simulation.step: ghost gần người chơi qua swarm.within, bomb/trap qua swarm.rows_within
+            hits = 0
+            for pl in players:
+                px, py = pl.pixel_center()
+                hits += sum(g.hit_player(pl) for g in swarm.within(px, py, TILE_SIZE * 0.55))
+            bx, by = players[0].pixel_center()
+            hits += len(swarm.rows_within(bx, by, TILE_SIZE * 5))
+            hits += len(swarm.rows_within(bx, by, TILE_SIZE * 2))
+            for pl in players:
+                px, py = pl.pixel_center()
+                prect = pygame.Rect(px - TILE_SIZE // 2, py - TILE_SIZE // 2, TILE_SIZE, TILE_SIZE)
+                hits += sum(prect.colliderect(it.rect()) for it in item_grid.query_rect(prect.inflate(TILE_SIZE, TILE_SIZE)))
+            return hits
+
+        t_brute = t_game = 0.0
+        same = True
+        for f in range(frames):
+            walk(f)
+            t0 = time.perf_counter()
+            a = brute()
+            t1 = time.perf_counter()
+            b = game()
+            t2 = time.perf_counter()
+            t_brute += t1 - t0
+            t_game += t2 - t1
+            same = same and a == b
+        print(f"{n:>4} ghosts + {n:>4} items: all-pairs {t_brute * 1e6 / frames:8.1f} us | "
+              f"swarm + item hash {t_game * 1e6 / frames:7.1f} us | x{t_brute / t_game:.1f}"
+              f"{'' if same else '  (KẾT QUẢ KHÁC!)'}")
+
+
+def bench_level_load():
+    """Nạp level + dựng GameMap: parse chữ + BFS vs cache .npy trên đĩa (mmap) vs đã nạp trong tiến trình."""
+    calls = 200
+    for path in levelcache.LEVEL_FILES:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        levelcache.load_level_file(path)  # bảo đảm cache đĩa đã có
+
+        def disk():
+            levelcache.forget(path)
+            levelcache.load_level_file(path).make_map()
+
+        compile_ms = _ms_per_call(lambda: levelcache.compile_source(text).make_map(), 5)
+        disk_ms = _ms_per_call(disk, calls)
+        memo_ms = _ms_per_call(lambda: levelcache.load_level_file(path).make_map(), calls)
+        print(f"{os.path.basename(path)}: compile {compile_ms:.2f} ms | warm disk cache {disk_ms * 1000:.0f} us | "
+              f"in-process {memo_ms * 1000:.0f} us")
+
+
+def bench_hud():
+    """HUD mỗi khung: render chữ lại từ đầu vs qua text_cache vs panel vẽ sẵn (HudPanel)."""
+    calls = 2000
+    font = _fonts()
+    surf = pygame.Surface((672, 480 + HUD_HEIGHT))
+    hud_rect = pygame.Rect(0, 480, 672, HUD_HEIGHT)
+    players = [Player(1, (1, 1), COLOR_P1), Player(2, (2, 1), COLOR_P2)]
+    panel = HudPanel(672, font)
+
+    def uncached():
+        text_cache.clear()
+        draw_hud(surf, font, players[0], players[1], 0)
+
+    def with_panel():
+        panel.update(players, 0)
+        surf.blit(panel.surface, hud_rect)
+
+    for label, score_every in (("static", 0), ("score +10 every 4 frames", 4)):
+        tick = [0]
+
+        def bump(fn):
+            def run():
+                tick[0] += 1
+                if score_every and tick[0] % score_every == 0:
+                    players[0].score += 10
+                fn()
+            return run
+        t_old = _ms_per_call(bump(uncached), calls)
+        t_text = _ms_per_call(bump(lambda: draw_hud(surf, font, players[0], players[1], 0)), calls)
+        t_panel = _ms_per_call(bump(with_panel), calls)
+        print(f"{label:<26}: render every frame {t_old * 1000:6.1f} us | text cache {t_text * 1000:6.1f} us | "
+              f"panel {t_panel * 1000:6.1f} us (x{t_old / t_panel:.0f})")
+
+
+def bench_swarm():
+    """Một bước logic + vẽ của cả đàn ghost (horde) trên level 1: từng Ghost.update vs GhostSwarm.update."""
+    gmap = GameMap(0)
+    players = [Player(1, gmap.p1_spawn, COLOR_P1), Player(2, gmap.p2_spawn, COLOR_P2)]
+    flows = _level_flows(gmap, players)
+    surf = pygame.Surface((gmap.w * TILE_SIZE, gmap.h * TILE_SIZE))
+    view = surf.get_rect()
+    for count in (64, 256, 1024):
+        swarm = _spawn_swarm(gmap, count, random.Random(count))
+        ghosts = swarm.ghosts
+        calls = max(5, 6400 // count)
+
+        def per_ghost():
+            swarm.store_prev()
+            for g in ghosts:
+                g.update(LOGIC_DT, gmap.is_blocked, gmap.w, gmap.h, players, ghosts, gmap.nav, flows)
+
+        def batched():
+            swarm.store_prev()
+            swarm.update(LOGIC_DT, gmap.is_blocked, gmap.w, gmap.h, players, gmap.nav, flows)
+
+        t_one = _ms_per_call(per_ghost, calls)
+        t_all = _ms_per_call(batched, calls)
+        d_one = _ms_per_call(lambda: [g.draw(surf, 0.5) for g in ghosts if view.colliderect(g.bounds(0.5))], calls)
+        d_all = _ms_per_call(lambda: swarm.draw(surf, 0.5, (0, 0), view), calls)
+        print(f"{count:5d} ghosts: update per ghost {t_one:6.3f} | swarm {t_all:6.3f} ms (x{t_one / t_all:.1f}); "
+              f"draw per ghost {d_one:6.3f} | swarm {d_all:6.3f} ms")
+
+
+def _ghost_ai(level: int, maze, horde, steer: bool, ticks: int):
+    """Chạy mô phỏng (người chơi bất tử, bot ngẫu nhiên); trả (ms AI ghost mỗi bước, số lần tra mỗi ghost-giây)."""
+    prof = Profiler(True)
+    sim = Simulation(1, seed=level, maze_size=maze, horde=horde, profiler=prof)
+    rng = random.Random(level)
+    decisions = ghost_ticks = 0
+
+    def reset(idx: int):
+        sim.start_level(idx)
+        for pl in sim.players:
+            pl.health_max = pl.health = 10 ** 9
+        if not steer:
+            sim.gmap.junctions = None
+    reset(level)
+    for t in range(ticks):
+        if t % 20 == 0:
+            inputs = random_inputs(rng)
+        sim.step(LOGIC_DT, inputs)
+        ghost_ticks += len(sim.ghosts)
+        if sim.status != STATUS_PLAY:
+            decisions += sim.swarm.decisions
+            reset(sim.level_idx)
+    decisions += sim.swarm.decisions
+    ms = prof.sections["sim.ghosts"].values().mean() / 1e6
+    return ms, decisions / max(1, ghost_ticks * LOGIC_DT)
+
+
+def bench_junctions():
+    """AI ghost mỗi bước: tra bước kế tiếp mỗi bước vs chỉ tra ở ngã rẽ (JunctionGraph), các level và mê cung lớn."""
+    configs = [(f"level {li + 1}", li, None, None, 3000) for li in range(len(LEVELS))]
+    configs += [("level 1, horde 256", 0, None, 256, 1200), ("maze 301x201", 0, (301, 201), None, 1200)]
+    for name, level, maze, horde, ticks in configs:
+        t_old, d_old = _ghost_ai(level, maze, horde, False, ticks)
+        t_new, d_new = _ghost_ai(level, maze, horde, True, ticks)
+        print(f"{name:20s}: every tick {t_old:7.3f} ms ({d_old:5.1f} lookups/ghost-s) | "
+              f"junctions {t_new:7.3f} ms ({d_new:5.2f} lookups/ghost-s) x{t_old / t_new:.1f}")
+
+
+def _maze_map(size: int) -> GameMap:
+    return GameMap(*generate_maze(size, size, seed=size))
+
+
+def _route_pairs(gmap: GameMap, count: int, seed: int) -> List:
+    """count cặp (nút ngã rẽ, ô đi được) cố định: ghost chỉ tìm đường khi đứng ở ngã rẽ."""
+    ys, xs = np.nonzero(gmap.walkable_mask())
+    free = list(zip(xs.tolist(), ys.tolist()))
+    nodes = [tuple(t) for t in gmap.junctions.tiles.tolist()]
+    rng = random.Random(seed)
+    return [(rng.choice(nodes), rng.choice(free)) for _ in range(count)]
+
+
+def _query_ms(fn: Callable, pairs: List) -> tuple:
+    """(ms trung bình, ms p99, tỉ lệ tìm ra bước đi) của fn(start, goal) trên các cặp."""
+    times = []
+    found = 0
+    for a, b in pairs:
+        t0 = time.perf_counter()
+        found += fn(a, b) is not None
+        times.append((time.perf_counter() - t0) * 1000.0)
+    return float(np.mean(times)), float(np.percentile(times, 99)), found / len(pairs)
+
+
+def bench_hpa():
+    """
+    Tìm đường trên mê cung 101..1000 ô: A* trên lưới và trên đồ thị ngã rẽ (cùng giới hạn 3000
+    nút) vs HPA* (SectorGraph), lần đầu (bảng khu chưa có) và lần sau; rồi ghost đi theo chuỗi cửa.
+    """
+    for size in (101, 251, 501, 1000):
+        t0 = time.perf_counter()
+        gmap = _maze_map(size)
+        build_ms = (time.perf_counter() - t0) * 1000.0
+        sectors = gmap.junctions.sectors
+        pairs = _route_pairs(gmap, 40, size)
+        rows = [("a_star tiles", _query_ms(lambda a, b: a_star(a, b, gmap.is_blocked, gmap.w, gmap.h), pairs[:10])),
+                ("junction A*", _query_ms(gmap.junctions.next_step, pairs)),
+                ("hpa cold", _query_ms(sectors.next_step, pairs)),
+                ("hpa warm", _query_ms(sectors.next_step, pairs))]
+        built, total, cells = sectors.table_stats()
+        print(f"maze {size}x{size}: map + graphs {build_ms:.0f} ms, {sectors.gates} gates, "
+              f"{built}/{total} sector tables built ({cells} entries)")
+        for name, (mean, p99, ok) in rows:
+            print(f"    {name:13s} mean {mean:8.3f} ms | p99 {p99:8.3f} ms | "
+                  f"route found {ok * 100:5.1f}%")
+        # ghost đi từ ngã rẽ tới đích: chỉ tra ở ngã rẽ, tìm lại khi lệch khỏi chuỗi cửa
+        ghost = Ghost(0, pairs[0][0])
+        times = []
+        for start, goal in pairs[:8]:
+            cur, prev = start, None
+            ghost.path = []
+            for _ in range(size * size):
+                if cur == goal:
+                    break
+                code = 0
+                if prev is not None and not gmap.junctions.is_junction(cur):
+                    d_in = FLOW_DIRS.index((cur[0] - prev[0], cur[1] - prev[1]))
+                    code = int(CORRIDOR_CONTINUE[gmap.junctions.exits[cur[1], cur[0]], d_in])
+                if code:
+                    nxt = (cur[0] + FLOW_DIRS[code][0], cur[1] + FLOW_DIRS[code][1])
+                else:
+                    t0 = time.perf_counter()
+                    nxt = ghost.sector_step(cur, goal, sectors)
+                    times.append((time.perf_counter() - t0) * 1000.0)
+                    if nxt is None:
+                        break
+                prev, cur = cur, nxt
+        print(f"    ghost walks   {len(times)} decisions: mean {np.mean(times):.3f} ms | "
+              f"p99 {np.percentile(times, 99):.3f} ms | max {max(times):.1f} ms")
+
+
+BENCHMARKS: Dict[str, Callable[[], None]] = {
+    "ghost_pathing": bench_ghost_pathing,
+    "magnet": bench_magnet,
+    "particles": bench_particles,
+    "collision": bench_collision,
+    "level_load": bench_level_load,
+    "hud": bench_hud,
+    "swarm": bench_swarm,
+    "junctions": bench_junctions,
+    "hpa": bench_hpa,
+}
+
+
+# --- Bộ đo hồi quy ---
+# Mỗi phép đo là một hàm dựng trạng thái rồi trả về run(); thời gian là ms mỗi lần gọi run().
+
+def _fonts():
+    pygame.font.init()
+    return {
+        "sm": pygame.font.SysFont("arial", 14),
+        "md": pygame.font.SysFont("arial", 18, bold=True),
+        "lg": pygame.font.SysFont("arial", 24, bold=True),
+        "xl": pygame.font.SysFont("arial", 36, bold=True),
+    }
+
+
+def case_a_star(level_idx: int):
+    """32 lần A* giữa các cặp ô đi được cố định của một level."""
+    gmap = GameMap(level_idx)
+    ys, xs = np.nonzero(gmap.walkable_mask())
+    free = list(zip(xs.tolist(), ys.tolist()))
+    rng = random.Random(level_idx)
+    pairs = [(rng.choice(free), rng.choice(free)) for _ in range(32)]
+
+    def run():
+        for a, b in pairs:
+            a_star(a, b, gmap.is_blocked, gmap.w, gmap.h)
+    return run
+
+
+def case_ghost_update(count: int):
+    """Một bước logic của count ghost trên level 1 (bảng dẫn đường + flow field như trong game)."""
+    gmap = GameMap(0)
+    players = [Player(1, gmap.p1_spawn, COLOR_P1), Player(2, gmap.p2_spawn, COLOR_P2)]
+    ghosts = _spawn_ghosts(gmap, count, random.Random(count))
+    flows = _level_flows(gmap, players)
+
+    def run():
+        for g in ghosts:
+            g.update(LOGIC_DT, gmap.is_blocked, gmap.w, gmap.h, players, ghosts, gmap.nav, flows)
+    return run
+
+
+def case_swarm_update(count: int):
+    """Một bước logic của cả đàn count ghost trên level 1 qua GhostSwarm.update (có đồ thị ngã rẽ như trong game)."""
+    gmap = GameMap(0)
+    players = [Player(1, gmap.p1_spawn, COLOR_P1), Player(2, gmap.p2_spawn, COLOR_P2)]
+    swarm = _spawn_swarm(gmap, count, random.Random(count))
+    flows = _level_flows(gmap, players)
+
+    def run():
+        swarm.store_prev()
+        swarm.update(LOGIC_DT, gmap.is_blocked, gmap.w, gmap.h, players, gmap.nav, flows, gmap.junctions)
+    return run
+
+
+def case_hpa_route(size: int):
+    """32 lần tìm đường HPA* trên mê cung size x size (bảng khu đã có sau lần chạy làm ấm)."""
+    gmap = _maze_map(size)
+    pairs = _route_pairs(gmap, 32, size)
+    sectors = gmap.junctions.sectors
+
+    def run():
+        for a, b in pairs:
+            sectors.next_step(a, b)
+    return run
+
+
+def _live_particles(count: int) -> ParticleSystem:
+    ps = ParticleSystem(capacity=max(PARTICLE_CAPACITY, count), seed=0)
+    ps.spawn_explosion((300.0, 200.0), count=count)
+    ps.life[:count] = 1e9  # không hạt nào chết: số hạt giữ nguyên suốt phép đo
+    return ps
+
+
+def case_particles_update(count: int):
+    ps = _live_particles(count)
+    return lambda: ps.update(LOGIC_DT)
+
+
+def case_particles_draw(count: int):
+    ps = _live_particles(count)
+    screen = pygame.Surface((600, 488))
+    return lambda: ps.draw(screen)
+
+
+def case_map_draw(level_idx: int):
+    """Raster hoá cả map (tường + pellet) như khi dựng một khối nền mới."""
+    gmap = GameMap(level_idx)
+    surf = pygame.Surface((gmap.w * TILE_SIZE, gmap.h * TILE_SIZE))
+    return lambda: gmap.draw(surf)
+
+
+def case_draw_hud():
+    font = _fonts()
+    surf = pygame.Surface((672, 480 + HUD_HEIGHT))
+    p1 = Player(1, (1, 1), COLOR_P1)
+    p2 = Player(2, (2, 1), COLOR_P2)
+    return lambda: draw_hud(surf, font, p1, p2, 0)
+
+
+def case_hud_panel():
+    """HUD như renderer dùng mỗi khung: kiểm tra chữ ký rồi blit panel (không đổi gì)."""
+    surf = pygame.Surface((672, 480 + HUD_HEIGHT))
+    players = [Player(1, (1, 1), COLOR_P1), Player(2, (2, 1), COLOR_P2)]
+    panel = HudPanel(surf.get_width(), _fonts())
+
+    def run():
+        panel.update(players, 0)
+        surf.blit(panel.surface, (0, 480))
+    return run
+
+
+def case_sound_synth():
+    """Tổng hợp toàn bộ hiệu ứng âm thanh (không dùng cache đĩa)."""
+    return lambda: SoundBank(None).synthesize_all()
+
+
+def _sim_runner(sim: Simulation):
+    rng = random.Random(0)
+    state = {"tick": 0, "inputs": random_inputs(rng)}
+
+    def steps(n: int):
+        # hai người chơi đổi hướng ngẫu nhiên mỗi 20 bước, tự sang màn/ván mới như simulation.py
+        for _ in range(n):
+            state["tick"] += 1
+            if state["tick"] % 20 == 0:
+                state["inputs"] = random_inputs(rng)
+            sim.step(LOGIC_DT, state["inputs"])
+            if sim.status == STATUS_CLEARED:
+                sim.start_level(sim.level_idx)
+            elif sim.status == STATUS_LOST:
+                sim.new_game(state["tick"])
+    return steps
+
+
+def case_frame(mode: str):
+    """
+    Một khung 60 FPS: hai bước logic, cộng vẽ và đẩy hình nếu mode là "dirty"/"flip".
+    mode "logic" chỉ đo phần mô phỏng.
+    """
+    sim = Simulation(1, seed=0)
+    steps = _sim_runner(sim)
+    if mode == "logic":
+        return lambda: steps(2)
+    screen = pygame.display.set_mode(window_size(sim.gmap))
+    renderer = WorldRenderer(screen, _fonts(), dirty=mode == "dirty")
+
+    def run():
+        steps(2)
+        renderer.draw(sim, 0.5)
+        renderer.present()
+    return run
+
+
+def case_rollback(ticks: int):
+    """Quay lại ticks bước rồi chạy lại tới hiện tại (client nhận snapshot trễ ticks bước)."""
+    sim = Simulation(1, seed=0)
+    rb = Rollback(sim)
+    rng = random.Random(0)
+    inputs = random_inputs(rng)
+    for tick in range(rb.capacity):
+        if tick % 20 == 0:
+            inputs = random_inputs(rng)
+        rb.step(inputs)
+    return lambda: rb.rewind(sim.ticks - ticks, lambda s: None)
+
+
+SUITE: Dict[str, Callable[[], Callable[[], None]]] = {}
+for _i in range(len(LEVELS)):
+    SUITE[f"a_star/level{_i + 1}"] = partial(case_a_star, _i)
+for _n in (4, 16, 64):
+    SUITE[f"ghost_update/{_n}"] = partial(case_ghost_update, _n)
+for _n in (64, 256, 1024):
+    SUITE[f"swarm_update/{_n}"] = partial(case_swarm_update, _n)
+for _n in (251, 501):
+    SUITE[f"hpa_route/maze{_n}"] = partial(case_hpa_route, _n)
+for _n in (1000, 10000):
+    SUITE[f"particles_update/{_n}"] = partial(case_particles_update, _n)
+    SUITE[f"particles_draw/{_n}"] = partial(case_particles_draw, _n)
+for _i in range(len(LEVELS)):
+    SUITE[f"map_draw/level{_i + 1}"] = partial(case_map_draw, _i)
+SUITE["draw_hud"] = case_draw_hud
+SUITE["hud_panel"] = case_hud_panel
+SUITE["sound_synth"] = case_sound_synth
+for _mode in ("logic", "dirty", "flip"):
+    SUITE[f"frame/{_mode}"] = partial(case_frame, _mode)
+for _n in (10, 30):
+    SUITE[f"rollback/resim{_n}"] = partial(case_rollback, _n)
+
+
+def measure(run: Callable[[], None], rounds: int = 7, round_time: float = 0.05) -> dict:
+    """Chạy run() theo vòng, mỗi vòng khoảng round_time giây; trả ms mỗi lần gọi (min và trung vị)."""
+    run()  # làm ấm cache
+    t0 = time.perf_counter()
+    run()
+    once = time.perf_counter() - t0
+    calls = max(1, int(round_time / max(once, 1e-7)))
+    samples = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        for _ in range(calls):
+            run()
+        samples.append((time.perf_counter() - t0) * 1000.0 / calls)
+    samples.sort()
+    return {"min_ms": samples[0], "median_ms": samples[len(samples) // 2], "calls": calls * rounds}
+
+
+def _baseline_path(path: Optional[str]) -> str:
+    return path or os.path.join(os.path.dirname(os.path.abspath(__file__)), BENCH_BASELINE_FILE)
+
+
+def run_suite(patterns: List[str], save: Optional[str], compare: Optional[str], threshold: float) -> int:
+    names = [n for n in SUITE if not patterns or any(n.startswith(p) for p in patterns)]
+    if not names:
+        print(f"no benchmark matches {patterns} (có: {', '.join(SUITE)})")
+        return 1
+    baseline = {}
+    base_path = _baseline_path(compare)
+    if os.path.exists(base_path):
+        with open(base_path, encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+    elif compare:
+        print(f"baseline not found: {base_path}")
+        return 1
+
+    # so sánh theo min (ít nhiễu nhất); trung vị chỉ để tham khảo
+    print(f"{'benchmark':<24}{'min ms':>10}{'median':>10}{'baseline':>10}{'change':>9}")
+    results = {}
+    regressions = []
+    for name in names:
+        res = results[name] = measure(SUITE[name]())
+        old = baseline.get(name)
+        line = f"{name:<24}{res['min_ms']:>10.4f}{res['median_ms']:>10.4f}"
+        if old:
+            change = res["min_ms"] / old["min_ms"] - 1.0
+            flag = ""
+            if change > threshold:
+                flag = "  REGRESSION"
+                regressions.append(name)
+            elif change < -threshold:
+                flag = "  faster"
+            line += f"{old['min_ms']:>10.4f}{change * 100:>+8.1f}%{flag}"
+        print(line)
+
+    if save is not None:
+        path = _baseline_path(save or None)
+        # lưu cả các mốc cũ không đo lại lần này
+        merged = dict(baseline) if os.path.abspath(path) == os.path.abspath(base_path) else {}
+        merged.update(results)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"machine": {"python": platform.python_version(), "pygame": pygame.version.ver,
+                                   "numpy": np.__version__, "platform": platform.platform()},
+                       "results": merged}, f, indent=1, sort_keys=True)
+        print(f"baseline saved -> {path}")
+    if regressions and save is None:
+        print(f"{len(regressions)} regression(s) over {threshold * 100:.0f}%: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Pacman Nova benchmarks.")
+    parser.add_argument("names", nargs="*", help="tên phép so sánh; với --suite là tiền tố tên phép đo")
+    parser.add_argument("--suite", action="store_true", help="chạy bộ đo hồi quy và so với mốc")
+    parser.add_argument("--save", nargs="?", const="", metavar="PATH",
+                        help=f"lưu kết quả làm mốc (mặc định {BENCH_BASELINE_FILE})")
+    parser.add_argument("--compare", metavar="PATH", help="file mốc để so (mặc định BENCH_BASELINE_FILE nếu có)")
+    parser.add_argument("--threshold", type=float, default=BENCH_REGRESSION_THRESHOLD,
+                        help="tỉ lệ chậm hơn mốc bị coi là hồi quy (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+    if args.suite:
+        return run_suite(args.names, args.save, args.compare, args.threshold)
+
+    names = args.names or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"unknown benchmark: {name} (có: {', '.join(BENCHMARKS)})")
+            return 1
+        print(f"== {name} ==")
+        BENCHMARKS[name]()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -10,16 +10,17 @@ from settings import (
     TILE_SIZE, ITEM_SPAWN_INTERVAL, ITEM_DESPAWN_TIME,
     ITEM_SCORE, SHIELD_DURATION, SPEED_BOOST_MULT, SPEED_BOOST_DURATION
 )
-from utils import Timer
+from utils import Timer, SpatialHash
 
 
 ITEM_TYPES = ["health", "trap", "bomb", "shield", "speed"]
 
 
 class Item:
-    def __init__(self, item_type: str, tile_pos: Tuple[int, int]):
+    def __init__(self, item_type: str, tile_pos: Tuple[int, int], seq: int = 0):
         self.type = item_type
         self.tx, self.ty = tile_pos
+        self.seq = seq  # thứ tự sinh, để nhặt theo đúng thứ tự danh sách
         self.timer = Timer(ITEM_DESPAWN_TIME)
         self.timer.start()
 
@@ -29,8 +30,11 @@ class Item:
         r = TILE_SIZE // 3
         return pygame.Rect(x - r, y - r, r * 2, r * 2)
 
-    def draw(self, surf: pygame.Surface):
-        center = (self.tx * TILE_SIZE + TILE_SIZE // 2, self.ty * TILE_SIZE + TILE_SIZE // 2)
+    def bounds(self) -> pygame.Rect:
+        return pygame.Rect(self.tx * TILE_SIZE, self.ty * TILE_SIZE, TILE_SIZE, TILE_SIZE)
+
+    def draw(self, surf: pygame.Surface, offset: Tuple[int, int] = (0, 0)):
+        center = (self.tx * TILE_SIZE + TILE_SIZE // 2 - offset[0], self.ty * TILE_SIZE + TILE_SIZE // 2 - offset[1])
         color_map = {
             "health": (70, 220, 100),
             "trap": (230, 160, 70),
@@ -48,8 +52,13 @@ class Item:
 
 
 class ItemsManager:
-    def __init__(self, map_width: int, map_height: int, is_blocked):
+    def __init__(self, map_width: int, map_height: int, is_blocked, rng: Optional[random.Random] = None):
         self.items: List[Item] = []
+        self.grid = SpatialHash(TILE_SIZE)
+        self.spawned = 0
+        self.rng = rng or random.Random()
+        # getstate() của Random chép 625 số: chỉ lấy lại khi try_spawn đã rút số từ lần lưu trước
+        self._rng_state: Optional[tuple] = None
         self.spawn_timer = Timer(ITEM_SPAWN_INTERVAL)
         self.spawn_timer.start()
         self.map_w = map_width
@@ -57,14 +66,20 @@ class ItemsManager:
         self.is_blocked = is_blocked
 
     def try_spawn(self):
+        self._rng_state = None
         for _ in range(20):
-            tx = random.randint(1, self.map_w - 2)
-            ty = random.randint(1, self.map_h - 2)
+            tx = self.rng.randint(1, self.map_w - 2)
+            ty = self.rng.randint(1, self.map_h - 2)
             if not self.is_blocked(tx, ty):
-                itype = random.choice(ITEM_TYPES)
-                self.items.append(Item(itype, (tx, ty)))
+                itype = self.rng.choice(ITEM_TYPES)
+                self.add(Item(itype, (tx, ty), self.spawned))
                 break
 
+    def add(self, it: Item):
+        self.spawned += 1
+        self.items.append(it)
+        self.grid.insert(it, it.tx * TILE_SIZE + TILE_SIZE // 2, it.ty * TILE_SIZE + TILE_SIZE // 2)
+
     def update(self, dt: float):
         self.spawn_timer.tick(dt)
         if self.spawn_timer.ready():
@@ -72,32 +87,60 @@ class ItemsManager:
             self.spawn_timer.set_and_start(ITEM_SPAWN_INTERVAL)
         for it in self.items:
             it.update(dt)
-        self.items = [i for i in self.items if not i.expired()]
+        if any(i.expired() for i in self.items):
+            for i in self.items:
+                if i.expired():
+                    self.grid.remove(i)
+            self.items = [i for i in self.items if not i.expired()]
+
+    def save_state(self) -> tuple:
+        if self._rng_state is None:
+            self._rng_state = self.rng.getstate()
+        return (self.spawned, self.spawn_timer.duration, self.spawn_timer.time_left,
+                tuple(self.items), tuple(it.timer.time_left for it in self.items), self._rng_state)
+
+    def load_state(self, state: tuple):
+        self.spawned, self.spawn_timer.duration, self.spawn_timer.time_left, items, left, rng_state = state
+        if rng_state is not self._rng_state:
+            self.rng.setstate(rng_state)
+            self._rng_state = rng_state
+        if len(items) != len(self.items) or any(a is not b for a, b in zip(items, self.items)):
+            self.items = list(items)
+            self.grid.clear()
+            for it in items:
+                self.grid.insert(it, it.tx * TILE_SIZE + TILE_SIZE // 2, it.ty * TILE_SIZE + TILE_SIZE // 2)
+        for it, tl in zip(items, left):
+            it.timer.time_left = tl
 
-    def draw(self, surf: pygame.Surface):
+    def draw(self, surf: pygame.Surface, offset: Tuple[int, int] = (0, 0)):
         for it in self.items:
-            it.draw(surf)
+            it.draw(surf, offset)
 
-    def try_pickup(self, player, sound, particles) -> Optional[str]:
+    def try_pickup(self, player, particles) -> Optional[str]:
         """Kiểm tra nhặt vật phẩm; áp dụng hiệu ứng và trả về loại item (để cộng điểm)."""
+        if not self.items:
+            return None
         px, py = player.pixel_center()
         pr = TILE_SIZE // 2
         prect = pygame.Rect(px - pr, py - pr, pr * 2, pr * 2)
-        for i, it in enumerate(self.items):
+        # ứng viên: item có tâm trong prect nới thêm bán kính item
+        reach = prect.inflate(TILE_SIZE, TILE_SIZE)
+        for it in sorted(self.grid.query_rect(reach), key=lambda it: it.seq):
             if prect.colliderect(it.rect()):
                 t = it.type
                 if t == "health":
                     player.heal(1)
                 elif t == "trap":
-                    player.place_trap = True  # cờ để xử lý ở main (đặt bẫy gần người chơi)
+                    player.place_trap = True  # cờ để xử lý ở Simulation (đặt bẫy gần người chơi)
                 elif t == "bomb":
-                    player.trigger_bomb = True  # cờ để nổ ở main
+                    player.trigger_bomb = True  # cờ để nổ ở Simulation
                 elif t == "shield":
                     player.activate_shield(SHIELD_DURATION)
                 elif t == "speed":
                     player.activate_speed(SPEED_BOOST_MULT, SPEED_BOOST_DURATION)
-                sound.power()
-                particles.spawn_explosion((px, py), color=(255, 240, 120), count=12)
-                self.items.pop(i)
+                if particles is not None:
+                    particles.spawn_explosion((px, py), color=(255, 240, 120), count=12)
+                self.items.remove(it)
+                self.grid.remove(it)
                 return t
         return None
\ No newline at end of file
@@ -0,0 +1,165 @@
+"""
+Biên dịch level (levels/*.txt) sang cache nhị phân để nạp màn gần như tức thì.
+Lần nạp đầu: đọc tệp chữ, dựng lưới cờ bit và bảng dẫn đường (BFS mọi cặp ô) rồi
+ghi ra LEVEL_CACHE_DIR/<tên>.<checksum>/ gồm level.npy (lưới và các mảng dẫn đường
+nối liền thành một khối byte) và meta.json (spawn, metadata, vị trí từng mảng trong khối).
+Những lần sau: np.load(mmap_mode="r") đúng một tệp rồi cắt view, không parse, không BFS.
+Trong một tiến trình, level đã nạp được giữ lại nên start_level lần sau gần như miễn phí.
+Checksum gồm nội dung tệp nguồn và LEVEL_CACHE_VERSION nên sửa level là tự biên dịch lại.
+
+Biên dịch trước mọi level: python levelcache.py
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import zlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from settings import LEVEL_CACHE_DIR
+from map import GameMap, LEVEL_FILES, parse_level_text
+from utils import NavTable
+
+LEVEL_CACHE_VERSION = 1
+_NAV_ARRAYS = ("index", "tiles", "dist", "next_hop")
+_ALIGN = 8
+
+# level đã nạp trong tiến trình này, theo thư mục cache (đã gồm checksum nguồn)
+_loaded: Dict[str, "CompiledLevel"] = {}
+
+
+@dataclass
+class CompiledLevel:
+    name: str
+    grid: np.ndarray                      # cờ bit h x w (chỉ đọc; GameMap sao ra bản riêng)
+    spawns: Dict[str, Tuple[int, int]]
+    ghosts: Optional[int]                 # None: theo độ khó
+    nav: Optional[NavTable]
+    from_cache: bool = False
+
+    def make_map(self) -> GameMap:
+        return GameMap(self.grid, self.spawns, nav=self.nav)
+
+
+def _cache_root() -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), LEVEL_CACHE_DIR)
+
+
+def _parse_spawn(text: str) -> Tuple[int, int]:
+    x, y = (int(v) for v in text.split(","))
+    return x, y
+
+
+def compile_source(text: str) -> CompiledLevel:
+    """Dựng level từ nội dung tệp chữ (parse + bảng dẫn đường), không đụng tới cache."""
+    rows, meta = parse_level_text(text)
+    gmap = GameMap(rows)
+    spawns = {"p1": gmap.p1_spawn, "p2": gmap.p2_spawn, "boss": gmap.boss_spawn}
+    for key in spawns:
+        if key in meta:
+            spawns[key] = _parse_spawn(meta[key])
+    ghosts = int(meta["ghosts"]) if meta.get("ghosts") else None
+    return CompiledLevel(meta.get("name", ""), gmap.grid.copy(), spawns, ghosts, gmap.nav)
+
+
+def _save(level: CompiledLevel, folder: str):
+    arrays = {"grid": level.grid}
+    if level.nav is not None:
+        arrays.update((name, getattr(level.nav, name)) for name in _NAV_ARRAYS)
+    # nối các mảng thành một khối byte, mỗi mảng bắt đầu ở offset chia hết cho _ALIGN
+    layout = {}
+    parts = []
+    offset = 0
+    for name, arr in arrays.items():
+        raw = np.ascontiguousarray(arr).tobytes()
+        layout[name] = [offset, arr.dtype.str, list(arr.shape)]
+        pad = -len(raw) % _ALIGN
+        parts.append(raw + bytes(pad))
+        offset += len(raw) + pad
+    tmp = f"{folder}.tmp{os.getpid()}"
+    try:
+        os.makedirs(tmp, exist_ok=True)
+        np.save(os.path.join(tmp, "level.npy"), np.frombuffer(b"".join(parts), dtype=np.uint8))
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"name": level.name, "spawns": level.spawns, "ghosts": level.ghosts,
+                       "layout": layout}, f)
+        os.replace(tmp, folder)
+    except OSError:
+        # thư mục đích đã có (tiến trình khác vừa ghi) hoặc không ghi được: bỏ cache lần này
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _load(folder: str) -> Optional[CompiledLevel]:
+    try:
+        with open(os.path.join(folder, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        # np.asarray bỏ lớp memmap (tra cứu vô hướng nhanh hơn) nhưng vẫn dùng chung vùng nhớ ánh xạ
+        blob = np.asarray(np.load(os.path.join(folder, "level.npy"), mmap_mode="r"))
+        arrays = {}
+        for name, (offset, dtype, shape) in meta["layout"].items():
+            dt = np.dtype(dtype)
+            size = dt.itemsize * int(np.prod(shape))
+            arrays[name] = blob[offset:offset + size].view(dt).reshape(shape)
+        grid = arrays["grid"]
+        nav = NavTable.from_arrays(*(arrays[n] for n in _NAV_ARRAYS)) if "dist" in arrays else None
+    except (OSError, ValueError, KeyError):
+        return None
+    spawns = {k: (int(v[0]), int(v[1])) for k, v in meta["spawns"].items()}
+    return CompiledLevel(meta["name"], grid, spawns, meta["ghosts"], nav, from_cache=True)
+
+
+def _cache_folder(path: str, source: bytes) -> str:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    key = zlib.crc32(source, LEVEL_CACHE_VERSION)
+    return os.path.join(_cache_root(), f"{stem}.{key:08x}")
+
+
+def load_level_file(path: str) -> CompiledLevel:
+    """Nạp một tệp level qua cache; biên dịch và ghi cache nếu chưa có hoặc đã cũ."""
+    with open(path, "rb") as f:
+        source = f.read()
+    folder = _cache_folder(path, source)
+    level = _loaded.get(folder)
+    if level is not None:
+        return level
+    level = _load(folder) if LEVEL_CACHE_DIR else None
+    if level is None:
+        level = compile_source(source.decode("utf-8"))
+        if LEVEL_CACHE_DIR:
+            _save(level, folder)
+    _loaded[folder] = level
+    return level
+
+
+def forget(path: str):
+    """Bỏ level path (mọi phiên bản nguồn) khỏi bộ nhớ tiến trình; lần nạp sau đọc lại cache đĩa."""
+    prefix = os.path.join(_cache_root(), os.path.splitext(os.path.basename(path))[0] + ".")
+    for folder in [f for f in _loaded if f.startswith(prefix)]:
+        del _loaded[folder]
+
+
+def load_level(index: int) -> CompiledLevel:
+    return load_level_file(LEVEL_FILES[index % len(LEVEL_FILES)])
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import time
+
+    for path in LEVEL_FILES:
+        t0 = time.perf_counter()
+        level = load_level_file(path)
+        ms = (time.perf_counter() - t0) * 1000.0
+        state = "cached" if level.from_cache else "compiled"
+        print(f"{os.path.basename(path)}: {level.name or '-'} {level.grid.shape[1]}x{level.grid.shape[0]} "
+              f"{state} in {ms:.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main(sys.argv[1:]))
@@ -4,40 +4,72 @@ Pacman Nova - bản hoàn chỉnh đơn giản, có:
 - Ghost AI phối hợp và Boss
 - Âm thanh tổng hợp, hiệu ứng hạt
 - Menu, HUD
+Logic game nằm trong simulation.Simulation; file này chỉ xử lý input, vẽ và âm thanh.
+Logic chạy bước cố định (LOGIC_HZ) qua bộ tích luỹ; khung vẽ nội suy vị trí entity.
+Ghi phiên chơi: --record file.pnrp; phát lại: --replay file.pnrp [--speed N | --headless].
+Mê cung sinh ngẫu nhiên thay cho các level vẽ tay: --maze 301x201 (camera cuộn theo người chơi).
+Chế độ bầy đàn: --horde 300 (300 ghost rải khắp map mỗi màn).
+Profiler: F3 bật/tắt bảng thời gian từng phần (hoặc PACMAN_PROFILE=1), F4 ghi trace;
+PACMAN_PROFILE_OUT=trace.json|trace.csv ghi trace khi thoát.
 Tối ưu rõ ràng để người mới đọc code vẫn hiểu.
 """
 
+import os
 import sys
-import random
+import math
+import argparse
 import pygame
 
 from settings import (
-    TILE_SIZE, HUD_HEIGHT, COLOR_BG, COLOR_TEXT, DIFFICULTIES, UPGRADES,
-    PELLET_SCORE, ITEM_SCORE, GHOST_SCORE, BOSS_SCORE, POWER_FRIGHT_BONUS,
-    DEFAULT_VOLUME, COLOR_P1, COLOR_P2
+    DIFFICULTIES, UPGRADES, DEFAULT_VOLUME, DIRTY_RECT_RENDERING,
+    SOUND_CACHE_FILE, LOGIC_DT, RENDER_FPS, MAX_CATCHUP_STEPS
 )
-from utils import Timer
-from map import GameMap
-from player import Player
-from src.enemy import Ghost, Boss
-from items import ItemsManager
-from particles import ParticleSystem
+from player import PlayerInput
+from simulation import Simulation, STATUS_PLAY, STATUS_CLEARED, STATUS_LOST
 from src.audio import SoundManager
-from src.ui import Menu, draw_hud
+from src.ui import Menu, ProfilerOverlay, render_text
+from src.render import WorldRenderer, window_size
+from replay import Recorder, Replay, ReplayCursor, ReplayError
+from profiler import Profiler
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Pacman Nova")
+    parser.add_argument("--record", metavar="PATH", help="ghi input từng bước logic ra file .pnrp")
+    parser.add_argument("--replay", metavar="PATH", help="phát lại một file .pnrp thay vì chơi")
+    parser.add_argument("--speed", type=float, default=1.0, help="hệ số tốc độ khi phát lại có hình")
+    parser.add_argument("--headless", action="store_true", help="phát lại không vẽ, nhanh nhất có thể")
+    parser.add_argument("--maze", metavar="WxH", type=_maze_size, help="chơi trên mê cung sinh ngẫu nhiên cỡ WxH")
+    parser.add_argument("--horde", metavar="N", type=int, help="chế độ bầy đàn: N ghost mỗi màn")
+    return parser.parse_args(argv)
+
+
+def _maze_size(text: str):
+    try:
+        w, h = (int(v) for v in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected WxH, got {text!r}")
+    return w, h
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.replay and args.headless:
+        import replay
+        sys.exit(replay.main([args.replay]))
+
+    try:
+        replay = Replay.load(args.replay) if args.replay else None
+    except ReplayError as exc:
+        sys.exit(f"{args.replay}: {exc}")
+    prof = Profiler.from_env()
+    sim = Simulation(diff_idx=1, maze_size=replay.maze_size if replay else args.maze, profiler=prof,
+                     horde=replay.horde if replay else args.horde)
 
-
-def grid_surface(gmap: GameMap):
-    w = gmap.w * TILE_SIZE
-    h = gmap.h * TILE_SIZE
-    surf = pygame.Surface((w, h), pygame.SRCALPHA)
-    gmap.draw(surf)
-    return surf
-
-
-def main():
     pygame.init()
     pygame.display.set_caption("Pacman Nova")
-    screen = pygame.display.set_mode((24 * 24, 17 * 24 + HUD_HEIGHT))  # phù hợp map
+    # mọi level của một phiên cùng cỡ (map.LEVELS hoặc cùng --maze), nên cửa sổ cố định
+    screen = pygame.display.set_mode(window_size(sim.gmap))
     clock = pygame.time.Clock()
 
     # Font
@@ -48,7 +80,8 @@ def main():
         "xl": pygame.font.SysFont("arial", 36, bold=True),
     }
 
-    sound = SoundManager(DEFAULT_VOLUME)
+    sound_cache = os.path.join(os.path.dirname(os.path.abspath(__file__)), SOUND_CACHE_FILE) if SOUND_CACHE_FILE else None
+    sound = SoundManager(DEFAULT_VOLUME, cache_path=sound_cache)
 
     # State
     STATE_MENU = "menu"
@@ -59,92 +92,54 @@ def main():
     state = STATE_MENU
 
     menu = Menu(font, sound)
-    diff_idx = 1
-
-    level_idx = 0
-    gmap = GameMap(level_idx)
-    map_surf = grid_surface(gmap)
-
-    # Entities
-    p1 = Player(1, gmap.p1_spawn, COLOR_P1)
-    p2 = Player(2, gmap.p2_spawn, COLOR_P2)
-    players = [p1, p2]
-
-    ghosts = []
-    boss = None
-
-    items = ItemsManager(gmap.w, gmap.h, gmap.is_blocked)
-    particles = ParticleSystem()
-
-    fright_timer = Timer(0.0)
 
-    def start_level(idx: int):
-        nonlocal gmap, map_surf, ghosts, boss, level_idx, items
-        level_idx = idx
-        gmap = GameMap(level_idx)
-        map_surf = grid_surface(gmap)
-        items = ItemsManager(gmap.w, gmap.h, gmap.is_blocked)
-
-        # đặt người chơi về spawn
-        for i, pl in enumerate(players):
-            spawn = gmap.p1_spawn if i == 0 else gmap.p2_spawn
-            pl.tx, pl.ty = spawn
-            pl.x = spawn[0] * TILE_SIZE + TILE_SIZE / 2
-            pl.y = spawn[1] * TILE_SIZE + TILE_SIZE / 2
-            pl.dir = (0, 0)
-
-        # sinh ghost và boss theo độ khó
-        d = DIFFICULTIES[diff_idx]
-        ghosts = []
-        for i in range(d.ghost_count):
-            # spawn quanh trung tâm
-            gx = gmap.w // 2 + random.randint(-3, 3)
-            gy = gmap.h // 2 + random.randint(-2, 2)
-            gx = max(1, min(gmap.w - 2, gx))
-            gy = max(1, min(gmap.h - 2, gy))
-            if not gmap.is_blocked(gx, gy):
-                ghosts.append(Ghost(i, (gx, gy), speed_mult=d.ghost_speed_mult))
-        if d.boss_present and level_idx % 2 == 1:
-            boss = Boss(gmap.boss_spawn, speed_mult=d.ghost_speed_mult)
-        else:
-            boss = None
-        return ghosts, boss
-
-    ghosts, boss = start_level(level_idx)
-
-    # UI phụ
-    def draw_world():
-        screen.fill(COLOR_BG)
-        screen.blit(map_surf, (0, 0))
-        items.draw(screen)
-        for g in ghosts:
-            g.draw(screen)
-        if boss and boss.alive():
-            boss.draw(screen)
-        for pl in players:
-            pl.draw(screen)
-        particles.draw(screen)
-        draw_hud(screen, font, p1, p2, level_idx)
-
-    # Vòng game
+    recorder = Recorder() if args.record else None
+    cursor = None
+    speed = 1.0
+    if args.replay:
+        # phát lại: bỏ qua menu, ván mới/nâng cấp do bản ghi điều khiển
+        cursor = ReplayCursor(replay)
+        speed = max(0.01, args.speed)
+        state = STATE_PLAY
+    max_steps = MAX_CATCHUP_STEPS * max(1, math.ceil(speed))
+
+    # Dirty-rect hay flip toàn màn hình (F2 để so sánh A/B)
+    dirty = os.environ.get("PACMAN_DIRTY_RECTS", "1" if DIRTY_RECT_RENDERING else "0") != "0"
+    renderer = WorldRenderer(screen, font, dirty=dirty, profiler=prof)
+    overlay = ProfilerOverlay()
+    show_overlay = prof.enabled
+    trace_out = os.environ.get("PACMAN_PROFILE_OUT")
+
+    # Vòng game: tích luỹ thời gian thực, tiêu theo bước logic cố định
+    accumulator = 0.0
     running = True
     while running:
-        dt = min(0.033, clock.tick(60) / 1000.0)
+        frame_time = clock.tick(RENDER_FPS) / 1000.0
+        prof.frame()
+        tp = prof.mark()
         for ev in pygame.event.get():
             if ev.type == pygame.QUIT:
                 running = False
+            if ev.type == pygame.KEYDOWN and ev.key == pygame.K_F2:
+                renderer.set_dirty(not renderer.dirty)
+                renderer.reset_stats()
+            if ev.type == pygame.KEYDOWN and ev.key == pygame.K_F3:
+                show_overlay = not show_overlay
+                prof.set_enabled(show_overlay or bool(trace_out))
+            if ev.type == pygame.KEYDOWN and ev.key == pygame.K_F4 and prof.trace:
+                path = trace_out or f"profile-{pygame.time.get_ticks()}.json"
+                prof.dump(path)
+                print(f"profiler trace -> {path} ({len(prof.trace)} samples)")
             if state == STATE_MENU:
                 if ev.type == pygame.KEYDOWN and ev.key == pygame.K_RETURN:
                     sel = menu.selected()
                     if sel == "Start":
                         sound.menu()
                         state = STATE_PLAY
-                        p1.score = 0
-                        p2.score = 0
-                        p1.health = p1.health_max
-                        p2.health = p2.health_max
-                        level_idx = 0
-                        ghosts, boss = start_level(level_idx)
+                        accumulator = 0.0
+                        sim.new_game()
+                        if recorder:
+                            recorder.new_game(sim.seed, sim.diff_idx, sim.maze_size, sim.horde)
                     elif sel == "Settings":
                         state = STATE_SETTINGS
                         sound.menu()
@@ -158,19 +153,20 @@ def main():
                         state = STATE_MENU
                         sound.menu()
                     elif ev.key in (pygame.K_LEFT, pygame.K_a):
-                        diff_idx = (diff_idx - 1) % len(DIFFICULTIES)
+                        sim.diff_idx = (sim.diff_idx - 1) % len(DIFFICULTIES)
                         sound.menu()
                     elif ev.key in (pygame.K_RIGHT, pygame.K_d):
-                        diff_idx = (diff_idx + 1) % len(DIFFICULTIES)
+                        sim.diff_idx = (sim.diff_idx + 1) % len(DIFFICULTIES)
                         sound.menu()
             elif state == STATE_UPGRADE:
                 if ev.type == pygame.KEYDOWN and ev.key in (pygame.K_1, pygame.K_2, pygame.K_3, pygame.K_4):
                     idx = {pygame.K_1:0, pygame.K_2:1, pygame.K_3:2, pygame.K_4:3}[ev.key]
-                    # Mỗi người chọn một upgrade giống nhau cho đơn giản
-                    p1.upgrade(UPGRADES[idx])
-                    p2.upgrade(UPGRADES[idx])
+                    sim.apply_upgrade(UPGRADES[idx])
+                    if recorder:
+                        recorder.upgrade(idx)
                     state = STATE_PLAY
-                    ghosts, boss = start_level(level_idx)
+                    accumulator = 0.0
+                    sim.start_level(sim.level_idx)
 
             elif state == STATE_GAMEOVER:
                 if ev.type == pygame.KEYDOWN:
@@ -179,186 +175,106 @@ def main():
                         sound.menu()
 
         keys = pygame.key.get_pressed()
+        tp = prof.lap("events", tp)
 
         if state == STATE_MENU:
             menu.draw(screen)
             # settings hint
-            s = font["sm"].render("Use Up/Down + Enter. Settings: change difficulty with Left/Right. Esc to back.", True, COLOR_TEXT)
+            s = render_text(font["sm"], "Use Up/Down + Enter. Settings: change difficulty with Left/Right. Esc to back.")
             screen.blit(s, (screen.get_width()//2 - s.get_width()//2, screen.get_height()-60))
 
         elif state == STATE_SETTINGS:
             screen.fill((8, 8, 16))
-            t = font["xl"].render("Settings", True, COLOR_TEXT)
+            t = render_text(font["xl"], "Settings")
             screen.blit(t, (screen.get_width()//2 - t.get_width()//2, 80))
-            d = DIFFICULTIES[diff_idx]
-            dtxt = font["lg"].render(f"Difficulty: {d.name} (ghosts={d.ghost_count}, boss={'Yes' if d.boss_present else 'No'})", True, COLOR_TEXT)
+            d = DIFFICULTIES[sim.diff_idx]
+            dtxt = render_text(font["lg"], f"Difficulty: {d.name} (ghosts={d.ghost_count}, boss={'Yes' if d.boss_present else 'No'})")
             screen.blit(dtxt, (screen.get_width()//2 - dtxt.get_width()//2, 180))
-            hint = font["sm"].render("Left/Right to change. Esc to return.", True, COLOR_TEXT)
+            hint = render_text(font["sm"], "Left/Right to change. Esc to return.")
             screen.blit(hint, (screen.get_width()//2 - hint.get_width()//2, 230))
 
         elif state == STATE_PLAY:
-            # Input & kỹ năng
-            p1.handle_input(keys, True)
-            p1.handle_skills(keys, True)
-            p2.handle_input(keys, False)
-            p2.handle_skills(keys, False)
-
-            # Hút pellet nếu nam châm (đơn giản: ăn pellet trong bán kính)
-            for pl in (p1, p2):
-                rad = pl.magnet_pulse_radius()
-                cx, cy = pl.pixel_center()
-                # quét một vùng nhỏ lân cận
-                min_tx = int(max(0, (cx - rad) // TILE_SIZE))
-                max_tx = int(min(gmap.w - 1, (cx + rad) // TILE_SIZE))
-                min_ty = int(max(0, (cy - rad) // TILE_SIZE))
-                max_ty = int(min(gmap.h - 1, (cy + rad) // TILE_SIZE))
-                eaten = 0
-                for ty in range(min_ty, max_ty + 1):
-                    for tx in range(min_tx, max_tx + 1):
-                        if (tx, ty) in gmap.pellets:
-                            px = tx * TILE_SIZE + TILE_SIZE // 2
-                            py = ty * TILE_SIZE + TILE_SIZE // 2
-                            dx = px - cx
-                            dy = py - cy
-                            if dx * dx + dy * dy <= rad * rad:
-                                eaten += gmap.eat_pellet(tx, ty)
-                if eaten:
-                    sc = eaten * PELLET_SCORE
-                    pl.score += sc
-                    sound.eat()
-
-            # Ăn power pellet
-            for pl in (p1, p2):
-                tx = int(pl.x // TILE_SIZE)
-                ty = int(pl.y // TILE_SIZE)
-                if gmap.eat_power(tx, ty):
-                    for g in ghosts:
-                        g.set_fright()
-                    pl.score += POWER_FRIGHT_BONUS
-                    sound.power()
-
-            # Ăn pellet khi đi qua tâm ô
-            for pl in (p1, p2):
-                tx = int(pl.x // TILE_SIZE)
-                ty = int(pl.y // TILE_SIZE)
-                if gmap.eat_pellet(tx, ty):
-                    pl.score += PELLET_SCORE
-                    sound.eat()
-
-            # Nhặt item
-            for pl in (p1, p2):
-                got = items.try_pickup(pl, sound, particles)
-                if got:
-                    pl.score += ITEM_SCORE
-
-            # Cập nhật logic
-            p1.update(dt, gmap.is_blocked)
-            p2.update(dt, gmap.is_blocked)
-            items.update(dt)
-            particles.update(dt)
-
-            # Ghost cập nhật
-            for g in ghosts:
-                g.update(dt, gmap.is_blocked, gmap.w, gmap.h, players, ghosts)
-
-            # Boss cập nhật
-            if boss and boss.alive():
-                boss.update(dt, gmap.is_blocked, gmap.w, gmap.h, players)
-
-            # Xử lý bomb / trap từ item
-            for pl in (p1, p2):
-                if pl.trigger_bomb:
-                    sound.explosion()
-                    particles.spawn_explosion(pl.pixel_center(), count=40)
-                    # dọa ma: nếu ma trong bán kính thì fright
-                    bx, by = pl.pixel_center()
-                    r2 = (TILE_SIZE * 5) ** 2
-                    for g in ghosts:
-                        dx = g.x - bx
-                        dy = g.y - by
-                        if dx * dx + dy * dy <= r2:
-                            g.set_fright()
-                    # gây sát thương lên boss
-                    if boss and boss.alive():
-                        dx = boss.x - bx
-                        dy = boss.y - by
-                        if dx * dx + dy * dy <= r2:
-                            boss.hurt(2)
-                            pl.score += 100
-                    pl.trigger_bomb = False
-                if pl.place_trap:
-                    # đơn giản: đặt bẫy làm chậm ma (biến fright ngắn)
-                    bx, by = pl.pixel_center()
-                    for g in ghosts:
-                        dx = g.x - bx
-                        dy = g.y - by
-                        if dx * dx + dy * dy <= (TILE_SIZE * 2) ** 2:
-                            g.set_fright()
-                    pl.place_trap = False
-
-            # Va chạm ma -> gây sát thương
-            for g in ghosts[:]:
-                for pl in (p1, p2):
-                    if g.hit_player(pl) and not pl.is_invisible():
-                        pl.hurt(1)
-                        sound.hit()
-                        # thưởng khi ma đang fright (coi như hạ ma)
-                        if g.state == "fright":
-                            pl.score += GHOST_SCORE
-                            ghosts.remove(g)
-                            break
-
-            # Va chạm boss
-            if boss and boss.alive():
-                for pl in (p1, p2):
-                    if boss.hit_player(pl) and not pl.is_invisible():
-                        pl.hurt(2)
-                        sound.hit()
-
-            # Thua
-            if p1.health <= 0 and p2.health <= 0:
+            inputs = [PlayerInput.from_keys(keys, True), PlayerInput.from_keys(keys, False)]
+            accumulator += frame_time * speed
+            steps = 0
+            while accumulator >= LOGIC_DT and steps < max_steps:
+                if cursor:
+                    inputs = cursor.next_inputs(sim)
+                    if inputs is None:
+                        running = False
+                        break
+                elif recorder:
+                    recorder.tick(inputs)
+                for name in sim.step(LOGIC_DT, inputs):
+                    getattr(sound, name)()
+                accumulator -= LOGIC_DT
+                steps += 1
+                if sim.status != STATUS_PLAY:
+                    break
+            if steps == max_steps:
+                # khung quá chậm: bỏ phần nợ thay vì cố bù (tránh spiral of death)
+                accumulator = min(accumulator, LOGIC_DT)
+            prof.lap("logic", tp)
+
+            if sim.status != STATUS_PLAY and recorder:
+                recorder.check(sim)
+            if cursor:
+                pass  # khi phát lại, bản ghi tự chuyển màn / sang ván mới
+            elif sim.status == STATUS_LOST:
                 state = STATE_GAMEOVER
-                sound.hit()
-
-            # Thắng level khi hết pellet
-            if gmap.pellets_remaining() == 0 and (not boss or not boss.alive()):
-                # thưởng
-                p1.score += 200
-                p2.score += 200
-                sound.power()
+            elif sim.status == STATUS_CLEARED:
                 # chọn nâng cấp
-                level_idx += 1
-                if level_idx >= len(GameMap.__dict__.get("LEVELS", [0, 1, 2])):  # không dùng; chỉ để linter yên
-                    pass
                 state = STATE_UPGRADE
 
-            # Vẽ
-            draw_world()
+            # Vẽ, nội suy giữa hai bước logic gần nhất
+            if show_overlay:
+                voices = sound.voice_stats()
+                dropped = sum(v["dropped"] + v["coalesced"] for v in voices.values())
+                played = sum(v["played"] for v in voices.values())
+                overlay.update(prof.overlay_lines([f"sound played {played}, coalesced/dropped {dropped}"]))
+            renderer.overlay = overlay.panel if show_overlay else None
+            renderer.draw(sim, min(1.0, accumulator / LOGIC_DT))
 
         elif state == STATE_UPGRADE:
             screen.fill((10, 10, 18))
-            t = font["xl"].render("Chọn nâng cấp (1-4)", True, COLOR_TEXT)
+            t = render_text(font["xl"], "Chọn nâng cấp (1-4)")
             screen.blit(t, (screen.get_width()//2 - t.get_width()//2, 80))
             for i, up in enumerate(UPGRADES):
-                line = font["lg"].render(f"{i+1}. {up}", True, COLOR_TEXT)
+                line = render_text(font["lg"], f"{i+1}. {up}")
                 screen.blit(line, (screen.get_width()//2 - line.get_width()//2, 160 + i * 40))
-            s = font["sm"].render("Sau khi chọn, level tiếp theo sẽ bắt đầu.", True, COLOR_TEXT)
+            s = render_text(font["sm"], "Sau khi chọn, level tiếp theo sẽ bắt đầu.")
             screen.blit(s, (screen.get_width()//2 - s.get_width()//2, 340))
 
         elif state == STATE_GAMEOVER:
             screen.fill((8, 8, 16))
-            t = font["xl"].render("Game Over", True, COLOR_TEXT)
+            t = render_text(font["xl"], "Game Over")
             screen.blit(t, (screen.get_width()//2 - t.get_width()//2, 120))
-            sc = font["lg"].render(f"Score P1: {p1.score}  |  Score P2: {p2.score}", True, COLOR_TEXT)
+            sc = render_text(font["lg"], f"Score P1: {sim.players[0].score}  |  Score P2: {sim.players[1].score}")
             screen.blit(sc, (screen.get_width()//2 - sc.get_width()//2, 200))
-            h = font["md"].render("Press Enter to return to Menu", True, COLOR_TEXT)
+            h = render_text(font["md"], "Press Enter to return to Menu")
             screen.blit(h, (screen.get_width()//2 - h.get_width()//2, 260))
 
-        pygame.display.flip()
-
+        if state == STATE_PLAY:
+            renderer.present()
+            if renderer.frames >= 120:
+                mode = "dirty" if renderer.dirty else "full"
+                pygame.display.set_caption(f"Pacman Nova [{mode}: {renderer.fill_ratio() * 100:.0f}% px/frame]")
+                renderer.reset_stats()
+        else:
+            pygame.display.flip()
+            renderer.invalidate()
+
+    if trace_out and prof.trace:
+        prof.dump(trace_out)
+        print(f"profiler trace -> {trace_out} ({len(prof.trace)} samples)")
+    if recorder:
+        recorder.end(sim if state == STATE_PLAY else None)
+        recorder.save(args.record)
+    if cursor:
+        print(f"replay done: {cursor.checks - cursor.mismatches}/{cursor.checks} checksums ok")
     pygame.quit()
     sys.exit(0)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,152 +1,298 @@
 """
 Quản lý bản đồ, pellet, power pellet, và va chạm tường.
 Bao gồm nhiều màn chơi với độ khó tăng dần.
+Trạng thái map là một lưới uint8 cờ bit (tường/pellet/power/spawn); truy cập
+từng ô qua bytearray dùng chung bộ nhớ với mảng numpy cho truy vấn theo vùng.
+GameMap nhận chỉ số level, một level dạng chuỗi, hoặc lưới cờ bit dựng sẵn
+(mê cung từ mazegen.generate_maze, level đã biên dịch từ levelcache).
 """
 
-from typing import List, Set, Tuple
+import os
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Union
+import numpy as np
 import pygame
-from settings import TILE_SIZE, GRID_OUTLINE, COLOR_WALL, COLOR_PELLET, COLOR_POWER
+from settings import (
+    TILE_SIZE, GRID_OUTLINE, COLOR_WALL, COLOR_PELLET, COLOR_POWER, NAV_TABLE_MAX_TILES,
+    HPA_SECTOR_SIZE, HPA_MAX_EXPANSIONS
+)
+from utils import JunctionGraph, NavTable, SectorGraph
 
 LevelStr = List[str]
 
+# Cờ bit của một ô trong GameMap.grid
+TILE_WALL = 1
+TILE_PELLET = 2
+TILE_POWER = 4
+TILE_SPAWN = 8
 
-LEVELS: List[LevelStr] = [
-    # Level 1
-    [
-        "XXXXXXXXXXXXXXXXXXXXXXXXX",
-        "X.........X.....X......X",
-        "X.XXX.XXX.X.XXX.X.XXXX.X",
-        "X.X.....X...X.....X....X",
-        "X.X.XXX.XXXXX.XXX.X.XX.X",
-        "X...X.............X....X",
-        "XXX.X.XXX.XXX.XXX.X.XXXX",
-        "X...X.X...X...X...X....X",
-        "X.XXX.X.XXX.B.XXX.X.XX.X",
-        "X.....X...P.....Q.X....X",
-        "X.XXX.XXX.XXX.XXX.XXX..X",
-        "X.X........O........X..X",
-        "X.X.XXX.XXXXX.XXX.X.XX.X",
-        "X.X.....X...X.....X....X",
-        "X.XXX.XXX.X.XXX.X.XX.X.X",
-        "X.........X.....X......X",
-        "XXXXXXXXXXXXXXXXXXXXXXXXX",
-    ],
-    # Level 2
-    [
-        "XXXXXXXXXXXXXXXXXXXXXXXXX",
-        "X.....X....X....X......X",
-        "X.XXX.X.XX.X.XX.X.XXXX.X",
-        "X.X...X..X...X..X...X..X",
-        "X.X.XXXXX.XXX.XXXXX.X..X",
-        "X...X.............X....X",
-        "XXX.X.XXX.XXX.XXX.X.XXXX",
-        "X...X.X...X...X...X....X",
-        "X.XXX.X.XXX.B.XXX.X.XX.X",
-        "X..O..X...P.....Q.X..O.X",
-        "X.XXX.XXX.XXX.XXX.XXX..X",
-        "X.X........O........X..X",
-        "X.X.XXX.XXXXX.XXX.XXX..X",
-        "X.X.....X...X.....X....X",
-        "X.XXX.XXX.X.XXX.X.XX.X.X",
-        "X.....X....X....X......X",
-        "XXXXXXXXXXXXXXXXXXXXXXXXX",
-    ],
-    # Level 3 (hẹp hơn, boss khó hơn)
-    [
-        "XXXXXXXXXXXXXXXXXXXXXXXXX",
-        "X...X...X...X...X......X",
-        "X.X.X.X.X.X.X.X.X.XXXX.X",
-        "X.X.X.X.X.X.X.X.X.X..X.X",
-        "X.X.X.XXX.B.XXX.X.X..X.X",
-        "X......................X",
-        "XXX.XXX.XXX.XXX.XXX.XXXX",
-        "X...X...X...X...X....O.X",
-        "X.XXX.XXX.XXX.XXX.XX.X.X",
-        "X.....X...P.....Q.X....X",
-        "X.XXX.XXX.XXX.XXX.XXX..X",
-        "X.O..................O.X",
-        "X.XXX.XXX.XXX.XXX.XXX..X",
-        "X...X...X...X...X......X",
-        "X.X.X.X.X.X.X.X.X.XX.X.X",
-        "X...X...X...X...X......X",
-        "XXXXXXXXXXXXXXXXXXXXXXXXX",
-    ],
-]
+
+# Level nằm trong thư mục levels/, mỗi tệp levelN.txt một màn (xem parse_level_text).
+LEVEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "levels")
+
+
+def parse_level_text(text: str) -> Tuple[LevelStr, Dict[str, str]]:
+    """
+    Tách một tệp level thành (các hàng lưới, metadata).
+    Phần đầu là các dòng "khoá: giá trị" (dòng trống và dòng bắt đầu bằng # bị bỏ qua),
+    tiếp theo là dòng "---" rồi tới lưới: X tường, . pellet, O power pellet,
+    P/Q spawn người chơi 1/2, B spawn boss. Khoá dùng được:
+      name     tên màn
+      ghosts   số ghost của màn (bỏ trống thì theo độ khó)
+      p1, p2, boss   "x,y" ghi đè vị trí spawn trong lưới
+    """
+    lines = text.splitlines()
+    try:
+        sep = next(i for i, line in enumerate(lines) if line.strip() == "---")
+    except StopIteration:
+        raise ValueError("level file needs a '---' line between metadata and grid") from None
+    meta: Dict[str, str] = {}
+    for line in lines[:sep]:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        key, _, value = line.partition(":")
+        meta[key.strip().lower()] = value.strip()
+    rows = [row.rstrip() for row in lines[sep + 1:] if row.strip()]
+    if not rows:
+        raise ValueError("level file has an empty grid")
+    return rows, meta
+
+
+def level_files() -> List[str]:
+    names = sorted(n for n in os.listdir(LEVEL_DIR) if n.endswith(".txt"))
+    return [os.path.join(LEVEL_DIR, n) for n in names]
+
+
+def read_level(path: str) -> Tuple[LevelStr, Dict[str, str]]:
+    with open(path, encoding="utf-8") as f:
+        return parse_level_text(f.read())
+
+
+LEVEL_FILES: List[str] = level_files()
+# Lưới dạng chuỗi của từng màn, giữ cho code cũ và GameMap(chỉ số level)
+LEVELS: List[LevelStr] = [read_level(p)[0] for p in LEVEL_FILES]
+
+
+@lru_cache(maxsize=1024)
+def _disk_offsets(radius: float, ox: int, oy: int, stride: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+    """
+    Mặt nạ đĩa dựng sẵn: offset (dx, dy) tính theo ô, so với ô chứa tâm, của mọi ô
+    có tâm nằm trong bán kính radius (pixel); kèm offset phẳng theo stride của lưới
+    và bán kính k (ô) của hình vuông bao. ox, oy là vị trí tâm bên trong ô của nó.
+    Chỉ vài bán kính nam châm x TILE_SIZE^2 vị trí lệch, nên cache nhỏ và luôn trúng.
+    """
+    k = int(radius // TILE_SIZE) + 1
+    off = np.arange(-k, k + 1)
+    px = off * TILE_SIZE + TILE_SIZE // 2 - ox
+    py = off * TILE_SIZE + TILE_SIZE // 2 - oy
+    inside = px[None, :] ** 2 + py[:, None] ** 2 <= radius * radius
+    dys, dxs = np.nonzero(inside)
+    dxs, dys = off[dxs], off[dys]
+    return dxs, dys, dys * stride + dxs, k
 
 
 class GameMap:
-    def __init__(self, level_index: int):
-        self.level = LEVELS[level_index % len(LEVELS)]
-        self.h = len(self.level)
-        self.w = len(self.level[0])
-        self.walls: Set[Tuple[int, int]] = set()
-        self.pellets: Set[Tuple[int, int]] = set()
-        self.powers: Set[Tuple[int, int]] = set()
+    def __init__(self, level: Union[int, LevelStr, np.ndarray],
+                 spawns: Optional[Dict[str, Tuple[int, int]]] = None, nav: Optional[NavTable] = None):
+        if isinstance(level, np.ndarray):
+            self.level: Optional[LevelStr] = None
+            self.h, self.w = level.shape
+        else:
+            self.level = LEVELS[level % len(LEVELS)] if isinstance(level, int) else level
+            self.h = len(self.level)
+            self.w = len(self.level[0])
+        # _cells (bytearray, truy cập vô hướng nhanh) và grid (numpy, truy vấn vùng) cùng một bộ nhớ
+        self._size = self.w * self.h
+        self._cells = bytearray(self._size)
+        self._flat = np.frombuffer(self._cells, dtype=np.uint8)
+        self.grid = self._flat.reshape(self.h, self.w)
         self.boss_spawn: Tuple[int, int] = (self.w // 2, self.h // 2)
         self.p1_spawn: Tuple[int, int] = (1, 1)
         self.p2_spawn: Tuple[int, int] = (self.w - 2, self.h - 2)
-        self._parse()
+        # các ô vừa bị ăn, renderer lấy ra để xoá đúng ô đó khỏi lớp pellet
+        self._eaten: List[Tuple[int, int]] = []
+        # các ô có pellet/power trở lại do rollback (restore_cells), renderer vẽ lại
+        self._restored: List[Tuple[int, int]] = []
+        if self.level is None:
+            self.grid[:] = level
+            spawns = spawns or {}
+            self.p1_spawn = spawns.get("p1", self.p1_spawn)
+            self.p2_spawn = spawns.get("p2", self.p2_spawn)
+            self.boss_spawn = spawns.get("boss", self.boss_spawn)
+        else:
+            self._parse()
+        self._remaining = int(np.count_nonzero(self.grid & (TILE_PELLET | TILE_POWER)))
+        # Mê cung không đổi trong màn: dựng bảng dẫn đường một lần cho ghost (chỉ map nhỏ),
+        # trừ khi đã có bảng dựng sẵn (level biên dịch trong cache)
+        self.nav: Optional[NavTable] = nav
+        if nav is None:
+            walkable = self.walkable_mask()
+            if np.count_nonzero(walkable) <= NAV_TABLE_MAX_TILES:
+                self.nav = NavTable(walkable)
+        # ngã rẽ và hành lang: ghost chỉ cần quyết định hướng ở ngã rẽ
+        self.junctions = JunctionGraph(self.walkable_mask())
+        if self.nav is None:
+            # map lớn: HPA* trên các khu (bảng mỗi khu tính lần đầu ghost đi qua)
+            self.junctions.sectors = SectorGraph(self.junctions, HPA_SECTOR_SIZE, HPA_MAX_EXPANSIONS)
 
     def _parse(self):
+        cells = self._cells
         for y, row in enumerate(self.level):
+            base = y * self.w
             for x, ch in enumerate(row):
                 if ch == "X":
-                    self.walls.add((x, y))
-                elif ch == ".":
-                    self.pellets.add((x, y))
+                    cells[base + x] = TILE_WALL
                 elif ch == "O":
-                    self.powers.add((x, y))
-                elif ch == "P":
-                    self.p1_spawn = (x, y)
-                    self.pellets.add((x, y))
-                elif ch == "Q":
-                    self.p2_spawn = (x, y)
-                    self.pellets.add((x, y))
-                elif ch == "B":
-                    self.boss_spawn = (x, y)
-                    self.pellets.add((x, y))
+                    cells[base + x] = TILE_POWER
+                elif ch in "PQB":
+                    cells[base + x] = TILE_PELLET | TILE_SPAWN
+                    if ch == "P":
+                        self.p1_spawn = (x, y)
+                    elif ch == "Q":
+                        self.p2_spawn = (x, y)
+                    else:
+                        self.boss_spawn = (x, y)
                 else:
-                    self.pellets.add((x, y)) if ch != "X" else None
+                    cells[base + x] = TILE_PELLET
+
+    def walkable_mask(self) -> np.ndarray:
+        return (self.grid & TILE_WALL) == 0
 
+    def _flags(self, x: int, y: int) -> int:
+        if 0 <= x < self.w and 0 <= y < self.h:
+            return self._cells[y * self.w + x]
+        return 0
+
+    # is_blocked/pellet_at nằm trong vòng lặp nóng (A*, va chạm người chơi): viết thẳng, không gọi lồng.
+    # Ngoài biên coi như ô trống (giống khi map còn dùng set).
     def is_blocked(self, x: int, y: int) -> bool:
-        return (x, y) in self.walls
+        if x < 0 or y < 0 or x >= self.w:
+            return False
+        i = y * self.w + x
+        return i < self._size and self._cells[i] & TILE_WALL != 0
 
     def pellet_at(self, x: int, y: int) -> bool:
-        return (x, y) in self.pellets
+        if x < 0 or y < 0 or x >= self.w:
+            return False
+        i = y * self.w + x
+        return i < self._size and self._cells[i] & TILE_PELLET != 0
 
     def power_at(self, x: int, y: int) -> bool:
-        return (x, y) in self.powers
+        return bool(self._flags(x, y) & TILE_POWER)
 
-    def eat_pellet(self, x: int, y: int) -> int:
-        if (x, y) in self.pellets:
-            self.pellets.remove((x, y))
+    def _eat(self, x: int, y: int, flag: int) -> int:
+        if self._flags(x, y) & flag:
+            self._cells[y * self.w + x] &= ~flag & 0xFF
+            self._remaining -= 1
+            self._eaten.append((x, y))
             return 1
         return 0
 
+    def eat_pellet(self, x: int, y: int) -> int:
+        return self._eat(x, y, TILE_PELLET)
+
     def eat_power(self, x: int, y: int) -> int:
-        if (x, y) in self.powers:
-            self.powers.remove((x, y))
-            return 1
-        return 0
+        return self._eat(x, y, TILE_POWER)
+
+    def eat_pellets_in_radius(self, center: Tuple[int, int], radius: float) -> Tuple[int, List[Tuple[int, int]]]:
+        """
+        Ăn mọi pellet có tâm ô nằm trong bán kính radius (pixel) quanh center (pixel).
+        Trả về (số pellet đã ăn, danh sách ô đã ăn).
+        """
+        cx, cy = int(center[0]), int(center[1])
+        w = self.w
+        dxs, dys, flat, k = _disk_offsets(float(radius), cx % TILE_SIZE, cy % TILE_SIZE, w)
+        tx, ty = cx // TILE_SIZE, cy // TILE_SIZE
+        if k <= tx < w - k and k <= ty < self.h - k:
+            # đĩa nằm gọn trong map: dùng thẳng offset phẳng, không cần lọc biên
+            idx = flat + (ty * w + tx)
+        else:
+            xs = dxs + tx
+            ys = dys + ty
+            ok = (xs >= 0) & (xs < w) & (ys >= 0) & (ys < self.h)
+            idx = ys[ok] * w + xs[ok]
+        cells = self._flat
+        idx = idx[(cells[idx] & TILE_PELLET) != 0]
+        if not len(idx):
+            return 0, []
+        cells[idx] &= ~np.uint8(TILE_PELLET)
+        tiles = [(i % w, i // w) for i in idx.tolist()]
+        self._remaining -= len(tiles)
+        self._eaten.extend(tiles)
+        return len(tiles), tiles
 
     def pellets_remaining(self) -> int:
-        return len(self.pellets) + len(self.powers)
+        return self._remaining
+
+    # --- Truy vấn vector hoá ---
+    def tiles_with(self, flag: int) -> np.ndarray:
+        """Toạ độ (x, y) của mọi ô có cờ flag, mảng (n, 2)."""
+        ys, xs = np.nonzero(self.grid & flag)
+        return np.stack([xs, ys], axis=1)
+
+    def region(self, x0: int, y0: int, x1: int, y1: int) -> np.ndarray:
+        """View (không copy) của lưới trong hình chữ nhật [x0, x1) x [y0, y1), đã cắt theo biên."""
+        return self.grid[max(0, y0):max(0, min(self.h, y1)), max(0, x0):max(0, min(self.w, x1))]
+
+    def count_in_region(self, flag: int, x0: int, y0: int, x1: int, y1: int) -> int:
+        return int(np.count_nonzero(self.region(x0, y0, x1, y1) & flag))
+
+    def drain_eaten(self) -> List[Tuple[int, int]]:
+        """Trả về và xoá danh sách ô pellet/power đã bị ăn từ lần gọi trước."""
+        eaten, self._eaten = self._eaten, []
+        return eaten
 
-    def draw(self, surf: pygame.Surface):
-        # Vẽ tường
-        for (x, y) in self.walls:
-            rect = pygame.Rect(x * TILE_SIZE, y * TILE_SIZE, TILE_SIZE, TILE_SIZE)
+    def save_cells(self, out: Optional[bytearray] = None) -> bytearray:
+        """Chép lưới cờ vào out (dùng lại nếu đúng cỡ, không cấp phát) để rollback."""
+        if out is None or len(out) != self._size:
+            return bytearray(self._cells)
+        out[:] = self._cells
+        return out
+
+    def restore_cells(self, cells: bytearray, remaining: int):
+        """Khôi phục lưới cờ đã lưu bằng save_cells; ô có pellet lại được ghi cho renderer."""
+        back = np.flatnonzero(np.frombuffer(cells, dtype=np.uint8) & ~self._flat & (TILE_PELLET | TILE_POWER))
+        if len(back):
+            ys, xs = np.divmod(back, self.w)
+            self._restored.extend(zip(xs.tolist(), ys.tolist()))
+        self._cells[:] = cells
+        self._remaining = remaining
+
+    def drain_restored(self) -> List[Tuple[int, int]]:
+        restored, self._restored = self._restored, []
+        return restored
+
+    def tile_rect(self, x: int, y: int) -> pygame.Rect:
+        return pygame.Rect(x * TILE_SIZE, y * TILE_SIZE, TILE_SIZE, TILE_SIZE)
+
+    def _tiles_in(self, flag: int, area: Optional[Tuple[int, int, int, int]]) -> List[List[int]]:
+        """Ô có cờ flag trong vùng area = (x0, y0, x1, y1), toạ độ tính từ góc (x0, y0)."""
+        if area is None:
+            return self.tiles_with(flag).tolist()
+        x0, y0, x1, y1 = area
+        sub = self.region(x0, y0, x1, y1)
+        ys, xs = np.nonzero(sub & flag)
+        return np.stack([xs + (max(0, x0) - x0), ys + (max(0, y0) - y0)], axis=1).tolist()
+
+    # area (x0, y0, x1, y1) giới hạn vùng ô cần vẽ; ô (x0, y0) nằm ở góc (0, 0) của surf
+    def draw_walls(self, surf: pygame.Surface, area: Optional[Tuple[int, int, int, int]] = None):
+        for x, y in self._tiles_in(TILE_WALL, area):
+            rect = self.tile_rect(x, y)
             pygame.draw.rect(surf, COLOR_WALL, rect)
             pygame.draw.rect(surf, (0, 0, 0), rect, GRID_OUTLINE)
 
-        # Vẽ pellet
-        for (x, y) in self.pellets:
+    def draw_pellets(self, surf: pygame.Surface, area: Optional[Tuple[int, int, int, int]] = None):
+        # pellet và power pellet đều nằm gọn trong ô của mình
+        for x, y in self._tiles_in(TILE_PELLET, area):
             cx = x * TILE_SIZE + TILE_SIZE // 2
             cy = y * TILE_SIZE + TILE_SIZE // 2
             pygame.draw.circle(surf, COLOR_PELLET, (cx, cy), 3)
-
-        # Vẽ power pellet
-        for (x, y) in self.powers:
+        for x, y in self._tiles_in(TILE_POWER, area):
             cx = x * TILE_SIZE + TILE_SIZE // 2
             cy = y * TILE_SIZE + TILE_SIZE // 2
-            pygame.draw.circle(surf, COLOR_POWER, (cx, cy), 6)
\ No newline at end of file
+            pygame.draw.circle(surf, COLOR_POWER, (cx, cy), 6)
+
+    def draw(self, surf: pygame.Surface, area: Optional[Tuple[int, int, int, int]] = None):
+        self.draw_walls(surf, area)
+        self.draw_pellets(surf, area)
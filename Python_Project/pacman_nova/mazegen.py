@@ -0,0 +1,71 @@
+"""
+Sinh mê cung ngẫu nhiên có seed cho GameMap, tới MAZE_MAX_SIZE x MAZE_MAX_SIZE ô.
+Thuật toán sidewinder, vector hoá bằng numpy (không có vòng lặp Python theo ô),
+nên map 1000x1000 sinh trong vài chục ms. Sidewinder cho cây khung (mọi ô nối
+nhau); sau đó đục thêm một phần tường ngẫu nhiên (MAZE_BRAID) để có vòng như
+mê cung Pacman, rồi rải power pellet và đặt điểm spawn quanh tâm.
+
+Ví dụ: GameMap(*generate_maze(301, 201, seed=7))
+"""
+
+from typing import Dict, Tuple
+
+import numpy as np
+
+from settings import MAZE_MAX_SIZE, MAZE_BRAID, MAZE_POWER_EVERY
+from map import TILE_WALL, TILE_PELLET, TILE_POWER, TILE_SPAWN
+
+MAZE_MIN_SIZE = 5
+
+
+def generate_maze(w: int, h: int, seed: int = 0, braid: float = MAZE_BRAID,
+                  power_every: int = MAZE_POWER_EVERY) -> Tuple[np.ndarray, Dict[str, Tuple[int, int]]]:
+    """
+    Trả về (lưới cờ bit h x w dạng uint8, {"p1", "p2", "boss": ô spawn}).
+    Ô ở toạ độ lẻ là phòng, ô chẵn xen giữa là tường có thể bị đục; w, h chẵn thì
+    hàng/cột cuối là tường.
+    """
+    if not (MAZE_MIN_SIZE <= w <= MAZE_MAX_SIZE and MAZE_MIN_SIZE <= h <= MAZE_MAX_SIZE):
+        raise ValueError(f"maze size must be within {MAZE_MIN_SIZE}..{MAZE_MAX_SIZE}, got {w}x{h}")
+    rng = np.random.default_rng(seed)
+    cw, ch = (w - 1) // 2, (h - 1) // 2
+    grid = np.full((h, w), TILE_WALL, dtype=np.uint8)
+    # các view (không copy) vào grid: phòng, tường phía đông mỗi phòng, tường giữa hai hàng phòng
+    rooms = grid[1:2 * ch:2, 1:2 * cw:2]
+    east = grid[1:2 * ch:2, 2:2 * cw - 1:2]
+    north = grid[2:2 * ch - 1:2, 1:2 * cw:2]
+    rooms[:] = TILE_PELLET
+
+    # Sidewinder: hàng đầu là một hành lang; các hàng sau chia thành các đoạn (run)
+    # nối ngang, mỗi đoạn đục lên hàng trên tại một phòng ngẫu nhiên của nó.
+    east[0] = TILE_PELLET
+    close = rng.random((ch - 1, cw)) < 0.5
+    close[:, -1] = True
+    east[1:][~close[:, :-1]] = TILE_PELLET
+    ends = np.flatnonzero(close.ravel())
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    pick = starts + (rng.random(len(starts)) * (ends - starts + 1)).astype(np.int64)
+    up = np.zeros((ch - 1) * cw, dtype=bool)
+    up[pick] = True
+    north[up.reshape(ch - 1, cw)] = TILE_PELLET
+
+    # Đục thêm tường để tạo vòng (bớt ngõ cụt)
+    if braid > 0:
+        east[(east == TILE_WALL) & (rng.random(east.shape) < braid)] = TILE_PELLET
+        north[(north == TILE_WALL) & (rng.random(north.shape) < braid)] = TILE_PELLET
+
+    # Power pellet tại các phòng ngẫu nhiên
+    n_power = max(4, rooms.size // power_every)
+    ry, rx = np.divmod(rng.choice(rooms.size, size=min(n_power, rooms.size), replace=False), cw)
+    grid[2 * ry + 1, 2 * rx + 1] = TILE_POWER
+
+    # Spawn quanh tâm giống các level vẽ tay: boss giữa, hai người chơi hai bên
+    ccx, ccy = cw // 2, ch // 2
+    spawns = {
+        "boss": (2 * ccx + 1, 2 * ccy + 1),
+        "p1": (2 * max(0, ccx - 3) + 1, 2 * ccy + 1),
+        "p2": (2 * min(cw - 1, ccx + 3) + 1, 2 * ccy + 1),
+    }
+    for x, y in spawns.values():
+        grid[y, x] = TILE_PELLET | TILE_SPAWN
+    return grid, spawns
@@ -0,0 +1,620 @@
+"""
+Chơi co-op qua mạng: server asyncio có thẩm quyền (authoritative) chạy Simulation
+ở bước cố định LOGIC_HZ, nhận input của người chơi qua TCP và phát snapshot trạng
+thái NET_SNAPSHOT_HZ lần mỗi giây. Một event loop chứa nhiều trận cùng lúc: mọi trận
+bước chung một nhịp, giữa hai nhịp server chỉ ngủ (không quay vòng chiếm CPU).
+
+Giao thức (TCP, TCP_NODELAY): mỗi gói là <HB (độ dài payload, loại) + payload.
+    0x01 JOIN      C->S  tên trận (utf-8; rỗng = trận đầu tiên còn chỗ, không có thì tạo mới)
+    0x02 WELCOME   S->C  <BH slot (0 = P1, 1 = P2), LOGIC_HZ, rồi tên trận
+    0x03 MAP       S->C  <HHH level, w, h + lưới cờ bit nén zlib (gửi khi vào trận, đổi màn, hoặc lệch)
+    0x04 INPUT     C->S  <IB số thứ tự input, PlayerInput.pack()
+    0x05 SNAPSHOT  S->C  xem encode_snapshot
+    0x06 BYE       C->S  rời trận
+Snapshot mang toàn bộ vị trí/điểm/máu nhưng pellet chỉ gửi phần vừa bị ăn; client
+đọc chậm (bộ đệm gửi vượt NET_MAX_WRITE_BUFFER) bị bỏ snapshot và nhận lại MAP sau.
+Server tự chọn nâng cấp khi qua màn (lần lượt theo UPGRADES) và mở ván mới khi thua.
+Gói sai định dạng làm server ngắt client đó; trận lỗi khi bước/phát bị ghi log và bỏ,
+các trận khác chạy tiếp.
+
+    python netplay.py serve --port 7777
+    python netplay.py loadtest --clients 60 --seconds 10        (server + bot cùng tiến trình, loopback)
+    python netplay.py loadtest --connect 127.0.0.1:7777
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import random
+import socket
+import struct
+import time
+import zlib
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from settings import (
+    UPGRADES, LOGIC_HZ, LOGIC_DT, MAX_CATCHUP_STEPS,
+    TILE_SIZE, DIFFICULTIES, NET_PORT, NET_SNAPSHOT_HZ, NET_MAX_WRITE_BUFFER
+)
+from player import PlayerInput
+from items import ITEM_TYPES
+from simulation import Simulation, STATUS_PLAY, STATUS_CLEARED, STATUS_LOST
+from src.enemy import Ghost
+
+MSG_JOIN = 0x01
+MSG_WELCOME = 0x02
+MSG_MAP = 0x03
+MSG_INPUT = 0x04
+MSG_SNAPSHOT = 0x05
+MSG_BYE = 0x06
+
+_FRAME = struct.Struct("<HB")
+_WELCOME = struct.Struct("<BH")
+_MAP = struct.Struct("<HHH")
+_INPUT = struct.Struct("<IB")
+# tick, trạng thái, level, có boss, số ghost, số ô vừa ăn, số item
+_SNAP_HEAD = struct.Struct("<IBHBHHH")
+_SNAP_PLAYER = struct.Struct("<ffIbI")   # x, y, điểm, máu, input cuối đã áp dụng
+_SNAP_GHOST = struct.Struct("<HffBB")    # idx, x, y, fright, hướng đã chọn (Ghost.heading)
+_SNAP_BOSS = struct.Struct("<ffb")
+_SNAP_TILE = struct.Struct("<HH")
+_SNAP_ITEM = struct.Struct("<BHH")
+
+_STATUS_CODES = {STATUS_PLAY: 0, STATUS_CLEARED: 1, STATUS_LOST: 2}
+MAX_PLAYERS = 2
+log = logging.getLogger("netplay")
+# sai số làm tròn float32 của toạ độ trong snapshot (pixel)
+SNAP_EPSILON = 0.01
+
+
+def pack_msg(kind: int, payload: bytes = b"") -> bytes:
+    return _FRAME.pack(len(payload), kind) + payload
+
+
+async def read_msg(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    size, kind = _FRAME.unpack(await reader.readexactly(_FRAME.size))
+    return kind, await reader.readexactly(size) if size else b""
+
+
+def _no_delay(writer: asyncio.StreamWriter):
+    sock = writer.get_extra_info("socket")
+    if sock is not None:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+def encode_map(sim: Simulation) -> bytes:
+    gmap = sim.gmap
+    return _MAP.pack(sim.level_idx, gmap.w, gmap.h) + zlib.compress(gmap.grid.tobytes())
+
+
+def decode_map(payload: bytes) -> Tuple[int, np.ndarray]:
+    level, w, h = _MAP.unpack_from(payload)
+    grid = np.frombuffer(zlib.decompress(payload[_MAP.size:]), dtype=np.uint8).reshape(h, w)
+    return level, grid
+
+
+def encode_snapshot(sim: Simulation, last_seq: List[int], eaten: List[Tuple[int, int]]) -> bytes:
+    boss = sim.boss
+    items = sim.items.items
+    parts = [_SNAP_HEAD.pack(sim.ticks, _STATUS_CODES[sim.status], sim.level_idx, 1 if boss else 0,
+                             len(sim.ghosts), len(eaten), len(items))]
+    for pl, seq in zip(sim.players, last_seq):
+        parts.append(_SNAP_PLAYER.pack(pl.x, pl.y, pl.score, pl.health, seq))
+    parts += [_SNAP_GHOST.pack(g.idx, g.x, g.y, g.state == "fright", g.heading) for g in sim.ghosts]
+    if boss:
+        parts.append(_SNAP_BOSS.pack(boss.x, boss.y, boss.health))
+    parts += [_SNAP_TILE.pack(x, y) for x, y in eaten]
+    parts += [_SNAP_ITEM.pack(ITEM_TYPES.index(it.type), it.tx, it.ty) for it in items]
+    return b"".join(parts)
+
+
+@dataclass
+class Snapshot:
+    tick: int
+    status: int
+    level: int
+    players: List[Tuple[float, float, int, int, int]]
+    ghosts: List[Tuple[int, float, float, bool, int]]
+    boss: Optional[Tuple[float, float, int]]
+    eaten: List[Tuple[int, int]]
+    items: List[Tuple[str, int, int]]
+
+
+def decode_snapshot(payload: bytes) -> Snapshot:
+    tick, status, level, has_boss, n_ghosts, n_eaten, n_items = _SNAP_HEAD.unpack_from(payload)
+    pos = _SNAP_HEAD.size
+
+    def take(fmt: struct.Struct, count: int) -> list:
+        nonlocal pos
+        out = [fmt.unpack_from(payload, pos + i * fmt.size) for i in range(count)]
+        pos += count * fmt.size
+        return out
+    players = take(_SNAP_PLAYER, MAX_PLAYERS)
+    ghosts = [(i, x, y, bool(f), h) for i, x, y, f, h in take(_SNAP_GHOST, n_ghosts)]
+    boss = take(_SNAP_BOSS, 1)[0] if has_boss else None
+    eaten = take(_SNAP_TILE, n_eaten)
+    items = [(ITEM_TYPES[t], x, y) for t, x, y in take(_SNAP_ITEM, n_items)]
+    return Snapshot(tick, status, level, players, ghosts, boss, eaten, items)
+
+
+def _off(a: float, b: float) -> bool:
+    return abs(a - b) > SNAP_EPSILON
+
+
+def apply_snapshot(sim: Simulation, snap: Snapshot) -> int:
+    """
+    Ghi đè phần có thẩm quyền của snapshot lên sim cùng tick (client dự đoán dùng làm
+    hàm sửa khi rollback, xem rollback.py); trả về số đối tượng lệch so với dự đoán.
+    Toạ độ gửi dạng float32 nên chỉ sửa khi lệch quá SNAP_EPSILON pixel.
+    """
+    wrong = 0
+    for pl, (x, y, score, health, _) in zip(sim.players, snap.players):
+        if _off(pl.x, x) or _off(pl.y, y) or pl.score != score or pl.health != health:
+            pl.x, pl.y, pl.score, pl.health = x, y, score, health
+            wrong += 1
+    by_idx = {g.idx: g for g in sim.ghosts}
+    ghosts = []
+    for idx, x, y, fright, heading in snap.ghosts:
+        g = by_idx.pop(idx, None)
+        if g is None:
+            # client đoán nhầm là ma đã bị hạ: dựng lại tại chỗ
+            g = Ghost(idx, (int(x // TILE_SIZE), int(y // TILE_SIZE)),
+                      speed_mult=DIFFICULTIES[sim.diff_idx].ghost_speed_mult)
+        elif not (_off(g.x, x) or _off(g.y, y) or (g.state == "fright") != fright or g.heading != heading):
+            ghosts.append(g)
+            continue
+        wrong += 1
+        g.x, g.y = x, y
+        if fright and g.state != "fright":
+            g.set_fright()
+        elif not fright and g.state == "fright":
+            g.state = "chase"
+        g.heading = heading
+        g.path = []
+        ghosts.append(g)
+    # ma client còn giữ nhưng server đã hạ
+    wrong += len(by_idx)
+    sim.swarm.assign(ghosts)
+    boss = sim.boss
+    if boss and snap.boss:
+        x, y, health = snap.boss
+        if _off(boss.x, x) or _off(boss.y, y) or boss.health != health:
+            boss.x, boss.y, boss.health = x, y, health
+            wrong += 1
+    gmap = sim.gmap
+    for x, y in snap.eaten:
+        if gmap.eat_pellet(x, y) or gmap.eat_power(x, y):
+            wrong += 1
+    return wrong
+
+
+# --- Server ---
+
+@dataclass
+class ClientConn:
+    writer: asyncio.StreamWriter
+    match: "Match"
+    slot: int
+    bytes_in: int = 0
+    bytes_out: int = 0
+    dropped: int = 0
+    needs_map: bool = True
+
+    def send(self, data: bytes):
+        self.writer.write(data)
+        self.bytes_out += len(data)
+
+
+class Match:
+    """Một trận: Simulation riêng, tối đa hai người chơi; slot trống đứng yên."""
+
+    def __init__(self, name: str, seed: int):
+        self.name = name
+        self.sim = Simulation(seed=seed)
+        self.clients: List[Optional[ClientConn]] = [None] * MAX_PLAYERS
+        self.inputs = [PlayerInput() for _ in range(MAX_PLAYERS)]
+        self.last_seq = [0] * MAX_PLAYERS
+        self.eaten: List[Tuple[int, int]] = []
+
+    def free_slot(self) -> Optional[int]:
+        return next((i for i, c in enumerate(self.clients) if c is None), None)
+
+    def empty(self) -> bool:
+        return all(c is None for c in self.clients)
+
+    def step(self):
+        sim = self.sim
+        sim.step(LOGIC_DT, self.inputs)
+        self.eaten += sim.gmap.drain_eaten()
+        if sim.status == STATUS_PLAY:
+            return
+        if sim.status == STATUS_CLEARED:
+            sim.apply_upgrade(UPGRADES[(sim.level_idx - 1) % len(UPGRADES)])
+            sim.start_level(sim.level_idx)
+        else:
+            sim.new_game()
+        # map mới: mọi client nhận lại MAP, phần pellet cũ bỏ đi
+        self.eaten = []
+        for c in self.clients:
+            if c:
+                c.needs_map = True
+
+    def broadcast(self):
+        snap = None
+        for c in self.clients:
+            if c is None:
+                continue
+            if c.writer.transport.get_write_buffer_size() > NET_MAX_WRITE_BUFFER:
+                # client đọc không kịp: bỏ snapshot này, đồng bộ lại pellet bằng MAP lần sau
+                c.dropped += 1
+                c.needs_map = True
+                continue
+            if c.needs_map:
+                c.send(pack_msg(MSG_MAP, encode_map(self.sim)))
+                c.needs_map = False
+            if snap is None:
+                snap = pack_msg(MSG_SNAPSHOT, encode_snapshot(self.sim, self.last_seq, self.eaten))
+            c.send(snap)
+        self.eaten = []
+
+
+class GameServer:
+    def __init__(self, snapshot_hz: int = NET_SNAPSHOT_HZ, seed: Optional[int] = None):
+        self.matches: Dict[str, Match] = {}
+        self.snapshot_every = max(1, LOGIC_HZ // snapshot_hz)
+        self.rng = random.Random(seed)
+        self.ticks = 0
+        self.server: Optional[asyncio.AbstractServer] = None
+        self._next_id = 0
+        self.peak_matches = 0
+        # độ trễ bắt đầu nhịp so với lịch (ms) và thời gian xử lý mỗi nhịp (ms), cửa sổ gần nhất
+        self.lateness: Deque[float] = deque(maxlen=20000)
+        self.work: Deque[float] = deque(maxlen=20000)
+        self.skipped = 0
+        self._ticks0 = 0
+
+    async def start(self, host: str = "127.0.0.1", port: int = NET_PORT) -> int:
+        self.server = await asyncio.start_server(self._handle, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    def close(self):
+        if self.server:
+            self.server.close()
+
+    def _join(self, name: str, writer: asyncio.StreamWriter) -> ClientConn:
+        match = self.matches.get(name) if name else next(
+            (m for m in self.matches.values() if m.free_slot() is not None), None)
+        if match is None or match.free_slot() is None:
+            if not name or name in self.matches:
+                name = f"{name or 'match'}-{self._next_id}"
+            self._next_id += 1
+            match = self.matches[name] = Match(name, self.rng.getrandbits(63))
+            self.peak_matches = max(self.peak_matches, len(self.matches))
+        slot = match.free_slot()
+        conn = match.clients[slot] = ClientConn(writer, match, slot)
+        conn.send(pack_msg(MSG_WELCOME, _WELCOME.pack(slot, LOGIC_HZ) + name.encode()))
+        return conn
+
+    def _leave(self, conn: ClientConn):
+        match = conn.match
+        match.clients[conn.slot] = None
+        match.inputs[conn.slot] = PlayerInput()
+        # trận có thể đã bị _drop bỏ, tên đó giờ thuộc trận khác
+        if match.empty() and self.matches.get(match.name) is match:
+            del self.matches[match.name]
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        _no_delay(writer)
+        conn: Optional[ClientConn] = None
+        try:
+            while True:
+                kind, payload = await read_msg(reader)
+                if conn is not None:
+                    conn.bytes_in += _FRAME.size + len(payload)
+                if kind == MSG_INPUT and conn is not None:
+                    seq, b = _INPUT.unpack(payload)
+                    conn.match.inputs[conn.slot] = PlayerInput.unpack(b)
+                    conn.match.last_seq[conn.slot] = seq
+                elif kind == MSG_JOIN:
+                    if conn is not None:
+                        raise ValueError("JOIN twice")
+                    conn = self._join(payload.decode("utf-8"), writer)
+                elif kind == MSG_BYE:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except (struct.error, ValueError) as exc:
+            # gói sai định dạng (input sai cỡ, JOIN lặp hoặc tên không phải utf-8): ngắt client này
+            log.warning("dropping client %s: %s", writer.get_extra_info("peername"), exc)
+        finally:
+            if conn is not None:
+                self._leave(conn)
+            writer.close()
+
+    def _drop(self, match: Match):
+        """Bỏ trận bị lỗi: ghi log, đóng kết nối của nó; các trận khác không bị ảnh hưởng."""
+        log.exception("match %r failed, dropping it", match.name)
+        self.matches.pop(match.name, None)
+        for c in match.clients:
+            if c:
+                c.writer.close()
+
+    def tick(self):
+        for match in list(self.matches.values()):
+            try:
+                match.step()
+            except Exception:
+                self._drop(match)
+        self.ticks += 1
+        if self.ticks % self.snapshot_every == 0:
+            for match in list(self.matches.values()):
+                try:
+                    match.broadcast()
+                except Exception:
+                    self._drop(match)
+
+    async def run(self, stop: Optional[asyncio.Event] = None):
+        """Vòng nhịp cố định: ngủ tới mốc kế tiếp, bù tối đa MAX_CATCHUP_STEPS nhịp nếu trễ."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while stop is None or not stop.is_set():
+            now = loop.time()
+            self.lateness.append((now - deadline) * 1000.0)
+            steps = 0
+            while deadline <= now and steps < MAX_CATCHUP_STEPS:
+                self.tick()
+                deadline += LOGIC_DT
+                steps += 1
+            if deadline <= now:
+                # quá tải: bỏ phần nợ thay vì bù mãi
+                self.skipped += int((now - deadline) / LOGIC_DT) + 1
+                deadline = now + LOGIC_DT
+            self.work.append((loop.time() - now) * 1000.0)
+            await asyncio.sleep(max(0.0, deadline - loop.time()))
+
+    def reset_stats(self):
+        self.lateness.clear()
+        self.work.clear()
+        self.skipped = 0
+        self._ticks0 = self.ticks
+
+    def clients(self) -> List[ClientConn]:
+        return [c for m in self.matches.values() for c in m.clients if c]
+
+
+# --- Client ---
+
+class NetClient:
+    """Client tối giản: vào trận, gửi input, đọc snapshot (dùng cho bot và đo tải)."""
+
+    def __init__(self):
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.slot = -1
+        self.match = ""
+        self.seq = 0
+        self.grid: Optional[np.ndarray] = None
+        self.snapshot: Optional[Snapshot] = None
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    async def connect(self, host: str, port: int, match: str = ""):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        _no_delay(self.writer)
+        self._send(MSG_JOIN, match.encode())
+        kind, payload = await self.recv_raw()
+        if kind != MSG_WELCOME:
+            raise ConnectionError(f"expected WELCOME, got 0x{kind:02x}")
+        self.slot, _ = _WELCOME.unpack_from(payload)
+        self.match = payload[_WELCOME.size:].decode()
+
+    def _send(self, kind: int, payload: bytes = b""):
+        data = pack_msg(kind, payload)
+        self.writer.write(data)
+        self.bytes_out += len(data)
+
+    def send_input(self, inp: PlayerInput):
+        self.seq += 1
+        self._send(MSG_INPUT, _INPUT.pack(self.seq, inp.pack()))
+
+    async def recv_raw(self) -> Tuple[int, bytes]:
+        kind, payload = await read_msg(self.reader)
+        self.bytes_in += _FRAME.size + len(payload)
+        return kind, payload
+
+    async def recv(self) -> int:
+        """Đọc một gói và áp vào trạng thái cục bộ (lưới, snapshot mới nhất); trả loại gói."""
+        kind, payload = await self.recv_raw()
+        if kind == MSG_MAP:
+            _, grid = decode_map(payload)
+            self.grid = grid.copy()
+        elif kind == MSG_SNAPSHOT:
+            self.snapshot = decode_snapshot(payload)
+            if self.grid is not None:
+                for x, y in self.snapshot.eaten:
+                    self.grid[y, x] = 0
+        return kind
+
+    async def close(self):
+        if self.writer:
+            try:
+                self._send(MSG_BYE)
+                await self.writer.drain()
+            except ConnectionError:
+                pass
+            self.writer.close()
+
+
+# --- Đo tải qua loopback ---
+
+class _Countdown:
+    """Chờ tới khi done() được gọi đủ count lần."""
+
+    def __init__(self, count: int):
+        self.left = count
+        self.event = asyncio.Event()
+
+    def done(self):
+        self.left -= 1
+        if self.left <= 0:
+            self.event.set()
+
+    async def wait(self):
+        await self.event.wait()
+
+
+def _pct(values, qs=(50, 99, 100)) -> List[float]:
+    return np.percentile(np.asarray(values, dtype=np.float64), qs).tolist() if len(values) else [0.0] * len(qs)
+
+
+async def _bot(host: str, port: int, seconds: float, input_hz: float, seed: int, out: dict,
+               joined: "_Countdown"):
+    client = NetClient()
+    await client.connect(host, port)
+    joined.done()
+    await joined.wait()
+    rng = random.Random(seed)
+    intervals: List[float] = []
+    end = time.perf_counter() + seconds
+
+    async def reader():
+        last = None
+        while True:
+            if await client.recv() == MSG_SNAPSHOT:
+                now = time.perf_counter()
+                if last is not None:
+                    intervals.append((now - last) * 1000.0)
+                last = now
+
+    task = asyncio.ensure_future(reader())
+    inp = PlayerInput()
+    try:
+        while time.perf_counter() < end:
+            if rng.random() < 0.05:
+                dx, dy = rng.choice(((1, 0), (-1, 0), (0, 1), (0, -1)))
+                inp = PlayerInput(dx, dy, rng.random() < 0.05, rng.random() < 0.05)
+            client.send_input(inp)
+            await asyncio.sleep(1.0 / input_hz)
+    finally:
+        task.cancel()
+        await client.close()
+    out.update(bytes_in=client.bytes_in, bytes_out=client.bytes_out, intervals=intervals)
+
+
+async def load_test(clients: int, seconds: float, input_hz: float, connect: Optional[Tuple[str, int]]) -> dict:
+    server = None
+    stop = asyncio.Event()
+    if connect is None:
+        server = GameServer(seed=0)
+        host, port = "127.0.0.1", await server.start("127.0.0.1", 0)
+        runner = asyncio.ensure_future(server.run(stop))
+    else:
+        host, port = connect
+    results = [dict() for _ in range(clients)]
+    # đo từ lúc mọi bot đã vào trận (bỏ giai đoạn dựng trận lúc đầu)
+    joined = _Countdown(clients)
+    bots = asyncio.gather(*(_bot(host, port, seconds, input_hz, i, results[i], joined) for i in range(clients)))
+    await joined.wait()
+    if server is not None:
+        server.reset_stats()
+    t0 = time.perf_counter()
+    await bots
+    elapsed = time.perf_counter() - t0
+    report = {"clients": clients, "seconds": elapsed}
+    if server is not None:
+        report.update(matches_peak=server.peak_matches, ticks=server.ticks - server._ticks0,
+                      lateness=_pct(server.lateness), work=_pct(server.work),
+                      busy=sum(server.work) / 1000.0 / elapsed, skipped=server.skipped,
+                      dropped=sum(c.dropped for c in server.clients()))
+        stop.set()
+        await runner
+        server.close()
+    report["down"] = [r["bytes_in"] / elapsed for r in results]
+    report["up"] = [r["bytes_out"] / elapsed for r in results]
+    report["intervals"] = _pct([v for r in results for v in r["intervals"]])
+    return report
+
+
+def print_report(rep: dict):
+    print(f"{rep['clients']} clients, {rep['seconds']:.1f} s")
+    if "ticks" in rep:
+        lat, work = rep["lateness"], rep["work"]
+        print(f"server: {rep['matches_peak']} matches, {rep['ticks'] / rep['seconds']:.1f} ticks/s "
+              f"(target {LOGIC_HZ}), skipped {rep['skipped']}, dropped snapshots {rep['dropped']}")
+        print(f"  tick lateness ms: p50 {lat[0]:.2f} | p99 {lat[1]:.2f} | max {lat[2]:.2f}")
+        print(f"  work per wake-up ms: p50 {work[0]:.2f} | p99 {work[1]:.2f} | max {work[2]:.2f} "
+              f"(loop busy {rep['busy'] * 100:.0f}% of one core, clients included)")
+    down, up = np.asarray(rep["down"]), np.asarray(rep["up"])
+    iv = rep["intervals"]
+    print(f"per client: down {down.mean() / 1024:.2f} KiB/s (max {down.max() / 1024:.2f}), "
+          f"up {up.mean() / 1024:.2f} KiB/s")
+    print(f"snapshot interval ms (target {1000.0 / NET_SNAPSHOT_HZ:.1f}): "
+          f"p50 {iv[0]:.2f} | p99 {iv[1]:.2f} | max {iv[2]:.2f}")
+
+
+def _host_port(text: str) -> Tuple[str, int]:
+    host, _, port = text.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+async def _print_stats(server: GameServer, every: float):
+    while True:
+        server.reset_stats()
+        await asyncio.sleep(every)
+        lat = _pct(server.lateness)
+        clients = server.clients()
+        down = sum(c.bytes_out for c in clients)
+        print(f"{len(server.matches)} matches, {len(clients)} clients | "
+              f"{(server.ticks - server._ticks0) / every:.1f} ticks/s | lateness ms p50 {lat[0]:.2f} "
+              f"p99 {lat[1]:.2f} max {lat[2]:.2f} | busy {sum(server.work) / 10.0 / every:.0f}% | "
+              f"sent {down / 1024:.0f} KiB total", flush=True)
+
+
+async def serve(host: str, port: int, stats: float):
+    server = GameServer()
+    port = await server.start(host, port)
+    print(f"serving on {host}:{port} ({LOGIC_HZ} Hz logic, {NET_SNAPSHOT_HZ} Hz snapshots)", flush=True)
+    reporter = asyncio.ensure_future(_print_stats(server, stats)) if stats > 0 else None
+    try:
+        await server.run()
+    finally:
+        if reporter:
+            reporter.cancel()
+        server.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Pacman Nova authoritative server / loopback load test.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_serve = sub.add_parser("serve")
+    p_serve.add_argument("--host", default="127.0.0.1")
+    p_serve.add_argument("--port", type=int, default=NET_PORT)
+    p_serve.add_argument("--stats", type=float, default=5.0, metavar="SECONDS",
+                         help="in độ trễ nhịp và tải mỗi chừng này giây (0 = tắt)")
+    p_load = sub.add_parser("loadtest")
+    p_load.add_argument("--clients", type=int, default=60)
+    p_load.add_argument("--seconds", type=float, default=10.0)
+    p_load.add_argument("--input-hz", type=float, default=60.0, help="số gói input mỗi client gửi mỗi giây")
+    p_load.add_argument("--connect", metavar="HOST:PORT", type=_host_port,
+                        help="đo một server đang chạy thay vì tự dựng server trong tiến trình")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "serve":
+        try:
+            asyncio.run(serve(args.host, args.port, args.stats))
+        except KeyboardInterrupt:
+            pass
+        return 0
+    print_report(asyncio.run(load_test(args.clients, args.seconds, args.input_hz, args.connect)))
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main(sys.argv[1:]))
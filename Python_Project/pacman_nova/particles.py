@@ -1,62 +1,148 @@
 """
 Hiệu ứng hạt: nổ, vệt tốc độ, hào quang khiên.
 Giúp game sống động mà không cần asset ảnh.
+Lưu dạng structure-of-arrays: mỗi thuộc tính là một mảng numpy dung lượng cố định,
+cập nhật/sinh hạt bằng phép toán mảng, hạt chết được lấp chỗ bằng swap-remove.
+Khi vẽ, mỗi hạt dùng sprite vẽ sẵn từ cache LRU và cả khung blit một lần (Surface.blits).
 """
 
-import random
-from typing import List, Tuple
+from collections import OrderedDict
+from typing import Optional, Tuple
+import numpy as np
 import pygame
-from settings import COLOR_SPEED, COLOR_SHIELD
+from settings import (
+    COLOR_SPEED, COLOR_SHIELD, PARTICLE_CAPACITY, PARTICLE_SPRITE_CACHE, PARTICLE_ALPHA_STEP
+)
 
 
-class Particle:
-    def __init__(self, pos: Tuple[float, float], vel: Tuple[float, float], color, life: float, size: int):
-        self.x, self.y = pos
-        self.vx, self.vy = vel
-        self.color = color
-        self.life = life
-        self.size = size
+class SpriteCache:
+    """Cache LRU các hình tròn SRCALPHA theo khoá (r, g, b, size, alpha)."""
 
-    def update(self, dt: float):
-        self.x += self.vx * dt
-        self.y += self.vy * dt
-        self.life -= dt
+    def __init__(self, max_items: int = PARTICLE_SPRITE_CACHE):
+        self.max_items = max_items
+        self._items: "OrderedDict[int, pygame.Surface]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0  # mỗi lần miss là một Surface mới được cấp phát
+
+    def __len__(self) -> int:
+        return len(self._items)
 
-    def draw(self, surf: pygame.Surface):
-        if self.life > 0:
-            alpha = max(40, int(255 * min(1.0, self.life)))
-            col = (*self.color, alpha)
-            s = pygame.Surface((self.size * 2, self.size * 2), pygame.SRCALPHA)
-            pygame.draw.circle(s, col, (self.size, self.size), self.size)
-            surf.blit(s, (self.x - self.size, self.y - self.size))
+    def get(self, key: int) -> pygame.Surface:
+        items = self._items
+        surf = items.get(key)
+        if surf is not None:
+            items.move_to_end(key)
+            self.hits += 1
+            return surf
+        self.misses += 1
+        # khoá được đóng gói: rgb 24 bit | size 8 bit | alpha 8 bit
+        rgb, size, alpha = key >> 16, (key >> 8) & 0xFF, key & 0xFF
+        col = ((rgb >> 16) & 0xFF, (rgb >> 8) & 0xFF, rgb & 0xFF, alpha)
+        surf = pygame.Surface((size * 2, size * 2), pygame.SRCALPHA)
+        pygame.draw.circle(surf, col, (size, size), size)
+        items[key] = surf
+        if len(items) > self.max_items:
+            items.popitem(last=False)
+        return surf
 
 
 class ParticleSystem:
-    def __init__(self):
-        self.particles: List[Particle] = []
+    def __init__(self, capacity: int = PARTICLE_CAPACITY, seed: Optional[int] = None):
+        self.capacity = capacity
+        self.count = 0
+        self.pos = np.zeros((capacity, 2), dtype=np.float32)
+        self.vel = np.zeros((capacity, 2), dtype=np.float32)
+        self.life = np.zeros(capacity, dtype=np.float32)
+        self.size = np.zeros(capacity, dtype=np.int16)
+        self.color = np.zeros((capacity, 3), dtype=np.uint8)
+        self.rng = np.random.default_rng(seed)
+        self.sprites = SpriteCache()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _alloc(self, n: int) -> slice:
+        """Giữ chỗ n hạt ở cuối vùng sống; khi đầy chỉ cấp phần còn trống."""
+        start = self.count
+        n = max(0, min(n, self.capacity - start))
+        self.count = start + n
+        return slice(start, start + n)
 
     def spawn_explosion(self, pos: Tuple[float, float], color=(255, 160, 60), count: int = 30):
-        for _ in range(count):
-            ang = random.random() * 6.283
-            spd = random.uniform(60, 180)
-            vx = spd * float(pygame.math.Vector2(1, 0).rotate_rad(ang).x)
-            vy = spd * float(pygame.math.Vector2(1, 0).rotate_rad(ang).y)
-            self.particles.append(Particle(pos, (vx, vy), color, random.uniform(0.3, 0.7), random.randint(2, 4)))
+        sl = self._alloc(count)
+        n = sl.stop - sl.start
+        if n == 0:
+            return
+        rng = self.rng
+        ang = rng.random(n) * 6.283
+        spd = rng.uniform(60, 180, n)
+        self.pos[sl] = pos
+        self.vel[sl, 0] = spd * np.cos(ang)
+        self.vel[sl, 1] = spd * np.sin(ang)
+        self.life[sl] = rng.uniform(0.3, 0.7, n)
+        self.size[sl] = rng.integers(2, 5, n)
+        self.color[sl] = color
+
+    def _spawn_one(self, pos: Tuple[float, float], color, life: float, size: int):
+        sl = self._alloc(1)
+        if sl.stop == sl.start:
+            return
+        i = sl.start
+        self.pos[i] = pos
+        self.vel[i] = 0.0
+        self.life[i] = life
+        self.size[i] = size
+        self.color[i] = color
 
     def spawn_speed_trail(self, pos: Tuple[float, float]):
         jitter = 5
-        px = pos[0] + random.uniform(-jitter, jitter)
-        py = pos[1] + random.uniform(-jitter, jitter)
-        self.particles.append(Particle((px, py), (0, 0), COLOR_SPEED, 0.2, 2))
+        j = self.rng.uniform(-jitter, jitter, 2)
+        self._spawn_one((pos[0] + j[0], pos[1] + j[1]), COLOR_SPEED, 0.2, 2)
 
     def spawn_shield_glow(self, pos: Tuple[float, float]):
-        self.particles.append(Particle(pos, (0, 0), COLOR_SHIELD, 0.15, 3))
+        self._spawn_one(pos, COLOR_SHIELD, 0.15, 3)
 
     def update(self, dt: float):
-        for p in self.particles:
-            p.update(dt)
-        self.particles = [p for p in self.particles if p.life > 0]
+        n = self.count
+        if n == 0:
+            return
+        self.pos[:n] += self.vel[:n] * dt
+        self.life[:n] -= dt
+        alive = self.life[:n] > 0
+        k = int(np.count_nonzero(alive))
+        if k == n:
+            return
+        # swap-remove: lỗ hổng trong [0, k) được lấp bằng hạt sống trong [k, n)
+        holes = np.flatnonzero(~alive[:k])
+        donors = np.flatnonzero(alive[k:n]) + k
+        for arr in (self.pos, self.vel, self.life, self.size, self.color):
+            arr[holes] = arr[donors]
+        self.count = k
+
+    def bounds(self) -> Optional[pygame.Rect]:
+        """Hình chữ nhật bao mọi hạt đang sống (None nếu không có hạt)."""
+        n = self.count
+        if n == 0:
+            return None
+        size = self.size[:n]
+        x0 = float((self.pos[:n, 0] - size).min())
+        y0 = float((self.pos[:n, 1] - size).min())
+        x1 = float((self.pos[:n, 0] + size).max())
+        y1 = float((self.pos[:n, 1] + size).max())
+        return pygame.Rect(int(x0) - 1, int(y0) - 1, int(x1 - x0) + 3, int(y1 - y0) + 3)
 
-    def draw(self, surf: pygame.Surface):
-        for p in self.particles:
-            p.draw(surf)
\ No newline at end of file
+    def draw(self, surf: pygame.Surface, offset: Tuple[int, int] = (0, 0)):
+        n = self.count
+        if n == 0:
+            return
+        # alpha theo tuổi, lượng tử hoá để số sprite khác nhau luôn nhỏ
+        step = PARTICLE_ALPHA_STEP
+        alpha = np.maximum(40, (255 * np.minimum(1.0, self.life[:n])).astype(np.int64))
+        alpha = np.clip((alpha + step // 2) // step * step, 40, 255)
+        col = self.color[:n].astype(np.int64)
+        size = self.size[:n].astype(np.int64)
+        keys = (((col[:, 0] << 16) | (col[:, 1] << 8) | col[:, 2]) << 16) | (size << 8) | alpha
+        get = self.sprites.get
+        ox, oy = offset
+        surf.blits([(get(k), (x - r - ox, y - r - oy)) for k, (x, y), r in
+                    zip(keys.tolist(), self.pos[:n].tolist(), size.tolist())], doreturn=False)
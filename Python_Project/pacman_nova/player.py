@@ -6,6 +6,8 @@ P2: Dash (Left Shift), Nam châm (Space)
 
 from __future__ import annotations
 
+from dataclasses import dataclass
+from operator import attrgetter
 from typing import Tuple
 import pygame
 from settings import (
@@ -15,7 +17,49 @@ from settings import (
     MAGNET_BASE_RADIUS_TILES, MAGNET_PULSE_RADIUS_TILES, MAGNET_PULSE_COOLDOWN,
     COLOR_P1, COLOR_P2, COLOR_SHIELD
 )
-from utils import Timer, clamp
+from utils import Timer, clamp, lerp
+
+
+@dataclass
+class PlayerInput:
+    """Input của một người chơi trong một bước, tách khỏi bàn phím để chạy headless."""
+    dx: int = 0
+    dy: int = 0
+    skill1: bool = False  # P1: tăng tốc | P2: dash
+    skill2: bool = False  # P1: tàng hình | P2: nam châm
+
+    def pack(self) -> int:
+        """Mã hoá vào một byte: bit 0-1 dx+1, bit 2-3 dy+1, bit 4 skill1, bit 5 skill2."""
+        return (self.dx + 1) | ((self.dy + 1) << 2) | (int(self.skill1) << 4) | (int(self.skill2) << 5)
+
+    @classmethod
+    def unpack(cls, b: int) -> "PlayerInput":
+        return cls((b & 3) - 1, ((b >> 2) & 3) - 1, bool(b & 16), bool(b & 32))
+
+    @classmethod
+    def from_keys(cls, pressed, is_p1: bool) -> "PlayerInput":
+        if is_p1:
+            return cls(
+                int(pressed[pygame.K_RIGHT]) - int(pressed[pygame.K_LEFT]),
+                int(pressed[pygame.K_DOWN]) - int(pressed[pygame.K_UP]),
+                bool(pressed[pygame.K_RSHIFT]),
+                bool(pressed[pygame.K_RCTRL]),
+            )
+        return cls(
+            int(pressed[pygame.K_d]) - int(pressed[pygame.K_a]),
+            int(pressed[pygame.K_s]) - int(pressed[pygame.K_w]),
+            bool(pressed[pygame.K_LSHIFT]),
+            bool(pressed[pygame.K_SPACE]),
+        )
+
+
+# Thuộc tính logic thay đổi trong ván (không gồm idx, màu) và các Timer, để lưu/khôi phục khi rollback
+_STATE_ATTRS = ("tx", "ty", "x", "y", "prev_x", "prev_y", "vx", "vy", "dir", "speed_tiles", "health_max",
+                "health", "score", "magnet_radius_tiles", "place_trap", "trigger_bomb",
+                "upg_speed_bonus", "upg_invis_bonus", "upg_extra_hp")
+_get_state = attrgetter(*_STATE_ATTRS)
+_TIMERS = ("boost_timer", "boost_cd", "invis_timer", "invis_cd", "shield_timer", "dash_cd", "magnet_cd")
+_get_timers = attrgetter(*_TIMERS)
 
 
 class Player:
@@ -24,6 +68,7 @@ class Player:
         self.tx, self.ty = spawn
         self.x = self.tx * TILE_SIZE + TILE_SIZE / 2
         self.y = self.ty * TILE_SIZE + TILE_SIZE / 2
+        self.prev_x, self.prev_y = self.x, self.y  # vị trí ở bước logic trước, để nội suy khi vẽ
         self.vx = 0.0
         self.vy = 0.0
         self.dir = (0, 0)  # hướng mong muốn
@@ -54,6 +99,18 @@ class Player:
         self.upg_invis_bonus = 0.0
         self.upg_extra_hp = 0
 
+    def save_state(self) -> tuple:
+        timers = _get_timers(self)
+        return _get_state(self), tuple(t.duration for t in timers), tuple(t.time_left for t in timers)
+
+    def load_state(self, state: tuple):
+        values, durations, left = state
+        for name, v in zip(_STATE_ATTRS, values):
+            setattr(self, name, v)
+        for t, d, tl in zip(_get_timers(self), durations, left):
+            t.duration = d
+            t.time_left = tl
+
     def upgrade(self, name: str):
         if "Tăng tốc độ" in name:
             self.upg_speed_bonus += 0.3
@@ -81,6 +138,17 @@ class Player:
     def pixel_center(self) -> Tuple[int, int]:
         return int(self.x), int(self.y)
 
+    def place(self, tile: Tuple[int, int]):
+        """Đặt người chơi vào tâm ô (không nội suy từ vị trí cũ)."""
+        self.tx, self.ty = tile
+        self.x = self.prev_x = tile[0] * TILE_SIZE + TILE_SIZE / 2
+        self.y = self.prev_y = tile[1] * TILE_SIZE + TILE_SIZE / 2
+        self.dir = (0, 0)
+
+    def render_pos(self, alpha: float) -> Tuple[int, int]:
+        """Vị trí vẽ, nội suy giữa bước logic trước và hiện tại (alpha trong [0, 1])."""
+        return int(lerp(self.prev_x, self.x, alpha)), int(lerp(self.prev_y, self.y, alpha))
+
     def hurt(self, dmg: int):
         if self.has_shield():
             return
@@ -115,29 +183,21 @@ class Player:
             return MAGNET_PULSE_RADIUS_TILES * TILE_SIZE
         return self.magnet_radius_tiles * TILE_SIZE
 
-    def handle_input(self, pressed, is_p1: bool):
-        if is_p1:
-            dx = int(pressed[pygame.K_RIGHT]) - int(pressed[pygame.K_LEFT])
-            dy = int(pressed[pygame.K_DOWN]) - int(pressed[pygame.K_UP])
-            self.dir = (dx, dy) if abs(dx) + abs(dy) <= 1 else self.dir
-        else:
-            dx = int(pressed[pygame.K_d]) - int(pressed[pygame.K_a])
-            dy = int(pressed[pygame.K_s]) - int(pressed[pygame.K_w])
-            self.dir = (dx, dy) if abs(dx) + abs(dy) <= 1 else self.dir
-
-    def handle_skills(self, pressed, is_p1: bool):
-        if is_p1:
-            if pressed[pygame.K_RSHIFT] and self.boost_cd.ready():
+    def apply_input(self, inp: PlayerInput):
+        dx, dy = inp.dx, inp.dy
+        self.dir = (dx, dy) if abs(dx) + abs(dy) <= 1 else self.dir
+        if self.idx == 1:
+            if inp.skill1 and self.boost_cd.ready():
                 self.boost_timer.start()
                 self.boost_cd.start()
-            if pressed[pygame.K_RCTRL]:
+            if inp.skill2:
                 self.activate_invisibility()
         else:
-            if pressed[pygame.K_LSHIFT]:
+            if inp.skill1:
                 self.dash()
-            if pressed[pygame.K_SPACE] and self.magnet_cd.ready():
+            if inp.skill2 and self.magnet_cd.ready():
                 self.magnet_cd.start()  # phát xung nam châm ngắn
-                # tác dụng thực hiện ở main khi hút pellet
+                # tác dụng thực hiện ở Simulation khi hút pellet
 
     def update(self, dt: float, is_blocked):
         # cập nhật cooldown
@@ -174,8 +234,16 @@ class Player:
         if not blocked(self.x, ny):
             self.y = ny
 
-    def draw(self, surf):
-        cx, cy = self.pixel_center()
+    def bounds(self, alpha: float = 1.0) -> pygame.Rect:
+        """Vùng màn hình mà draw() có thể tô, kể cả vòng khiên (dùng cho dirty-rect)."""
+        cx, cy = self.render_pos(alpha)
+        r = TILE_SIZE // 2 - 2 + 6
+        return pygame.Rect(cx - r, cy - r, r * 2, r * 2)
+
+    def draw(self, surf, alpha: float = 1.0, offset: Tuple[int, int] = (0, 0)):
+        cx, cy = self.render_pos(alpha)
+        cx -= offset[0]
+        cy -= offset[1]
         r = TILE_SIZE // 2 - 2
         col = self.color
         if self.is_invisible():
@@ -0,0 +1,188 @@
+"""
+Đo thời gian theo phần của vòng game: input, nam châm, ghost AI, boss, item, hạt,
+va chạm, vẽ map, HUD, flip... Bật bằng PACMAN_PROFILE=1 hoặc F3 trong game
+(F3 hiện bảng p50/p99 từng phần và FPS ở góc màn hình).
+
+Mỗi phần giữ PROFILE_WINDOW mẫu gần nhất (ns, time.perf_counter_ns) trong ring
+buffer; phân vị chỉ tính khi cần (overlay làm mới vài lần mỗi giây). Khi bật,
+mọi mẫu còn vào trace (tối đa PROFILE_TRACE_MAX dòng) để xuất ra CSV hoặc JSON
+dạng Chrome trace (mở bằng chrome://tracing hoặc ui.perfetto.dev):
+PACMAN_PROFILE_OUT=trace.json ghi ra khi thoát game, F4 ghi ngay.
+
+Khi tắt: mark()/lap() trả 0 ngay, section() trả một context rỗng dùng chung,
+nên mỗi điểm đo chỉ tốn một lần gọi hàm.
+
+Các phần liên tiếp trong vòng lặp nóng:
+    t = prof.mark()
+    ...                         # input
+    t = prof.lap("input", t)
+    ...                         # ghost AI
+    t = prof.lap("ghosts", t)
+Phần lẻ:
+    with prof.section("hud"):
+        draw_hud(...)
+"""
+
+from __future__ import annotations
+
+import contextlib
+import csv
+import json
+import os
+from collections import deque
+from time import perf_counter_ns
+from typing import Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from settings import PROFILE_WINDOW, PROFILE_TRACE_MAX
+
+FRAME = "frame"
+_NULL_SECTION = contextlib.nullcontext()
+
+
+class _Ring:
+    """PROFILE_WINDOW mẫu gần nhất của một phần (list Python: ghi một phần tử rẻ hơn numpy)."""
+
+    __slots__ = ("buf", "pos", "count")
+
+    def __init__(self, size: int):
+        self.buf = [0] * size
+        self.pos = 0
+        self.count = 0
+
+    def add(self, ns: int):
+        self.buf[self.pos] = ns
+        self.pos += 1
+        if self.pos == len(self.buf):
+            self.pos = 0
+        if self.count < len(self.buf):
+            self.count += 1
+
+    def values(self) -> np.ndarray:
+        return np.array(self.buf[:self.count] if self.count < len(self.buf) else self.buf, dtype=np.int64)
+
+
+class _Section:
+    __slots__ = ("prof", "name", "start")
+
+    def __init__(self, prof: "Profiler", name: str):
+        self.prof = prof
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.prof.record(self.name, self.start, perf_counter_ns())
+        return False
+
+
+class Profiler:
+    def __init__(self, enabled: bool = False, window: int = PROFILE_WINDOW,
+                 trace_max: int = PROFILE_TRACE_MAX):
+        self.enabled = enabled
+        self.window = window
+        # thứ tự chèn = thứ tự gặp lần đầu, overlay giữ nguyên thứ tự đó
+        self.sections: Dict[str, _Ring] = {}
+        # (khung, phần, bắt đầu ns, thời lượng ns)
+        self.trace: Deque[Tuple[int, str, int, int]] = deque(maxlen=trace_max)
+        self.frame_no = 0
+        self._frame_start = 0
+
+    @classmethod
+    def from_env(cls) -> "Profiler":
+        """Bật nếu PACMAN_PROFILE khác 0 hoặc có PACMAN_PROFILE_OUT (cần ghi trace)."""
+        return cls(os.environ.get("PACMAN_PROFILE", "0") != "0" or bool(os.environ.get("PACMAN_PROFILE_OUT")))
+
+    def set_enabled(self, enabled: bool):
+        self.enabled = enabled
+        self._frame_start = 0
+
+    def mark(self) -> int:
+        return perf_counter_ns() if self.enabled else 0
+
+    def lap(self, name: str, start: int) -> int:
+        """Ghi phần name từ start tới bây giờ; trả mốc mới cho phần kế tiếp."""
+        if not self.enabled:
+            return 0
+        now = perf_counter_ns()
+        if start:
+            self.record(name, start, now)
+        return now
+
+    def section(self, name: str):
+        if not self.enabled:
+            return _NULL_SECTION
+        return _Section(self, name)
+
+    def record(self, name: str, start: int, end: int):
+        ring = self.sections.get(name)
+        if ring is None:
+            ring = self.sections[name] = _Ring(self.window)
+        ring.add(end - start)
+        self.trace.append((self.frame_no, name, start, end - start))
+
+    def frame(self):
+        """Gọi một lần mỗi khung, sau khi đẩy hình: ghi thời lượng cả khung (cho FPS)."""
+        if not self.enabled:
+            return
+        now = perf_counter_ns()
+        if self._frame_start:
+            self.record(FRAME, self._frame_start, now)
+        self._frame_start = now
+        self.frame_no += 1
+
+    def stats(self) -> Dict[str, Tuple[float, float, int]]:
+        """{phần: (p50 µs, p99 µs, số mẫu)} trên cửa sổ hiện tại."""
+        out = {}
+        for name, ring in self.sections.items():
+            vals = ring.values()
+            if len(vals):
+                p50, p99 = np.percentile(vals, (50, 99)) / 1000.0
+                out[name] = (float(p50), float(p99), len(vals))
+        return out
+
+    def fps(self) -> float:
+        ring = self.sections.get(FRAME)
+        if ring is None or not ring.count:
+            return 0.0
+        return 1e9 / float(ring.values().mean())
+
+    def reset(self):
+        self.sections.clear()
+        self.trace.clear()
+        self._frame_start = 0
+
+    def dump_csv(self, path: str):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(("frame", "section", "start_ns", "duration_ns"))
+            w.writerows(self.trace)
+
+    def dump_json(self, path: str):
+        # sự kiện "X" (complete) của Chrome trace, thời gian tính bằng µs
+        t0 = self.trace[0][2] if self.trace else 0
+        events = [{"name": name, "ph": "X", "ts": (start - t0) / 1000.0, "dur": dur / 1000.0,
+                   "pid": 0, "tid": 0, "args": {"frame": frame}}
+                  for frame, name, start, dur in self.trace]
+        summary = {name: {"p50_us": p50, "p99_us": p99, "samples": n}
+                   for name, (p50, p99, n) in self.stats().items()}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms", "summary": summary}, f)
+
+    def dump(self, path: str):
+        """Ghi trace theo đuôi file: .csv hoặc JSON (mọi đuôi khác)."""
+        if path.lower().endswith(".csv"):
+            self.dump_csv(path)
+        else:
+            self.dump_json(path)
+
+    def overlay_lines(self, extra: Optional[List[str]] = None) -> List[str]:
+        """Các dòng chữ cho bảng F3: FPS rồi p50/p99 từng phần."""
+        lines = [f"FPS {self.fps():5.1f}   (F3 ẩn, F4 ghi trace)"]
+        lines.append(f"{'phần':<14}{'p50 ms':>8}{'p99 ms':>8}")
+        for name, (p50, p99, _) in self.stats().items():
+            lines.append(f"{name:<14}{p50 / 1000.0:>8.3f}{p99 / 1000.0:>8.3f}")
+        return lines + (extra or [])
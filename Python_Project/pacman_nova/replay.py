@@ -0,0 +1,267 @@
+"""
+Ghi và phát lại phiên chơi.
+Simulation là tất định theo (seed, chuỗi input), nên chỉ cần ghi seed đầu ván,
+input mỗi bước logic của hai người chơi (mỗi người 1 byte, nén theo run-length)
+và các lựa chọn nâng cấp. File nhị phân:
+
+    header  b"PNRP" + <BH  (phiên bản, LOGIC_HZ lúc ghi)
+            bản ghi phiên bản < 4 (trước khi ghost lái theo ngã rẽ) phát lại với
+            Simulation.junction_steering = False để khớp checksum cũ; bản ghi < 5
+            (trước HPA*) phát lại với Simulation.hpa = False
+    0x01    <QB  ván mới (seed, độ khó)
+    0x02    <HBB run input (số bước, byte P1, byte P2)
+    0x03    <B   nâng cấp (chỉ số trong UPGRADES) rồi sang level kế
+    0x04    <I   checksum trạng thái (Simulation.state_digest) để kiểm tra khi phát lại
+    0x05         kết thúc (bắt buộc: thiếu nghĩa là file bị cắt)
+    0x06    <HH  cỡ mê cung sinh ngẫu nhiên cho các ván sau (0, 0 = map.LEVELS)
+    0x07    <H   số ghost chế độ bầy đàn cho các ván sau (0 = theo độ khó)
+
+Phát lại headless nhanh nhất có thể:  python replay.py session.pnrp
+Phát lại có hình, nhanh gấp 4:        python main.py --replay session.pnrp --speed 4
+"""
+
+from __future__ import annotations
+
+import struct
+import time
+from typing import List, Optional, Tuple
+
+from settings import UPGRADES, LOGIC_HZ
+from player import PlayerInput
+from simulation import Simulation
+
+MAGIC = b"PNRP"
+VERSION = 5
+# phiên bản đầu tiên ghi với ghost lái theo đồ thị ngã rẽ (JunctionGraph)
+JUNCTIONS_VERSION = 4
+# phiên bản đầu tiên ghi với HPA* (SectorGraph) trên map lớn
+HPA_VERSION = 5
+_HEADER = struct.Struct("<BH")
+
+REC_NEW_GAME = 0x01
+REC_INPUT = 0x02
+REC_UPGRADE = 0x03
+REC_CHECK = 0x04
+REC_END = 0x05
+REC_MAZE = 0x06
+REC_HORDE = 0x07
+
+_PAYLOAD = {
+    REC_NEW_GAME: struct.Struct("<QB"),
+    REC_INPUT: struct.Struct("<HBB"),
+    REC_UPGRADE: struct.Struct("<B"),
+    REC_CHECK: struct.Struct("<I"),
+    REC_END: struct.Struct("<"),
+    REC_MAZE: struct.Struct("<HH"),
+    REC_HORDE: struct.Struct("<H"),
+}
+_MAX_RUN = 0xFFFF
+
+
+class ReplayError(Exception):
+    pass
+
+
+class Recorder:
+    """Ghi phiên chơi vào bộ nhớ; save() ghi ra file."""
+
+    def __init__(self, logic_hz: int = LOGIC_HZ):
+        self.logic_hz = logic_hz
+        self.buf = bytearray(MAGIC + _HEADER.pack(VERSION, logic_hz))
+        self.ticks = 0
+        # run input đang mở: (byte P1, byte P2, số bước)
+        self._run: Optional[List[int]] = None
+
+    def _flush(self):
+        if self._run:
+            self._write(REC_INPUT, self._run[2], self._run[0], self._run[1])
+            self._run = None
+
+    def _write(self, kind: int, *values):
+        self.buf.append(kind)
+        self.buf += _PAYLOAD[kind].pack(*values)
+
+    def new_game(self, seed: int, diff_idx: int, maze_size: Optional[Tuple[int, int]] = None,
+                 horde: Optional[int] = None):
+        self._flush()
+        self._write(REC_MAZE, *(maze_size or (0, 0)))
+        self._write(REC_HORDE, horde or 0)
+        self._write(REC_NEW_GAME, seed, diff_idx)
+
+    def tick(self, inputs) -> None:
+        a, b = inputs[0].pack(), inputs[1].pack()
+        run = self._run
+        if run and run[0] == a and run[1] == b and run[2] < _MAX_RUN:
+            run[2] += 1
+        else:
+            self._flush()
+            self._run = [a, b, 1]
+        self.ticks += 1
+
+    def upgrade(self, idx: int):
+        self._flush()
+        self._write(REC_UPGRADE, idx)
+
+    def check(self, sim: Simulation):
+        self._flush()
+        self._write(REC_CHECK, sim.state_digest())
+
+    def end(self, sim: Optional[Simulation] = None):
+        if sim is not None:
+            self.check(sim)
+        self._flush()
+        self._write(REC_END)
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            f.write(self.buf)
+
+
+class Replay:
+    """Bản ghi đã giải mã thành danh sách (loại, giá trị...)."""
+
+    def __init__(self, logic_hz: int, records: List[Tuple], version: int = VERSION):
+        self.logic_hz = logic_hz
+        self.records = records
+        self.version = version
+
+    @property
+    def dt(self) -> float:
+        return 1.0 / self.logic_hz
+
+    @property
+    def maze_size(self) -> Optional[Tuple[int, int]]:
+        """Cỡ mê cung của ván đầu tiên (None nếu dùng map.LEVELS)."""
+        rec = next((r for r in self.records if r[0] == REC_MAZE), None)
+        return (rec[1], rec[2]) if rec and rec[1] else None
+
+    @property
+    def horde(self) -> Optional[int]:
+        """Số ghost chế độ bầy đàn của ván đầu tiên (None nếu theo độ khó)."""
+        rec = next((r for r in self.records if r[0] == REC_HORDE), None)
+        return rec[1] if rec and rec[1] else None
+
+    @property
+    def ticks(self) -> int:
+        return sum(r[1] for r in self.records if r[0] == REC_INPUT)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Replay":
+        if data[:4] != MAGIC:
+            raise ReplayError("not a replay file")
+        if len(data) < 4 + _HEADER.size:
+            raise ReplayError(f"truncated header at byte {len(data)}")
+        version, logic_hz = _HEADER.unpack_from(data, 4)
+        if not 1 <= version <= VERSION:
+            raise ReplayError(f"unsupported replay version {version}")
+        records = []
+        pos = 4 + _HEADER.size
+        while pos < len(data):
+            kind = data[pos]
+            fmt = _PAYLOAD.get(kind)
+            if fmt is None:
+                raise ReplayError(f"bad record 0x{kind:02x} at byte {pos}")
+            if pos + 1 + fmt.size > len(data):
+                raise ReplayError(f"truncated record at byte {pos}")
+            records.append((kind, *fmt.unpack_from(data, pos + 1)))
+            pos += 1 + fmt.size
+            if kind == REC_END:
+                break
+        if not records or records[-1][0] != REC_END:
+            raise ReplayError("missing end record")
+        return cls(logic_hz, records, version)
+
+    @classmethod
+    def load(cls, path: str) -> "Replay":
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+class ReplayCursor:
+    """Đọc tuần tự một Replay: áp dụng ván mới/nâng cấp lên sim và trả input từng bước."""
+
+    def __init__(self, replay: Replay):
+        self.replay = replay
+        self.pos = 0
+        self.left = 0
+        self.inputs: List[PlayerInput] = []
+        self.checks = 0
+        self.mismatches = 0
+
+    def next_inputs(self, sim: Simulation) -> Optional[List[PlayerInput]]:
+        """Input cho bước kế tiếp, hoặc None khi bản ghi đã hết."""
+        records = self.replay.records
+        while self.left == 0:
+            if self.pos >= len(records):
+                return None
+            rec = records[self.pos]
+            self.pos += 1
+            kind = rec[0]
+            if kind == REC_INPUT:
+                self.left = rec[1]
+                self.inputs = [PlayerInput.unpack(rec[2]), PlayerInput.unpack(rec[3])]
+            elif kind == REC_NEW_GAME:
+                sim.diff_idx = rec[2]
+                sim.junction_steering = self.replay.version >= JUNCTIONS_VERSION
+                sim.hpa = self.replay.version >= HPA_VERSION
+                sim.new_game(rec[1])
+            elif kind == REC_MAZE:
+                sim.maze_size = (rec[1], rec[2]) if rec[1] else None
+            elif kind == REC_HORDE:
+                sim.horde = rec[1] or None
+            elif kind == REC_UPGRADE:
+                sim.apply_upgrade(UPGRADES[rec[1]])
+                sim.start_level(sim.level_idx)
+            elif kind == REC_CHECK:
+                self.checks += 1
+                if sim.state_digest() != rec[1]:
+                    self.mismatches += 1
+            elif kind == REC_END:
+                self.pos = len(records)
+                return None
+        self.left -= 1
+        return self.inputs
+
+
+def run_headless(replay: Replay) -> Tuple[Simulation, ReplayCursor, float]:
+    """Chạy lại toàn bộ bản ghi không vẽ, nhanh nhất có thể; trả (sim, cursor, giây)."""
+    sim = Simulation()
+    cursor = ReplayCursor(replay)
+    dt = replay.dt
+    t0 = time.perf_counter()
+    while True:
+        inputs = cursor.next_inputs(sim)
+        if inputs is None:
+            break
+        sim.step(dt, inputs)
+    return sim, cursor, time.perf_counter() - t0
+
+
+def main(argv=None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Phát lại headless một bản ghi .pnrp và kiểm tra checksum.")
+    parser.add_argument("path")
+    args = parser.parse_args(argv)
+
+    try:
+        replay = Replay.load(args.path)
+    except ReplayError as exc:
+        print(f"{args.path}: {exc}")
+        return 1
+    sim, cursor, elapsed = run_headless(replay)
+    ticks = replay.ticks
+    print(f"{ticks} ticks in {elapsed:.2f} s -> {ticks / max(elapsed, 1e-9):.0f} ticks/s "
+          f"({ticks * replay.dt / max(elapsed, 1e-9):.0f}x real time)")
+    scores = " | ".join(f"P{i + 1}: {pl.score}" for i, pl in enumerate(sim.players))
+    print(f"final: level {sim.level_idx + 1}, {sim.status}, {scores}")
+    if cursor.mismatches:
+        print(f"DESYNC: {cursor.mismatches}/{cursor.checks} checksums differ")
+        return 1
+    print(f"checksums ok ({cursor.checks})")
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
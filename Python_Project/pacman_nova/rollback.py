@@ -0,0 +1,200 @@
+"""
+Dự đoán phía client và rollback: input cục bộ áp ngay vào Simulation của client,
+không chờ server. Trước mỗi tick, trạng thái logic được lưu vào một vòng ROLLBACK_TICKS
+slot SimState cấp sẵn (ghi đè tại chỗ) cùng input của tick đó; input người chơi ở xa
+chưa biết thì đoán bằng input cuối đã biết.
+
+Khi trạng thái có thẩm quyền của tick T tới (snapshot), rewind(T, sửa): nạp slot T,
+gọi sửa(sim) ghi đè phần server gửi, rồi chạy lại các tick T..hiện tại bằng input
+đã đệm với sim.effects = False (không sinh hạt, bỏ sự kiện âm thanh). Input ở xa
+biết muộn hơn thì set_input() sửa trong vòng trước khi rewind.
+
+Không quay qua ranh giới màn: slot lưu ở map khác (đổi màn, ván mới) coi như hết hạn.
+
+Thử headless (server + client dự đoán cùng tiến trình, trễ giả lập):
+    python rollback.py --latency 12 --ticks 3000
+"""
+
+from __future__ import annotations
+
+from time import perf_counter
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from settings import LOGIC_DT, ROLLBACK_TICKS
+from player import PlayerInput
+from simulation import Simulation, SimState, STATUS_PLAY
+
+_IDLE = PlayerInput()
+
+
+class Rollback:
+    def __init__(self, sim: Simulation, capacity: int = ROLLBACK_TICKS, dt: float = LOGIC_DT):
+        self.sim = sim
+        self.capacity = capacity
+        self.dt = dt
+        self.states = [SimState() for _ in range(capacity)]
+        self.inputs: List[List[PlayerInput]] = [[_IDLE] * len(sim.players) for _ in range(capacity)]
+        self.rollbacks = 0
+        self.resimulated = 0
+        self.last_resim_ms = 0.0
+
+    def can_rewind(self, tick: int) -> bool:
+        """Slot của tick còn trong vòng và được lưu ở map hiện tại."""
+        sim = self.sim
+        if not 0 <= sim.ticks - tick < self.capacity:
+            return False
+        st = self.states[tick % self.capacity]
+        return st.gmap is sim.gmap and st.ticks == tick
+
+    def step(self, inputs: Sequence[PlayerInput]) -> List[str]:
+        """Lưu trạng thái + input rồi tiến một tick; trả về sự kiện như Simulation.step."""
+        sim = self.sim
+        slot = sim.ticks % self.capacity
+        sim.save_state(self.states[slot])
+        self.inputs[slot][:] = inputs
+        return sim.step(self.dt, inputs)
+
+    def set_input(self, tick: int, player: int, inp: PlayerInput):
+        """Sửa input đã đệm của một người chơi tại tick (input ở xa tới muộn)."""
+        if self.can_rewind(tick):
+            self.inputs[tick % self.capacity][player] = inp
+
+    def predict_from(self, tick: int, player: int, inp: PlayerInput):
+        """Đoán input của player từ tick tới hiện tại bằng inp (input cuối đã biết)."""
+        now = self.sim.ticks
+        for t in range(max(tick, now - self.capacity + 1), now):
+            self.inputs[t % self.capacity][player] = inp
+
+    def rewind(self, tick: int, correct: Callable[[Simulation], object]) -> bool:
+        """
+        Quay về đầu tick, sửa bằng correct(sim) rồi chạy lại tới tick hiện tại.
+        False nếu tick đã ra khỏi vòng (hoặc thuộc màn khác): khi đó bên gọi nhận thẳng trạng thái.
+        """
+        sim = self.sim
+        now = sim.ticks
+        if not self.can_rewind(tick):
+            return False
+        t0 = perf_counter()
+        cap = self.capacity
+        sim.load_state(self.states[tick % cap])
+        correct(sim)
+        sim.effects = False
+        try:
+            for t in range(tick, now):
+                slot = t % cap
+                sim.save_state(self.states[slot])
+                sim.step(self.dt, self.inputs[slot])
+                if sim.status != STATUS_PLAY:
+                    break
+        finally:
+            sim.effects = True
+        self.rollbacks += 1
+        self.resimulated += now - tick
+        self.last_resim_ms = (perf_counter() - t0) * 1000.0
+        return True
+
+
+def _error(a: Simulation, b: Simulation) -> float:
+    """Độ lệch vị trí lớn nhất (pixel) giữa hai mô phỏng cùng tick: người chơi và ghost cùng idx."""
+    err = max(max(abs(p.x - q.x), abs(p.y - q.y)) for p, q in zip(a.players, b.players))
+    ghosts = {g.idx: g for g in b.ghosts}
+    for g in a.ghosts:
+        h = ghosts.get(g.idx)
+        if h is not None:
+            err = max(err, abs(g.x - h.x), abs(g.y - h.y))
+    return err
+
+
+def run_demo(ticks: int, latency: int, snapshot_every: int, seed: int = 0, diff: int = 1,
+             maze: Optional[Tuple[int, int]] = None) -> dict:
+    """
+    Server và client cùng seed; client điều khiển P1, P2 là bot ở xa. Snapshot tick T và
+    input P2 tới tick T tới client sau latency tick. Trả về thời gian chạy lại và độ lệch.
+    """
+    import random
+    from collections import deque
+
+    import numpy as np
+
+    from netplay import apply_snapshot, encode_snapshot, decode_snapshot
+    from simulation import random_inputs
+
+    server = Simulation(diff, seed=seed, maze_size=maze)
+    client = Simulation(diff, seed=seed, maze_size=maze)
+    rb = Rollback(client)
+    rng = random.Random(seed)
+    inputs = random_inputs(rng)
+    in_flight: deque = deque()          # (tick tới nơi, snapshot, input P2 cuối)
+    resim_ms: List[float] = []
+    resim_ticks: List[int] = []
+    errors: List[float] = []
+    corrected = 0
+    too_old = 0
+    games = 1
+    remote = _IDLE
+    for tick in range(ticks):
+        if tick % 20 == 0:
+            inputs = random_inputs(rng)
+        # client: P1 áp ngay, P2 đoán bằng input cuối đã biết
+        rb.step((inputs[0], remote))
+        server.step(LOGIC_DT, inputs)
+        client.gmap.drain_restored()
+        if server.status != STATUS_PLAY:
+            # bot chết nhanh: mở ván mới ở cả hai bên (client thật nhận MAP mới)
+            games += 1
+            for sim in (server, client):
+                sim.new_game(seed + games)
+            in_flight.clear()
+            remote = _IDLE
+            continue
+        if server.ticks % snapshot_every == 0:
+            payload = encode_snapshot(server, [0, 0], server.gmap.drain_eaten())
+            in_flight.append((tick + latency, decode_snapshot(payload), inputs[1]))
+        while in_flight and in_flight[0][0] <= tick:
+            _, snap, remote = in_flight.popleft()
+            rb.predict_from(snap.tick, 1, remote)
+            back = client.ticks - snap.tick
+            fixed = []
+            if rb.rewind(snap.tick, lambda sim: fixed.append(apply_snapshot(sim, snap))):
+                resim_ms.append(rb.last_resim_ms)
+                resim_ticks.append(back)
+                corrected += fixed[0] > 0
+            else:
+                too_old += 1
+        errors.append(_error(client, server))
+    ms = np.array(resim_ms or [0.0])
+    err = np.array(errors or [0.0])
+    return {
+        "ticks": ticks, "games": games, "rollbacks": rb.rollbacks, "corrected": corrected,
+        "too_old": too_old, "resim_ticks": float(np.mean(resim_ticks)) if resim_ticks else 0.0,
+        "resim_p50_ms": float(np.percentile(ms, 50)), "resim_p99_ms": float(np.percentile(ms, 99)),
+        "resim_max_ms": float(ms.max()), "per_tick_ms": float(ms.sum() / max(1, sum(resim_ticks))),
+        "error_p50": float(np.percentile(err, 50)), "error_p99": float(np.percentile(err, 99)),
+        "exact": float(np.mean(err < 0.5)),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Đo rollback: server + client dự đoán, trễ giả lập.")
+    parser.add_argument("--ticks", type=int, default=3000)
+    parser.add_argument("--latency", type=int, default=12, help="trễ một chiều, tính bằng tick")
+    parser.add_argument("--snapshot-every", type=int, default=4)
+    parser.add_argument("--maze", metavar="WxH")
+    args = parser.parse_args(argv)
+    maze = tuple(int(v) for v in args.maze.lower().split("x")) if args.maze else None
+    rep = run_demo(args.ticks, args.latency, args.snapshot_every, maze=maze)
+    print(f"{rep['ticks']} ticks, {rep['games']} games, {rep['rollbacks']} rollbacks "
+          f"({rep['corrected']} mispredicted, {rep['too_old']} too old), "
+          f"{rep['resim_ticks']:.1f} ticks resimulated each")
+    print(f"resim p50 {rep['resim_p50_ms']:.2f} ms, p99 {rep['resim_p99_ms']:.2f} ms, "
+          f"max {rep['resim_max_ms']:.2f} ms ({rep['per_tick_ms']:.3f} ms/tick)")
+    print(f"client vs server position error p50 {rep['error_p50']:.2f} px, p99 {rep['error_p99']:.2f} px, "
+          f"{rep['exact'] * 100:.1f}% of ticks within 0.5 px")
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main(sys.argv[1:]))
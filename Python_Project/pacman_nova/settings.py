@@ -28,6 +28,43 @@ COLOR_SHIELD = (70, 200, 255)
 COLOR_SPEED = (120, 255, 120)
 
 HUD_HEIGHT = 80
+# Số Surface chữ đã render giữ trong cache LRU (src/ui.py: text_cache)
+TEXT_CACHE_SIZE: int = 256
+
+# Cửa sổ vừa khít map nhưng không quá VIEWPORT_TILES ô; map lớn hơn thì camera cuộn theo người chơi.
+VIEWPORT_TILES = (32, 22)
+# Nền map vẽ theo khối MAP_CHUNK_TILES x MAP_CHUNK_TILES ô khi lần đầu hiện ra,
+# giữ tối đa MAP_CHUNK_CACHE khối (LRU) nên bộ nhớ không phụ thuộc cỡ map.
+MAP_CHUNK_TILES: int = 16
+MAP_CHUNK_CACHE: int = 48
+
+# Dirty-rect: chỉ đẩy các vùng thay đổi lên màn hình thay vì flip toàn bộ.
+# Ghi đè bằng biến môi trường PACMAN_DIRTY_RECTS=0/1, bật/tắt trong game bằng F2.
+DIRTY_RECT_RENDERING: bool = True
+
+# --- Vòng lặp ---
+# Logic chạy bước cố định LOGIC_HZ, tách khỏi tốc độ vẽ RENDER_FPS.
+# Mỗi khung vẽ chạy tối đa MAX_CATCHUP_STEPS bước logic; phần nợ còn lại bị bỏ
+# để một khung giật không kéo theo vòng xoáy bù bước.
+LOGIC_HZ: int = 120
+LOGIC_DT: float = 1.0 / LOGIC_HZ
+RENDER_FPS: int = 60
+MAX_CATCHUP_STEPS: int = 8
+
+# Server mạng (netplay.py): cổng mặc định, số snapshot gửi mỗi giây, và ngưỡng bộ đệm
+# gửi (byte) mà quá nó thì client bị coi là đọc chậm và bỏ snapshot.
+NET_PORT: int = 7777
+NET_SNAPSHOT_HZ: int = 30
+NET_MAX_WRITE_BUFFER: int = 64 * 1024
+# Client dự đoán (rollback.py): số tick gần nhất giữ trạng thái để quay lại khi snapshot
+# của server tới (40 tick ~ 333 ms trễ một chiều ở 120 Hz); snapshot cũ hơn thì nhận thẳng.
+ROLLBACK_TICKS: int = 40
+
+# Profiler (profiler.py): số mẫu gần nhất giữ cho mỗi phần, số dòng trace tối đa,
+# chu kỳ làm mới bảng F3 (giây). Bật sẵn bằng PACMAN_PROFILE=1.
+PROFILE_WINDOW: int = 600
+PROFILE_TRACE_MAX: int = 200_000
+PROFILE_OVERLAY_REFRESH: float = 0.25
 
 # --- Gameplay ---
 BASE_PLAYER_SPEED: float = 4.0  # tiles / s
@@ -51,6 +88,12 @@ MAGNET_PULSE_COOLDOWN: float = 8.0
 SHIELD_DURATION: float = 4.0
 SHIELD_COOLDOWN: float = 12.0
 
+# Số hạt tối đa sống cùng lúc (mảng cấp phát sẵn; hạt mới bị bỏ khi đầy)
+PARTICLE_CAPACITY: int = 16384
+# Sprite hạt vẽ sẵn theo (màu, cỡ, alpha lượng tử hoá), giữ tối đa N sprite (LRU)
+PARTICLE_SPRITE_CACHE: int = 512
+PARTICLE_ALPHA_STEP: int = 16
+
 ITEM_SPAWN_INTERVAL: float = 8.0
 ITEM_DESPAWN_TIME: float = 18.0
 
@@ -60,10 +103,26 @@ GHOST_SCORE: int = 200
 BOSS_SCORE: int = 1000
 POWER_FRIGHT_BONUS: int = 50
 
+# Bảng dẫn đường mọi cặp ô tốn O(n^2) bộ nhớ; chỉ dựng (kèm flow field) khi map có tối đa
+# chừng này ô đi được. Map lớn hơn thì ghost dùng HPA* (utils.SectorGraph).
+NAV_TABLE_MAX_TILES: int = 1024
+# HPA*: cạnh khu (ô) và số cửa tối đa được mở mỗi lần tìm đường; quá thì đi tới cửa gần đích nhất
+HPA_SECTOR_SIZE: int = 16
+HPA_MAX_EXPANSIONS: int = 1000
+
+# Mê cung sinh ngẫu nhiên (mazegen.py)
+MAZE_MAX_SIZE: int = 1000
+MAZE_BRAID: float = 0.08        # tỉ lệ tường giữa hai ô bị đục thêm để tạo vòng
+MAZE_POWER_EVERY: int = 150     # một power pellet cho mỗi chừng này ô
+
 GHOST_BASE_SPEED: float = 3.2     # tiles / s
 GHOST_SCATTER_TIME: float = 4.0
 GHOST_CHASE_TIME: float = 12.0
 GHOST_FRIGHT_TIME: float = 4.0
+# Chế độ bầy đàn (--horde N): ghost rải khắp map, cách spawn người chơi ít nhất chừng này ô
+HORDE_SAFE_TILES: int = 8
+# Từ chừng này ghost trở lên GhostSwarm.update tính cả đàn bằng numpy; ít hơn thì vòng Python nhanh hơn
+SWARM_VECTOR_MIN: int = 24
 
 BOSS_SPEED: float = 3.6
 BOSS_CHARGE_MULT: float = 2.6
@@ -92,4 +151,12 @@ DIFFICULTIES = [
     Difficulty("Hard", ghost_speed_mult=1.15, ghost_count=5, boss_present=True),
 ]
 
-DEFAULT_VOLUME: float = 0.6
\ No newline at end of file
+DEFAULT_VOLUME: float = 0.6
+# Cache sóng âm đã tổng hợp (đường dẫn tương đối thư mục game); None để tắt
+SOUND_CACHE_FILE = ".cache/sounds.npz"
+# Level đã biên dịch (lưới + bảng dẫn đường dạng .npy, xem levelcache.py); None để tắt
+LEVEL_CACHE_DIR = ".cache/levels"
+# Kết quả mốc của bộ đo hồi quy (python bench.py --suite --save); máy khác nhau thì mốc khác nhau
+BENCH_BASELINE_FILE = ".cache/bench_baseline.json"
+# --suite báo lỗi (mã thoát 1) khi một phép đo chậm hơn mốc quá tỉ lệ này
+BENCH_REGRESSION_THRESHOLD: float = 0.25
\ No newline at end of file
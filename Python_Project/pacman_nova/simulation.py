@@ -0,0 +1,426 @@
+"""
+Mô phỏng gameplay thuần logic: không cần cửa sổ, font hay mixer.
+Simulation sở hữu map, người chơi, ghost, boss, item và hạt; main.py chỉ
+đọc trạng thái để vẽ và phát âm thanh theo các sự kiện step() trả về.
+Mọi ngẫu nhiên của logic đi qua các luồng RNG riêng theo hệ con, sinh từ một seed,
+nên cùng seed + cùng chuỗi input luôn cho cùng kết quả (xem replay.py).
+step() đo thời gian từng hệ con qua self.profiler (profiler.py; tắt thì gần như miễn phí).
+save_state()/load_state() chụp và khôi phục trạng thái logic trong một màn (rollback.py).
+Chạy thử headless: python simulation.py --ticks 20000
+"""
+
+from __future__ import annotations
+
+import random
+import struct
+import zlib
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from settings import (
+    TILE_SIZE, DIFFICULTIES, PELLET_SCORE, ITEM_SCORE, GHOST_SCORE,
+    POWER_FRIGHT_BONUS, COLOR_P1, COLOR_P2, LOGIC_DT, HORDE_SAFE_TILES
+)
+from utils import FlowField
+from map import GameMap
+from mazegen import generate_maze
+from levelcache import load_level
+from player import Player, PlayerInput
+from src.enemy import Ghost, GhostSwarm, Boss
+from items import ItemsManager
+from particles import ParticleSystem
+from profiler import Profiler
+
+STATUS_PLAY = "play"
+STATUS_CLEARED = "cleared"
+STATUS_LOST = "lost"
+
+# Tên sự kiện trùng tên phương thức của SoundManager
+EVENT_EAT = "eat"
+EVENT_POWER = "power"
+EVENT_HIT = "hit"
+EVENT_EXPLOSION = "explosion"
+
+
+@dataclass
+class SimState:
+    """
+    Trạng thái logic của Simulation tại đầu một tick (Simulation.save_state/load_state).
+    Không gồm hạt (chỉ để hiển thị). Một SimState dùng lại qua nhiều lần lưu: bản sao
+    lưới cờ ghi đè tại chỗ, còn lại là tuple giá trị nhỏ và tham chiếu tới đối tượng.
+    """
+    gmap: Optional[GameMap] = None
+    ticks: int = 0
+    time: float = 0.0
+    status: str = STATUS_PLAY
+    level_idx: int = 0
+    cells: Optional[bytearray] = None
+    remaining: int = 0
+    players: tuple = ()
+    ghosts: tuple = ()          # GhostSwarm.save_state (ghost bị hạ được đưa lại vào đàn khi khôi phục)
+    boss_state: Optional[tuple] = None
+    items: tuple = ()           # gồm trạng thái RNG của item
+
+
+class Simulation:
+    def __init__(self, diff_idx: int = 1, seed: Optional[int] = None,
+                 maze_size: Optional[Tuple[int, int]] = None, profiler: Optional[Profiler] = None,
+                 horde: Optional[int] = None):
+        self.diff_idx = diff_idx
+        self.profiler = profiler or Profiler()
+        # (w, h): mỗi level là một mê cung sinh từ seed thay vì map.LEVELS
+        self.maze_size = maze_size
+        # số ghost mỗi màn (chế độ bầy đàn, rải khắp map); None: theo độ khó / level
+        self.horde = horde
+        # False: ghost tra bước mỗi ô như trước khi có đồ thị ngã rẽ (phát lại bản ghi phiên bản < 4)
+        self.junction_steering = True
+        # False: map lớn không dùng HPA*, ghost tìm đường bằng A* lưới/ngã rẽ (bản ghi phiên bản < 5)
+        self.hpa = True
+        # False khi chạy lại các tick sau rollback: không sinh hạt (sự kiện âm thanh do bên gọi bỏ qua)
+        self.effects = True
+        self.reseed(seed)
+        self.level_idx = 0
+        self.status = STATUS_PLAY
+        self.time = 0.0
+        self.ticks = 0
+
+        self.gmap = self._build_map(self.level_idx)
+        self.players: List[Player] = [
+            Player(1, self.gmap.p1_spawn, COLOR_P1),
+            Player(2, self.gmap.p2_spawn, COLOR_P2),
+        ]
+        self.swarm = GhostSwarm()
+        self.boss: Optional[Boss] = None
+        self.items = ItemsManager(self.gmap.w, self.gmap.h, self.gmap.is_blocked, self.rng_items)
+        self.particles = ParticleSystem(seed=self._stream_seed("particles"))
+        # mỗi người chơi một flow field, dùng chung cho mọi ghost nhắm vào họ
+        self.flows: List[FlowField] = []
+        self.start_level(self.level_idx)
+
+    @property
+    def ghosts(self) -> List[Ghost]:
+        """Ghost còn sống của màn, theo thứ tự hàng trong self.swarm (chỉ đọc; thêm/bớt qua swarm)."""
+        return self.swarm.ghosts
+
+    def _stream_seed(self, name: str) -> int:
+        return zlib.crc32(name.encode(), self.seed & 0xFFFFFFFF) ^ (self.seed >> 32)
+
+    def reseed(self, seed: Optional[int] = None):
+        """Dựng lại các luồng RNG theo hệ con (spawn ghost, item, hạt) từ một seed."""
+        self.seed = random.getrandbits(63) if seed is None else seed
+        self.rng_spawn = random.Random(self._stream_seed("spawn"))
+        self.rng_items = random.Random(self._stream_seed("items"))
+        if hasattr(self, "particles"):
+            self.particles.rng = np.random.default_rng(self._stream_seed("particles"))
+
+    def new_game(self, seed: Optional[int] = None):
+        """Ván mới: người chơi mới (không giữ nâng cấp ván trước), RNG seed lại."""
+        self.reseed(seed)
+        self.time = 0.0
+        self.ticks = 0
+        self.players = [
+            Player(1, self.gmap.p1_spawn, COLOR_P1),
+            Player(2, self.gmap.p2_spawn, COLOR_P2),
+        ]
+        self.start_level(0)
+
+    def _build_map(self, idx: int) -> GameMap:
+        self.level_ghosts: Optional[int] = None
+        if self.maze_size:
+            w, h = self.maze_size
+            gmap = GameMap(*generate_maze(w, h, seed=self._stream_seed(f"maze/{idx}")))
+        else:
+            level = load_level(idx)
+            self.level_ghosts = level.ghosts
+            gmap = level.make_map()
+        if not self.junction_steering:
+            gmap.junctions = None
+        elif not self.hpa:
+            gmap.junctions.sectors = None
+        return gmap
+
+    def start_level(self, idx: int):
+        self.level_idx = idx
+        self.status = STATUS_PLAY
+        gmap = self.gmap = self._build_map(idx)
+        self.items = ItemsManager(gmap.w, gmap.h, gmap.is_blocked, self.rng_items)
+        # flow field BFS cả map mỗi lần người chơi đổi ô: chỉ dùng cho map nhỏ (có bảng dẫn đường)
+        self.flows = [FlowField(gmap.walkable_mask()) for _ in self.players] if gmap.nav is not None else []
+
+        # đặt người chơi về spawn
+        for i, pl in enumerate(self.players):
+            pl.place(gmap.p1_spawn if i == 0 else gmap.p2_spawn)
+
+        # sinh ghost và boss theo độ khó
+        d = DIFFICULTIES[self.diff_idx]
+        swarm = self.swarm = GhostSwarm()
+        if self.horde:
+            self._spawn_horde(self.horde, d.ghost_speed_mult)
+        else:
+            ghost_count = d.ghost_count if self.level_ghosts is None else self.level_ghosts
+            for i in range(ghost_count):
+                # spawn quanh trung tâm
+                gx = gmap.w // 2 + self.rng_spawn.randint(-3, 3)
+                gy = gmap.h // 2 + self.rng_spawn.randint(-2, 2)
+                gx = max(1, min(gmap.w - 2, gx))
+                gy = max(1, min(gmap.h - 2, gy))
+                if not gmap.is_blocked(gx, gy):
+                    swarm.spawn(i, (gx, gy), speed_mult=d.ghost_speed_mult)
+        if d.boss_present and idx % 2 == 1:
+            self.boss = Boss(gmap.boss_spawn, speed_mult=d.ghost_speed_mult)
+        else:
+            self.boss = None
+
+    def _spawn_horde(self, count: int, speed_mult: float):
+        """Rải count ghost lên các ô đi được ngẫu nhiên, cách spawn người chơi ít nhất HORDE_SAFE_TILES ô."""
+        gmap = self.gmap
+        ys, xs = np.nonzero(gmap.walkable_mask())
+        far = np.ones(len(xs), dtype=bool)
+        for sx, sy in (gmap.p1_spawn, gmap.p2_spawn):
+            far &= np.abs(xs - sx) + np.abs(ys - sy) >= HORDE_SAFE_TILES
+        xs, ys = xs[far].tolist(), ys[far].tolist()
+        for i in range(count if xs else 0):
+            k = self.rng_spawn.randrange(len(xs))
+            self.swarm.spawn(i, (xs[k], ys[k]), speed_mult=speed_mult)
+
+    def apply_upgrade(self, name: str):
+        # Mỗi người chọn một upgrade giống nhau cho đơn giản
+        for pl in self.players:
+            pl.upgrade(name)
+
+    def state_digest(self) -> int:
+        """CRC32 của trạng thái logic chính, để kiểm tra replay chạy lại giống hệt."""
+        vals = [self.level_idx, self.ticks, self.gmap.pellets_remaining()]
+        for pl in self.players:
+            vals += [pl.x, pl.y, pl.score, pl.health]
+        for g in self.ghosts:
+            vals += [g.x, g.y, g.state == "fright"]
+        if self.boss:
+            vals += [self.boss.x, self.boss.y, self.boss.health]
+        return zlib.crc32(struct.pack(f"<{len(vals)}d", *vals))
+
+    def save_state(self, out: Optional[SimState] = None) -> SimState:
+        """Lưu trạng thái logic vào out (dùng lại bộ đệm của nó) hoặc một SimState mới."""
+        st = out if out is not None else SimState()
+        gmap = self.gmap
+        st.gmap = gmap
+        st.ticks = self.ticks
+        st.time = self.time
+        st.status = self.status
+        st.level_idx = self.level_idx
+        st.cells = gmap.save_cells(st.cells)
+        st.remaining = gmap.pellets_remaining()
+        st.players = tuple(pl.save_state() for pl in self.players)
+        st.ghosts = self.swarm.save_state()
+        st.boss_state = self.boss.save_state() if self.boss else None
+        st.items = self.items.save_state()
+        return st
+
+    def load_state(self, st: SimState):
+        """Quay về trạng thái đã lưu trong cùng màn (map đã đổi thì không quay được)."""
+        if st.gmap is not self.gmap:
+            raise ValueError("state belongs to another level")
+        self.ticks = st.ticks
+        self.time = st.time
+        self.status = st.status
+        self.level_idx = st.level_idx
+        self.gmap.restore_cells(st.cells, st.remaining)
+        for pl, ps in zip(self.players, st.players):
+            pl.load_state(ps)
+        self.swarm.load_state(st.ghosts)
+        if self.boss and st.boss_state is not None:
+            self.boss.load_state(st.boss_state)
+        self.items.load_state(st.items)
+
+    def step(self, dt: float, inputs: Sequence[PlayerInput]) -> List[str]:
+        """Tiến mô phỏng một bước dt giây; trả về các sự kiện âm thanh phát sinh."""
+        events: List[str] = []
+        if self.status != STATUS_PLAY:
+            return events
+        self.time += dt
+        self.ticks += 1
+        prof = self.profiler
+        t = prof.mark()
+        gmap = self.gmap
+        players = self.players
+        swarm = self.swarm
+        boss = self.boss
+
+        # lưu vị trí bước trước để renderer nội suy giữa hai bước logic
+        for pl in players:
+            pl.prev_x, pl.prev_y = pl.x, pl.y
+        swarm.store_prev()
+        if boss:
+            boss.prev_x, boss.prev_y = boss.x, boss.y
+
+        # Input & kỹ năng
+        for pl, inp in zip(players, inputs):
+            pl.apply_input(inp)
+        t = prof.lap("sim.input", t)
+
+        # Hút pellet nếu nam châm (ăn pellet trong bán kính)
+        for pl in players:
+            eaten, _ = gmap.eat_pellets_in_radius(pl.pixel_center(), pl.magnet_pulse_radius())
+            if eaten:
+                pl.score += eaten * PELLET_SCORE
+                events.append(EVENT_EAT)
+        t = prof.lap("sim.magnet", t)
+
+        # Ăn power pellet
+        for pl in players:
+            tx = int(pl.x // TILE_SIZE)
+            ty = int(pl.y // TILE_SIZE)
+            if gmap.eat_power(tx, ty):
+                swarm.set_fright()
+                pl.score += POWER_FRIGHT_BONUS
+                events.append(EVENT_POWER)
+
+        # Ăn pellet khi đi qua tâm ô
+        for pl in players:
+            tx = int(pl.x // TILE_SIZE)
+            ty = int(pl.y // TILE_SIZE)
+            if gmap.eat_pellet(tx, ty):
+                pl.score += PELLET_SCORE
+                events.append(EVENT_EAT)
+        t = prof.lap("sim.pellets", t)
+
+        # Nhặt item
+        particles = self.particles if self.effects else None
+        for pl in players:
+            got = self.items.try_pickup(pl, particles)
+            if got:
+                pl.score += ITEM_SCORE
+                events.append(EVENT_POWER)
+
+        # Cập nhật logic
+        self.items.update(dt)
+        t = prof.lap("sim.items", t)
+        for pl in players:
+            pl.update(dt, gmap.is_blocked)
+        t = prof.lap("sim.players", t)
+        if particles is not None:
+            particles.update(dt)
+        t = prof.lap("sim.particles", t)
+
+        # Ghost cập nhật cả đàn (flow field chỉ tính lại khi người chơi sang ô mới)
+        for pl, field in zip(players, self.flows):
+            px, py = pl.pixel_center()
+            field.retarget((px // TILE_SIZE, py // TILE_SIZE))
+        swarm.update(dt, gmap.is_blocked, gmap.w, gmap.h, players, gmap.nav, self.flows, gmap.junctions)
+        t = prof.lap("sim.ghosts", t)
+
+        # Boss cập nhật
+        if boss and boss.alive():
+            boss.update(dt, gmap.is_blocked, gmap.w, gmap.h, players)
+        t = prof.lap("sim.boss", t)
+
+        # Xử lý bomb / trap từ item
+        for pl in players:
+            if pl.trigger_bomb:
+                events.append(EVENT_EXPLOSION)
+                if particles is not None:
+                    particles.spawn_explosion(pl.pixel_center(), count=40)
+                # dọa ma trong bán kính; boss trong bán kính thì mất máu
+                bx, by = pl.pixel_center()
+                swarm.set_fright(swarm.rows_within(bx, by, TILE_SIZE * 5))
+                if boss and boss.alive() and boss.near(bx, by, TILE_SIZE * 5):
+                    boss.hurt(2)
+                    pl.score += 100
+                pl.trigger_bomb = False
+            if pl.place_trap:
+                # đơn giản: đặt bẫy làm chậm ma (biến fright ngắn)
+                bx, by = pl.pixel_center()
+                swarm.set_fright(swarm.rows_within(bx, by, TILE_SIZE * 2))
+                pl.place_trap = False
+        t = prof.lap("sim.bomb_trap", t)
+
+        # Va chạm ma -> gây sát thương. Chỉ xét ghost gần người chơi, theo thứ tự idx
+        near = []
+        for pl in players:
+            px, py = pl.pixel_center()
+            near += swarm.within(px, py, TILE_SIZE * 0.55)
+        if near:
+            near = sorted(set(near), key=lambda g: g.idx)
+        for g in near:
+            for pl in players:
+                if g.hit_player(pl) and not pl.is_invisible():
+                    pl.hurt(1)
+                    events.append(EVENT_HIT)
+                    # thưởng khi ma đang fright (coi như hạ ma)
+                    if g.state == "fright":
+                        pl.score += GHOST_SCORE
+                        swarm.remove(g)
+                        break
+
+        # Va chạm boss
+        if boss and boss.alive():
+            for pl in players:
+                if boss.hit_player(pl) and not pl.is_invisible():
+                    pl.hurt(2)
+                    events.append(EVENT_HIT)
+        prof.lap("sim.collision", t)
+
+        # Thua
+        if all(pl.health <= 0 for pl in players):
+            self.status = STATUS_LOST
+            events.append(EVENT_HIT)
+
+        # Thắng level khi hết pellet
+        if gmap.pellets_remaining() == 0 and (not boss or not boss.alive()):
+            # thưởng rồi chờ chọn nâng cấp
+            for pl in players:
+                pl.score += 200
+            events.append(EVENT_POWER)
+            self.level_idx += 1
+            self.status = STATUS_CLEARED
+
+        return events
+
+
+def random_inputs(rng: random.Random, count: int = 2) -> List[PlayerInput]:
+    """Input ngẫu nhiên cho bot đơn giản / chạy thử tải."""
+    out = []
+    for _ in range(count):
+        dx, dy = rng.choice(((1, 0), (-1, 0), (0, 1), (0, -1), (0, 0)))
+        out.append(PlayerInput(dx, dy, rng.random() < 0.02, rng.random() < 0.02))
+    return out
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Chạy mô phỏng headless để đo tốc độ.")
+    parser.add_argument("--ticks", type=int, default=20000)
+    parser.add_argument("--dt", type=float, default=LOGIC_DT)
+    parser.add_argument("--difficulty", type=int, default=1)
+    parser.add_argument("--maze", metavar="WxH", help="chạy trên mê cung sinh ngẫu nhiên cỡ WxH")
+    parser.add_argument("--horde", metavar="N", type=int, help="chế độ bầy đàn: N ghost mỗi màn")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    maze = tuple(int(v) for v in args.maze.lower().split("x")) if args.maze else None
+    sim = Simulation(args.difficulty, seed=0, maze_size=maze, horde=args.horde)
+    inputs = random_inputs(rng)
+    decisions = 0
+    ghost_ticks = 0
+    t0 = time.perf_counter()
+    for tick in range(args.ticks):
+        if tick % 20 == 0:
+            inputs = random_inputs(rng)
+        sim.step(args.dt, inputs)
+        ghost_ticks += len(sim.ghosts)
+        if sim.status != STATUS_PLAY:
+            decisions += sim.swarm.decisions
+        if sim.status == STATUS_CLEARED:
+            sim.start_level(sim.level_idx)
+        elif sim.status == STATUS_LOST:
+            sim.new_game()
+    elapsed = time.perf_counter() - t0
+    decisions += sim.swarm.decisions
+    print(f"{args.ticks} ticks in {elapsed:.2f} s -> {args.ticks / elapsed:.0f} ticks/s "
+          f"({args.ticks * args.dt / elapsed:.0f}x real time)")
+    print(f"ghost decisions: {decisions / max(1e-9, ghost_ticks * args.dt):.2f} per ghost-second "
+          f"({decisions} in {ghost_ticks} ghost-ticks)")
@@ -1,8 +1,16 @@
 """
 Audio tổng hợp bằng numpy: không cần asset âm thanh ngoài.
 Tạo các hiệu ứng đơn giản: ăn điểm, power, trúng đòn, nổ, menu.
+Sóng được tổng hợp một lần vào SoundBank (có thể lưu cache ra đĩa), không
+tổng hợp lại ở mỗi lần phát. Khi phát, mỗi nhóm hiệu ứng có kênh mixer dành
+riêng, mỗi hiệu ứng bị giới hạn số voice đồng thời và khoảng cách tối thiểu
+giữa hai lần kích hoạt (các lần quá dày được gộp lại).
 """
 
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
 import numpy as np
 import pygame
 
@@ -36,9 +44,130 @@ def _envelope(samples: np.ndarray, attack: float = 0.01, release: float = 0.05):
     return out.astype(np.int16)
 
 
+# Tăng khi đổi công thức tổng hợp để cache trên đĩa tự bị bỏ qua
+SOUND_BANK_VERSION = 1
+
+
+def _synth_eat():
+    return _envelope(_tone(880, 0.06, 0.4, "sine"), 0.002, 0.03)
+
+
+def _synth_power():
+    s1 = _tone(300, 0.12, 0.35, "saw")
+    s2 = _tone(600, 0.12, 0.25, "saw")
+    return _envelope((s1 * 0.6 + s2 * 0.4).astype(np.int16), 0.005, 0.07)
+
+
+def _synth_hit(rng: np.random.Generator):
+    noise = (rng.random(int(SAMPLE_RATE * 0.15)) * 2 - 1) * 0.6
+    return _envelope((noise * 32767).astype(np.int16), 0.001, 0.1)
+
+
+def _synth_boom(rng: np.random.Generator):
+    noise = (rng.random(int(SAMPLE_RATE * 0.3)) * 2 - 1)
+    filt = np.convolve(noise, np.ones(200) / 200, mode="same")
+    return _envelope((filt * 0.7 * 32767).astype(np.int16), 0.005, 0.2)
+
+
+def _synth_menu():
+    return _envelope(_tone(520, 0.08, 0.35, "square"), 0.001, 0.04)
+
+
+# Nhiễu dùng seed cố định: tổng hợp lại hay đọc từ cache đều ra cùng sóng
+SOUND_RECIPES = {
+    "eat": _synth_eat,
+    "power": _synth_power,
+    "hit": lambda: _synth_hit(np.random.default_rng(1)),
+    "boom": lambda: _synth_boom(np.random.default_rng(2)),
+    "menu": _synth_menu,
+}
+
+
+class SoundBank:
+    """
+    Kho sóng âm int16 đã tổng hợp. Mỗi hiệu ứng chỉ tổng hợp đúng một lần
+    (lúc khởi động qua synthesize_all, hoặc ở lần dùng đầu tiên).
+    Nếu có cache_path, sóng được đọc từ / ghi ra file .npz để lần chạy sau bỏ qua tổng hợp.
+    """
+
+    def __init__(self, cache_path: Optional[str] = None):
+        self.cache_path = cache_path
+        self.waves: Dict[str, np.ndarray] = {}
+        self.synthesized = 0
+        self.loaded_from_disk = False
+
+    def waveform(self, name: str) -> np.ndarray:
+        wave = self.waves.get(name)
+        if wave is None:
+            wave = self.waves[name] = SOUND_RECIPES[name]()
+            self.synthesized += 1
+        return wave
+
+    def synthesize_all(self):
+        if self._load():
+            return
+        for name in SOUND_RECIPES:
+            self.waveform(name)
+        self._save()
+
+    def _load(self) -> bool:
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return False
+        try:
+            with np.load(self.cache_path) as data:
+                meta = data["__meta__"].tolist()
+                if meta != [SOUND_BANK_VERSION, SAMPLE_RATE] or not set(SOUND_RECIPES) <= set(data.files):
+                    return False
+                self.waves = {name: data[name] for name in SOUND_RECIPES}
+        except Exception:
+            # cache hỏng: tổng hợp lại và ghi đè
+            return False
+        self.loaded_from_disk = True
+        return True
+
+    def _save(self):
+        if not self.cache_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            tmp = self.cache_path + ".tmp.npz"
+            np.savez(tmp, __meta__=np.array([SOUND_BANK_VERSION, SAMPLE_RATE]), **self.waves)
+            os.replace(tmp, self.cache_path)
+        except OSError:
+            pass
+
+
+@dataclass(frozen=True)
+class VoiceRule:
+    category: str         # nhóm kênh dành riêng
+    max_voices: int       # số voice cùng hiệu ứng được phát đồng thời
+    min_interval: float   # giây tối thiểu giữa hai lần kích hoạt; dày hơn thì gộp
+
+
+VOICE_RULES: Dict[str, VoiceRule] = {
+    "eat": VoiceRule("pickup", max_voices=2, min_interval=0.06),
+    "power": VoiceRule("pickup", max_voices=1, min_interval=0.1),
+    "hit": VoiceRule("combat", max_voices=2, min_interval=0.08),
+    "boom": VoiceRule("combat", max_voices=2, min_interval=0.1),
+    "menu": VoiceRule("ui", max_voices=1, min_interval=0.03),
+}
+
+# Số kênh mixer dành riêng cho mỗi nhóm
+VOICE_CHANNELS: Dict[str, int] = {"pickup": 3, "combat": 3, "ui": 1}
+
+
+@dataclass
+class VoiceStats:
+    played: int = 0
+    coalesced: int = 0  # bị gộp vì kích hoạt lại quá sớm
+    dropped: int = 0    # bị bỏ vì hết voice / hết kênh
+
+
 class SoundManager:
-    def __init__(self, volume: float = 0.6):
+    def __init__(self, volume: float = 0.6, cache_path: Optional[str] = None, preload: bool = True,
+                 clock: Callable[[], float] = time.perf_counter):
         self.volume = volume
+        self.clock = clock
         try:
             if not pygame.mixer.get_init():
                 pygame.mixer.pre_init(SAMPLE_RATE, -16, 1, 512)
@@ -47,41 +176,101 @@ class SoundManager:
             # Một số môi trường không hỗ trợ mixer (headless). Game vẫn chạy.
             pass
 
-        self.cache = {}
+        self.bank = SoundBank(cache_path)
+        if preload:
+            self.bank.synthesize_all()
+        self.cache: Dict[str, pygame.mixer.Sound] = {}
+
+        self.stats: Dict[str, VoiceStats] = {key: VoiceStats() for key in VOICE_RULES}
+        self._last_trigger: Dict[str, float] = {}
+        self.channels: Dict[str, List[pygame.mixer.Channel]] = {}
+        self._setup_voices()
 
-    def _play(self, key: str, arr: np.ndarray):
+    def _setup_voices(self):
+        """Dành riêng các kênh đầu của mixer cho từng nhóm hiệu ứng."""
+        if not pygame.mixer.get_init():
+            return
         try:
-            snd = self.cache.get(key)
+            reserved = sum(VOICE_CHANNELS.values())
+            if pygame.mixer.get_num_channels() < reserved:
+                pygame.mixer.set_num_channels(reserved)
+            pygame.mixer.set_reserved(reserved)
+            idx = 0
+            for cat, n in VOICE_CHANNELS.items():
+                self.channels[cat] = [pygame.mixer.Channel(idx + i) for i in range(n)]
+                idx += n
+        except Exception:
+            self.channels = {}
+
+    def _sound(self, key: str) -> Optional[pygame.mixer.Sound]:
+        snd = self.cache.get(key)
+        if snd is None:
+            init = pygame.mixer.get_init()
+            if not init:
+                return None
+            arr = self.bank.waveform(key)
+            # pygame.init() có thể đã mở mixer stereo: nhân bản kênh cho khớp
+            channels = init[2]
+            if channels > 1:
+                arr = np.repeat(arr[:, None], channels, axis=1)
+            snd = pygame.sndarray.make_sound(np.ascontiguousarray(arr))
+            snd.set_volume(self.volume)
+            self.cache[key] = snd
+        return snd
+
+    def _play(self, key: str):
+        rule = VOICE_RULES[key]
+        st = self.stats[key]
+        now = self.clock()
+        last = self._last_trigger.get(key)
+        if last is not None and now - last < rule.min_interval:
+            st.coalesced += 1
+            return
+        self._last_trigger[key] = now
+        try:
+            snd = self._sound(key)
             if snd is None:
-                snd = pygame.sndarray.make_sound(arr.copy())
-                snd.set_volume(self.volume)
-                self.cache[key] = snd
-            snd.play()
+                return
+            chans = self.channels.get(rule.category)
+            if not chans:
+                snd.play()
+                st.played += 1
+                return
+            free = None
+            voices = 0
+            for ch in chans:
+                if ch.get_busy():
+                    if ch.get_sound() is snd:
+                        voices += 1
+                elif free is None:
+                    free = ch
+            if voices >= rule.max_voices or free is None:
+                st.dropped += 1
+                return
+            free.play(snd)
+            st.played += 1
         except Exception:
             pass
 
+    def voice_stats(self) -> Dict[str, Dict[str, int]]:
+        """Bộ đếm played/coalesced/dropped theo hiệu ứng (cho profiler)."""
+        return {key: vars(st).copy() for key, st in self.stats.items()}
+
+    def reset_stats(self):
+        for st in self.stats.values():
+            st.played = st.coalesced = st.dropped = 0
+
     def eat(self):
-        s = _tone(880, 0.06, 0.4, "sine")
-        s = _envelope(s, 0.002, 0.03)
-        self._play("eat", s)
+        self._play("eat")
 
     def power(self):
-        s1 = _tone(300, 0.12, 0.35, "saw")
-        s2 = _tone(600, 0.12, 0.25, "saw")
-        s = _envelope((s1 * 0.6 + s2 * 0.4).astype(np.int16), 0.005, 0.07)
-        self._play("power", s)
+        self._play("power")
 
     def hit(self):
-        noise = (np.random.rand(int(SAMPLE_RATE * 0.15)) * 2 - 1) * 0.6
-        s = _envelope((noise * 32767).astype(np.int16), 0.001, 0.1)
-        self._play("hit", s)
+        self._play("hit")
 
     def explosion(self):
-        noise = (np.random.rand(int(SAMPLE_RATE * 0.3)) * 2 - 1)
-        filt = np.convolve(noise, np.ones(200) / 200, mode="same")
-        s = _envelope((filt * 0.7 * 32767).astype(np.int16), 0.005, 0.2)
-        self._play("boom", s)
+        self._play("boom")
 
     def menu(self):
-        s = _envelope(_tone(520, 0.08, 0.35, "square"), 0.001, 0.04)
-        self._play("menu", s)
\ No newline at end of file
+        self._play("menu")
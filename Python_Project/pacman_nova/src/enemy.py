@@ -1,86 +1,203 @@
 """
 Kẻ địch: Ghost AI có phối hợp (bủa vây) và Boss có chiêu lao nhanh.
 - Ghost chia vai: chặn đầu (intercept), ép hướng (herd), bám đuôi (chase).
-- Dùng A* để tìm ô mục tiêu gần nhất theo vai trò.
+- Ghost nhắm đúng ô người chơi đọc flow field chung của người chơi đó;
+  còn lại tra bảng dẫn đường của map (O(1)); map lớn không có bảng thì dùng HPA*
+  (SectorGraph): giữ chuỗi cửa giữa các khu, chỉ tìm lại khi đích đổi khu.
+- Ghost chỉ quyết định hướng khi bước vào ô ngã rẽ; trong hành lang chỉ có một
+  đường nên giữ hướng đi tiếp, không tra cứu gì.
 """
 
 from __future__ import annotations
 
-import random
-from typing import List, Tuple, Optional
+from operator import attrgetter
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
 import pygame
-from utils import a_star
-from settings import TILE_SIZE, GHOST_BASE_SPEED, COLOR_GHOST, GHOST_FRIGHT_TIME, COLOR_BOSS, BOSS_SPEED, BOSS_CHARGE_INTERVAL, BOSS_CHARGE_MULT, BOSS_HEALTH
+from utils import FlowField, JunctionGraph, NavTable, SectorGraph, CORRIDOR_CONTINUE, FLOW_DIRS, UNREACHABLE, a_star, lerp
+from settings import TILE_SIZE, SWARM_VECTOR_MIN, GHOST_BASE_SPEED, COLOR_GHOST, GHOST_FRIGHT_TIME, COLOR_BOSS, BOSS_SPEED, BOSS_CHARGE_INTERVAL, BOSS_CHARGE_MULT, BOSS_HEALTH
+
+
+_BOSS_STATE = ("tx", "ty", "x", "y", "prev_x", "prev_y", "charge_timer", "health")
+_get_boss_state = attrgetter(*_BOSS_STATE)
+
+GHOST_STATES = ("chase", "scatter", "fright")
+_CHASE, _SCATTER, _FRIGHT = range(3)
+# vai trò theo idx % 5 để đa dạng chiến thuật
+ROLES = ("chase", "intercept", "herd", "ambush", "chase")
+_ROLE_CODE = (0, 1, 2, 3, 0)
+# cột của GhostSwarm.f
+_X, _Y, _PREV_X, _PREV_Y, _SPEED, _STATE_TIME = range(6)
+# cột của GhostSwarm.steer: ô lúc quyết định gần nhất, mã hướng (FLOW_DIRS) đang đi từ ô đó
+# và ô mục tiêu của lần tra gần nhất (đứng yên thì chỉ tra lại khi mục tiêu đổi ô)
+_LAST_X, _LAST_Y, _HEAD, _GOAL_X, _GOAL_Y = range(5)
+_STEER_COLS = 5
+_FLOW_DX = np.array([d[0] for d in FLOW_DIRS], dtype=np.intp)
+_FLOW_DY = np.array([d[1] for d in FLOW_DIRS], dtype=np.intp)
+# mã hướng theo độ lệch ô [dy + 1, dx + 1] (chỉ ô kề hoặc cùng ô)
+_DIR_CODE = np.zeros((3, 3), dtype=np.int8)
+for _code, (_dx, _dy) in enumerate(FLOW_DIRS):
+    _DIR_CODE[_dy + 1, _dx + 1] = _code
+_CODE_OF = {d: code for code, d in enumerate(FLOW_DIRS)}
+_CONTINUE = CORRIDOR_CONTINUE.tolist()
+_COLOR_FRIGHT = (120, 120, 255)
+# hình ghost vẽ sẵn theo trạng thái (thường / fright), tạo khi vẽ lần đầu
+_sprites: List[pygame.Surface] = []
+
+
+def _ghost_sprite(fright: bool) -> pygame.Surface:
+    if not _sprites:
+        for col in (COLOR_GHOST, _COLOR_FRIGHT):
+            surf = pygame.Surface((20, 20))
+            surf.fill((0, 0, 0))
+            surf.set_colorkey((0, 0, 0))
+            pygame.draw.rect(surf, col, surf.get_rect(), border_radius=6)
+            _sprites.append(surf)
+    return _sprites[fright]
+
+
+def _column(col: int):
+    def get(self):
+        return self.swarm.f[self.row, col]
+
+    def set(self, value):
+        self.swarm.f[self.row, col] = value
+    return property(get, set)
+
+
+def _role_targets(players: List, map_w: int, map_h: int) -> Tuple[List[int], List[int]]:
+    """Ô mục tiêu của từng vai trò (theo mã _ROLE_CODE), đã giới hạn biên; tàng hình thì nhắm người chơi phụ."""
+    p_main = players[0]
+    p_aux = players[1] if len(players) > 1 else players[0]
+    if p_main.is_invisible():
+        ax, ay = p_aux.pixel_center()
+        tile = (int(ax // TILE_SIZE), int(ay // TILE_SIZE))
+        return [tile[0]] * 4, [tile[1]] * 4
+    px, py = p_main.pixel_center()
+    ptx, pty = int(px // TILE_SIZE), int(py // TILE_SIZE)
+    dx, dy = p_main.dir
+    cx, cy = map_w // 2, map_h // 2
+    targets = (
+        (ptx, pty),                                    # chase
+        (ptx + dx * 4, pty + dy * 4),                  # intercept: ô phía trước theo hướng
+        (int((ptx + cx) / 2), int((pty + cy) / 2)),    # herd: dồn về phía trung tâm map
+        (ptx + dx * 6, pty + dy * 2),                  # ambush: chặn giao lộ phía trước
+    )
+    xs = [max(1, min(map_w - 2, t[0])) for t in targets]
+    ys = [max(1, min(map_h - 2, t[1])) for t in targets]
+    return xs, ys
 
 
 class Ghost:
-    def __init__(self, idx: int, tile_pos: Tuple[int, int], speed_mult: float = 1.0):
+    """
+    Một ghost. Số liệu (vị trí, tốc độ, trạng thái, đồng hồ) nằm ở hàng row của GhostSwarm;
+    thuộc tính x, y, state... đọc/ghi thẳng vào mảng. Ghost lẻ (hoặc đã bị hạ) có đàn riêng.
+    """
+
+    x = _column(_X)
+    y = _column(_Y)
+    prev_x = _column(_PREV_X)  # vị trí ở bước logic trước, để nội suy khi vẽ
+    prev_y = _column(_PREV_Y)
+    speed_tiles = _column(_SPEED)
+    state_time = _column(_STATE_TIME)
+
+    def __init__(self, idx: int, tile_pos: Tuple[int, int], speed_mult: float = 1.0,
+                 swarm: Optional["GhostSwarm"] = None):
         self.idx = idx
         self.tx, self.ty = tile_pos
-        self.x = self.tx * TILE_SIZE + TILE_SIZE / 2
-        self.y = self.ty * TILE_SIZE + TILE_SIZE / 2
-        self.speed_tiles = GHOST_BASE_SPEED * speed_mult
-        self.state = "chase"  # chase | scatter | fright
-        self.state_time = 0.0
+        # đường đang đi khi map không có bảng dẫn đường: các ô A* (tính lại khi đích đổi ô)
+        # hoặc các cửa HPA* (tính lại khi đích đổi khu), xem route_step
+        self.path: List = []
+        self.path_target: Optional[Tuple[int, int]] = None
+        self.swarm: GhostSwarm
+        self.row = 0
+        x = self.tx * TILE_SIZE + TILE_SIZE / 2
+        y = self.ty * TILE_SIZE + TILE_SIZE / 2
+        (swarm if swarm is not None else GhostSwarm(1)).add(self, x, y, GHOST_BASE_SPEED * speed_mult)
+
+    @property
+    def state(self) -> str:  # chase | scatter | fright
+        return GHOST_STATES[self.swarm.state[self.row]]
+
+    @state.setter
+    def state(self, name: str):
+        self.swarm.state[self.row] = GHOST_STATES.index(name)
+
+    @property
+    def heading(self) -> int:
+        """Hướng đã chọn, gói một byte: mã hướng | (mã từ ô hiện tại về ô quyết định) << 3."""
+        lx, ly, head, _, _ = self.swarm.steer[self.row].tolist()
+        back = _CODE_OF.get((lx - int(self.x // TILE_SIZE), ly - int(self.y // TILE_SIZE)), 0)
+        return head | back << 3
+
+    @heading.setter
+    def heading(self, packed: int):
+        bx, by = FLOW_DIRS[packed >> 3 & 7]
+        cx, cy = int(self.x // TILE_SIZE), int(self.y // TILE_SIZE)
+        self.swarm.steer[self.row] = (cx + bx, cy + by, packed & 7, -1, -1)
 
     def set_fright(self):
         self.state = "fright"
         self.state_time = GHOST_FRIGHT_TIME
 
-    def update(self, dt: float, is_blocked, map_w: int, map_h: int, players: List, ghosts: List["Ghost"]):
-        self.state_time = max(0.0, self.state_time - dt)
-        if self.state == "fright" and self.state_time <= 0:
-            self.state = "chase"
-
-        # Chọn mục tiêu theo vai trò
-        p_main = players[0]
-        p_aux = players[1] if len(players) > 1 else players[0]
-        px, py = p_main.pixel_center()
-        ptx, pty = int(px // TILE_SIZE), int(py // TILE_SIZE)
-
-        # Vai trò theo idx để đa dạng chiến thuật
-        role = ["chase", "intercept", "herd", "ambush", "chase"][self.idx % 5]
-
-        target = (ptx, pty)
-
-        if role == "intercept":
-            # tính ô phía trước người chơi dựa trên hướng
-            dx, dy = p_main.dir
-            target = (ptx + dx * 4, pty + dy * 4)
-        elif role == "herd":
-            # ép vào một bức tường gần: dịch mục tiêu vào trung tâm map
-            cx, cy = map_w // 2, map_h // 2
-            target = (int((ptx + cx) / 2), int((pty + cy) / 2))
-        elif role == "ambush":
-            # chặn đường giao nhau gần nhất
-            dx, dy = p_main.dir
-            target = (ptx + dx * 6, pty + dy * 2)
-
-        # giới hạn biên
-        tx = max(1, min(map_w - 2, target[0]))
-        ty = max(1, min(map_h - 2, target[1]))
-        target = (tx, ty)
-
-        # tránh tàng hình: chuyển mục tiêu sang người chơi phụ nếu P1 tàng hình
-        if p_main.is_invisible():
-            ax, ay = p_aux.pixel_center()
-            target = (int(ax // TILE_SIZE), int(ay // TILE_SIZE))
-
-        # tìm đường
-        cur_tile = (int(self.x // TILE_SIZE), int(self.y // TILE_SIZE))
-        path = a_star(cur_tile, target, is_blocked, map_w, map_h)
-        if path and len(path) >= 2:
-            nxt = path[1]
-        else:
-            nxt = cur_tile
+    def path_step(self, cur_tile: Tuple[int, int], target: Tuple[int, int], is_blocked,
+                  map_w: int, map_h: int) -> Optional[Tuple[int, int]]:
+        """Ô kế tiếp theo A*, giữ đường đi tới khi đích đổi ô hoặc ghost lệch khỏi đường."""
+        path = self.path
+        if path and path[0] != cur_tile and len(path) >= 2 and path[1] == cur_tile:
+            path.pop(0)  # đã sang ô kế tiếp trên đường
+        if target != self.path_target or (path and path[0] != cur_tile):
+            path = self.path = a_star(cur_tile, target, is_blocked, map_w, map_h) or []
+            self.path_target = target
+        return path[1] if len(path) >= 2 else None
 
-        # di chuyển hướng tới ô tiếp theo
-        dx = (nxt[0] * TILE_SIZE + TILE_SIZE / 2) - self.x
-        dy = (nxt[1] * TILE_SIZE + TILE_SIZE / 2) - self.y
-        dist = max(1.0, (dx * dx + dy * dy) ** 0.5)
-        speed_px = self.speed_tiles * TILE_SIZE * (0.6 if self.state == "fright" else 1.0)
-        self.x += speed_px * dx / dist * dt
-        self.y += speed_px * dy / dist * dt
+    def sector_step(self, cur_tile: Tuple[int, int], target: Tuple[int, int],
+                    sectors: SectorGraph) -> Optional[Tuple[int, int]]:
+        """
+        HPA*: path là các cửa tới khu của đích, path_target là khu đó. Trên đường chỉ tra bảng
+        của khu để tới cửa kế tiếp; tìm lại khi đích đổi khu, lệch khỏi đường hoặc đã hết cửa.
+        """
+        key = sectors.sector_of(target)
+        path = self.path
+        if path and sectors.graph.node[cur_tile[1], cur_tile[0]] == path[0]:
+            path.pop(0)   # đã tới cửa kế tiếp
+        if path and key == self.path_target:
+            nxt = sectors.follow(cur_tile, path[0])
+            if nxt is not None:
+                return nxt
+        nxt, self.path = sectors.route(cur_tile, target)
+        self.path_target = key
+        return nxt
+
+    def route_step(self, cur_tile: Tuple[int, int], target: Tuple[int, int], is_blocked, map_w: int, map_h: int,
+                   junctions: Optional[JunctionGraph]) -> Optional[Tuple[int, int]]:
+        """
+        Không có bảng dẫn đường: HPA* nếu map có phân khu (map lớn), không thì A* trên
+        đồ thị ngã rẽ nếu đứng ở ngã rẽ, còn lại A* trên lưới.
+        """
+        if junctions is not None:
+            if junctions.sectors is not None:
+                return self.sector_step(cur_tile, target, junctions.sectors)
+            if junctions.is_junction(cur_tile):
+                return junctions.next_step(cur_tile, target)
+        return self.path_step(cur_tile, target, is_blocked, map_w, map_h)
+
+    def next_tile(self, cur_tile: Tuple[int, int], target: Tuple[int, int], is_blocked, map_w: int, map_h: int,
+                  nav: Optional[NavTable], flows: Optional[List[FlowField]],
+                  junctions: Optional[JunctionGraph] = None) -> Optional[Tuple[int, int]]:
+        """Ô kế tiếp về target: flow field chung của đích -> bảng dẫn đường -> A*."""
+        field = next((f for f in flows or () if f.target == target), None)
+        if field is not None:
+            return field.next_step(cur_tile)
+        if nav is not None:
+            return nav.next_step(cur_tile, target)
+        return self.route_step(cur_tile, target, is_blocked, map_w, map_h, junctions)
+
+    def update(self, dt: float, is_blocked, map_w: int, map_h: int, players: List,
+               ghosts: Optional[List["Ghost"]] = None, nav: Optional[NavTable] = None,
+               flows: Optional[List[FlowField]] = None, junctions: Optional[JunctionGraph] = None):
+        """Cập nhật riêng ghost này (Simulation cập nhật cả đàn một lần bằng GhostSwarm.update)."""
+        self.swarm.update_scalar(dt, is_blocked, map_w, map_h, players, nav, flows, junctions, rows=(self.row,))
 
     def hit_player(self, player) -> bool:
         # Va chạm đơn giản theo bán kính
@@ -90,9 +207,334 @@ class Ghost:
         r = TILE_SIZE * 0.45
         return (dx * dx + dy * dy) <= (r * r)
 
-    def draw(self, surf):
-        col = (120, 120, 255) if self.state == "fright" else COLOR_GHOST
-        pygame.draw.rect(surf, col, pygame.Rect(self.x - 10, self.y - 10, 20, 20), border_radius=6)
+    def render_pos(self, alpha: float) -> Tuple[float, float]:
+        """Vị trí vẽ, nội suy giữa bước logic trước và hiện tại."""
+        return lerp(self.prev_x, self.x, alpha), lerp(self.prev_y, self.y, alpha)
+
+    def bounds(self, alpha: float = 1.0) -> pygame.Rect:
+        """Vùng màn hình mà draw() có thể tô (dùng cho dirty-rect)."""
+        x, y = self.render_pos(alpha)
+        return pygame.Rect(int(x) - 11, int(y) - 11, 22, 22)
+
+    def draw(self, surf, alpha: float = 1.0, offset: Tuple[int, int] = (0, 0)):
+        x, y = self.render_pos(alpha)
+        x -= offset[0]
+        y -= offset[1]
+        # Rect cắt phần lẻ về 0 như pygame.Rect(x - 10, ...)
+        surf.blit(_ghost_sprite(self.state == "fright"), (int(x - 10), int(y - 10)))
+
+
+class GhostSwarm:
+    """
+    Mọi ghost của một màn trong mảng numpy, mỗi ghost một hàng theo thứ tự của ghosts:
+    f (cột _X, _Y, _PREV_X, _PREV_Y, _SPEED, _STATE_TIME), state, role, steer (_LAST_X ... _GOAL_Y).
+    update() chọn mục tiêu, chạy đồng hồ fright, tra bước kế tiếp (flow field / bảng dẫn
+    đường) và di chuyển cả đàn bằng vài phép toán mảng; chỉ A* (map lớn) còn theo từng ghost.
+    Có đồ thị ngã rẽ thì chỉ ghost vừa vào ô ngã rẽ mới tra bước kế tiếp (đếm ở decisions).
+    """
+
+    def __init__(self, capacity: int = 8):
+        self.ghosts: List[Ghost] = []
+        self.f = np.zeros((max(1, capacity), 6))
+        self.state = np.zeros(len(self.f), dtype=np.int8)
+        self.role = np.zeros(len(self.f), dtype=np.int8)
+        self.steer = np.zeros((len(self.f), _STEER_COLS), dtype=np.int32)
+        self.decisions = 0
+
+    def __len__(self) -> int:
+        return len(self.ghosts)
+
+    def _append(self, g: Ghost, values, state: int, steer):
+        n = len(self.ghosts)
+        if n == len(self.f):
+            cap = 2 * n
+            self.f = np.resize(self.f, (cap, 6))
+            self.state = np.resize(self.state, cap)
+            self.role = np.resize(self.role, cap)
+            self.steer = np.resize(self.steer, (cap, _STEER_COLS))
+        self.f[n] = values
+        self.state[n] = state
+        self.steer[n] = steer
+        self.role[n] = _ROLE_CODE[g.idx % 5]
+        self.ghosts.append(g)
+        g.swarm = self
+        g.row = n
+
+    def add(self, g: Ghost, x: float, y: float, speed_tiles: float):
+        self._append(g, (x, y, x, y, speed_tiles, 0.0), _CHASE, (int(x // TILE_SIZE), int(y // TILE_SIZE), 0, -1, -1))
+
+    def spawn(self, idx: int, tile_pos: Tuple[int, int], speed_mult: float = 1.0) -> Ghost:
+        return Ghost(idx, tile_pos, speed_mult, swarm=self)
+
+    def _drop(self, row: int):
+        n = len(self.ghosts)
+        self.f[row:n - 1] = self.f[row + 1:n]
+        self.state[row:n - 1] = self.state[row + 1:n]
+        self.role[row:n - 1] = self.role[row + 1:n]
+        self.steer[row:n - 1] = self.steer[row + 1:n]
+        del self.ghosts[row]
+        for g in self.ghosts[row:]:
+            g.row -= 1
+
+    def remove(self, g: Ghost):
+        """Bỏ g khỏi đàn (bị hạ); g giữ số liệu trong một đàn riêng để rollback đưa lại được."""
+        row = g.row
+        GhostSwarm(1)._append(g, self.f[row], self.state[row], self.steer[row])
+        self._drop(row)
+
+    def assign(self, ghosts: Sequence[Ghost]):
+        """Đặt đàn thành đúng danh sách ghosts theo thứ tự (nhận cả ghost của đàn khác)."""
+        if len(ghosts) == len(self.ghosts) and all(a is b for a, b in zip(ghosts, self.ghosts)):
+            return
+        rows = [(g, g.swarm.f[g.row].copy(), int(g.swarm.state[g.row]), g.swarm.steer[g.row].copy())
+                for g in ghosts]
+        self.ghosts = []
+        for g, values, state, steer in rows:
+            self._append(g, values, state, steer)
+
+    def save_state(self) -> tuple:
+        n = len(self.ghosts)
+        return (tuple(self.ghosts), self.f[:n].copy(), self.state[:n].copy(), self.steer[:n].copy(),
+                tuple((tuple(g.path), g.path_target) for g in self.ghosts))
+
+    def load_state(self, saved: tuple):
+        ghosts, f, state, steer, paths = saved
+        self.assign(ghosts)
+        n = len(ghosts)
+        self.f[:n] = f
+        self.state[:n] = state
+        self.steer[:n] = steer
+        for g, (path, target) in zip(ghosts, paths):
+            g.path = list(path)
+            g.path_target = target
+
+    def store_prev(self):
+        """Lưu vị trí hiện tại làm vị trí bước trước (để nội suy khi vẽ)."""
+        n = len(self.ghosts)
+        self.f[:n, _PREV_X:_PREV_Y + 1] = self.f[:n, _X:_Y + 1]
+
+    def set_fright(self, rows=None):
+        """Đưa các hàng rows (mặc định cả đàn) vào trạng thái fright."""
+        n = len(self.ghosts)
+        if rows is None:
+            rows = slice(0, n)
+        self.state[:n][rows] = _FRIGHT
+        self.f[:n, _STATE_TIME][rows] = GHOST_FRIGHT_TIME
+
+    def rows_within(self, x: float, y: float, r: float) -> List[int]:
+        """Chỉ số hàng của ghost có tâm cách (x, y) không quá r."""
+        n = len(self.ghosts)
+        r2 = r * r
+        if n < SWARM_VECTOR_MIN:
+            out = []
+            for i, (gx, gy) in enumerate(self.f[:n, _X:_Y + 1].tolist()):
+                dx = gx - x
+                dy = gy - y
+                if dx * dx + dy * dy <= r2:
+                    out.append(i)
+            return out
+        dx = self.f[:n, _X] - x
+        dy = self.f[:n, _Y] - y
+        return np.flatnonzero(dx * dx + dy * dy <= r2).tolist()
+
+    def within(self, x: float, y: float, r: float) -> List[Ghost]:
+        ghosts = self.ghosts
+        return [ghosts[i] for i in self.rows_within(x, y, r)]
+
+    def _screen_pos(self, alpha: float, view: pygame.Rect) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(hàng, x, y) nội suy của các ghost có Ghost.bounds giao view."""
+        f = self.f[:len(self.ghosts)]
+        xs = f[:, _PREV_X] + (f[:, _X] - f[:, _PREV_X]) * alpha
+        ys = f[:, _PREV_Y] + (f[:, _Y] - f[:, _PREV_Y]) * alpha
+        ix = xs.astype(np.intp)
+        iy = ys.astype(np.intp)
+        rows = np.flatnonzero((ix - 11 < view.right) & (ix + 11 > view.left)
+                              & (iy - 11 < view.bottom) & (iy + 11 > view.top))
+        return rows, xs[rows], ys[rows]
+
+    def bounds(self, alpha: float, view: pygame.Rect) -> List[pygame.Rect]:
+        """Ghost.bounds của các ghost trong view, tính một lượt cho cả đàn."""
+        _, xs, ys = self._screen_pos(alpha, view)
+        Rect = pygame.Rect
+        return [Rect(x - 11, y - 11, 22, 22)
+                for x, y in zip(xs.astype(np.intp).tolist(), ys.astype(np.intp).tolist())]
+
+    def draw(self, surf: pygame.Surface, alpha: float, offset: Tuple[int, int], view: pygame.Rect):
+        """Như Ghost.draw cho các ghost trong view, gộp thành một lần blits."""
+        rows, xs, ys = self._screen_pos(alpha, view)
+        px = (xs - offset[0] - 10).astype(np.intp).tolist()
+        py = (ys - offset[1] - 10).astype(np.intp).tolist()
+        sprites = (_ghost_sprite(False), _ghost_sprite(True))
+        fright = (self.state[rows] == _FRIGHT).tolist()
+        surf.blits([(sprites[fr], (x, y)) for fr, x, y in zip(fright, px, py)], doreturn=False)
+
+    def _decide(self, rows: np.ndarray, cx: np.ndarray, cy: np.ndarray, tgx: np.ndarray, tgy: np.ndarray,
+                is_blocked, map_w: int, map_h: int, nav: Optional[NavTable],
+                flows: Optional[List[FlowField]], junctions: Optional[JunctionGraph]):
+        """Chọn hướng cho các hàng rows đang ở ô (cx, cy): flow field chung của đích -> bảng dẫn đường -> A*."""
+        if not len(rows):
+            return
+        self.decisions += len(rows)
+        nx = cx.copy()
+        ny = cy.copy()
+        todo = np.ones(len(rows), dtype=bool)
+        for field in flows or ():
+            if field.target is None:
+                continue
+            m = todo & (tgx == field.target[0]) & (tgy == field.target[1])
+            if not m.any():
+                continue
+            todo &= ~m
+            mx, my = cx[m], cy[m]
+            ok = field.dist[my, mx] != UNREACHABLE
+            d = np.where(ok, field.dirs[my, mx], 0)
+            nx[m] = mx + _FLOW_DX[d]
+            ny[m] = my + _FLOW_DY[d]
+        if todo.any():
+            if nav is not None:
+                sub = np.flatnonzero(todo)
+                src = nav.index[cy[sub], cx[sub]]
+                dst = nav.index[tgy[sub], tgx[sub]]
+                hop = np.where((src >= 0) & (dst >= 0), nav.next_hop[src, dst], -1)
+                ok = hop >= 0
+                nx[sub[ok]] = nav.tiles[hop[ok], 0]
+                ny[sub[ok]] = nav.tiles[hop[ok], 1]
+            else:
+                ghosts = self.ghosts
+                for k in np.flatnonzero(todo).tolist():
+                    nxt = ghosts[rows[k]].route_step((int(cx[k]), int(cy[k])), (int(tgx[k]), int(tgy[k])),
+                                                     is_blocked, map_w, map_h, junctions)
+                    if nxt is not None:
+                        nx[k], ny[k] = nxt
+        # không đi được (hoặc đã tới đích) thì mã hướng 0: đứng yên ở ô hiện tại
+        self.steer[rows] = np.stack([cx, cy, _DIR_CODE[ny - cy + 1, nx - cx + 1], tgx, tgy], axis=1)
+
+    def _steer_row(self, i: int, cx: int, cy: int, targets: List[List[int]], is_blocked, map_w: int, map_h: int,
+                   players: List, nav: Optional[NavTable], flows: Optional[List[FlowField]],
+                   junctions: Optional[JunctionGraph]) -> Tuple[int, int, int]:
+        """
+        Hướng của hàng i đang ở ô (cx, cy), trả (ô quyết định x, y, mã hướng).
+        targets rỗng thì điền mục tiêu theo vai trò khi cần, để các hàng sau dùng lại.
+        """
+        steer = self.steer[i].tolist()
+        lx, ly, head, gx, gy = steer
+        moved = cx != lx or cy != ly
+        if junctions is not None and moved:
+            # vừa sang ô mới: trong hành lang hướng đi tiếp đã định sẵn, ở ngã rẽ mới phải tra
+            d_in = _CODE_OF.get((cx - lx, cy - ly), 0)
+            head = _CONTINUE[junctions.exits[cy, cx]][d_in] if d_in and 0 <= cx < map_w and 0 <= cy < map_h else 0
+            lx, ly = cx, cy
+        if junctions is None or not head:
+            if not targets:
+                targets.extend(_role_targets(players, map_w, map_h))
+            role = self.role[i]
+            target = (targets[0][role], targets[1][role])
+            # đang đứng yên tại chỗ (tới đích / không có đường): chỉ tra lại khi mục tiêu đổi ô
+            if junctions is None or moved or target != (gx, gy):
+                nxt = self.ghosts[i].next_tile((cx, cy), target, is_blocked, map_w, map_h, nav, flows, junctions)
+                head = _CODE_OF[(nxt[0] - cx, nxt[1] - cy)] if nxt else 0
+                lx, ly = cx, cy
+                gx, gy = target
+                self.decisions += 1
+        if (lx, ly, head, gx, gy) != tuple(steer):
+            self.steer[i] = (lx, ly, head, gx, gy)
+        return lx, ly, head
+
+    def update(self, dt: float, is_blocked, map_w: int, map_h: int, players: List,
+               nav: Optional[NavTable] = None, flows: Optional[List[FlowField]] = None,
+               junctions: Optional[JunctionGraph] = None):
+        """
+        Một bước của cả đàn, cho kết quả như gọi Ghost.update lần lượt từng ghost.
+        Đàn nhỏ (dưới SWARM_VECTOR_MIN) chạy vòng vô hướng trên list: chi phí cố định
+        của vài chục phép numpy lớn hơn cả tính tay vài ghost.
+        Không có junctions thì mọi ghost tra bước kế tiếp mỗi bước (như trước khi có đồ thị ngã rẽ).
+        """
+        n = len(self.ghosts)
+        if n < SWARM_VECTOR_MIN:
+            if n:
+                self.update_scalar(dt, is_blocked, map_w, map_h, players, nav, flows, junctions, range(n))
+            return
+        f = self.f[:n]
+        state = self.state[:n]
+        timer = f[:, _STATE_TIME]
+        np.maximum(timer - dt, 0.0, out=timer)
+        state[(state == _FRIGHT) & (timer <= 0)] = _CHASE
+
+        cx = (f[:, _X] // TILE_SIZE).astype(np.intp)
+        cy = (f[:, _Y] // TILE_SIZE).astype(np.intp)
+        steer = self.steer[:n]
+        head = steer[:, _HEAD]
+        # mục tiêu theo vai trò: chỉ có 4 ô khác nhau, tra theo mã vai trò
+        xs, ys = _role_targets(players, map_w, map_h)
+        role = self.role[:n]
+        tgx = np.array(xs, dtype=np.intp)[role]
+        tgy = np.array(ys, dtype=np.intp)[role]
+        if junctions is None:
+            rows = np.arange(n)
+        else:
+            # chỉ xét ghost vừa sang ô mới, hoặc đang đứng yên (tới đích, không có đường) mà mục tiêu đổi ô
+            moved = (cx != steer[:, _LAST_X]) | (cy != steer[:, _LAST_Y])
+            rows = np.flatnonzero(moved | ((head == 0) & ((steer[:, _GOAL_X] != tgx) | (steer[:, _GOAL_Y] != tgy))))
+            if len(rows) < SWARM_VECTOR_MIN:
+                # thường chỉ vài ghost mỗi bước: tính tay rẻ hơn chi phí cố định của numpy
+                targets = [xs, ys]
+                for i, x, y in zip(rows.tolist(), cx[rows].tolist(), cy[rows].tolist()):
+                    self._steer_row(i, x, y, targets, is_blocked, map_w, map_h, players, nav, flows, junctions)
+                rows = rows[:0]
+            else:
+                # vừa sang ô hành lang (hoặc ngõ cụt) từ ô kề: hướng đi tiếp đã định sẵn
+                mv = rows[moved[rows]]
+                mx, my = cx[mv], cy[mv]
+                ddx = mx - steer[mv, _LAST_X]
+                ddy = my - steer[mv, _LAST_Y]
+                near = (np.abs(ddx) + np.abs(ddy) == 1) & (mx >= 0) & (my >= 0) & (mx < map_w) & (my < map_h)
+                d_in = np.where(near, _DIR_CODE[np.clip(ddy, -1, 1) + 1, np.clip(ddx, -1, 1) + 1], 0)
+                exits = junctions.exits[np.clip(my, 0, map_h - 1), np.clip(mx, 0, map_w - 1)]
+                head[mv] = CORRIDOR_CONTINUE[exits, d_in]
+                steer[mv, _LAST_X] = mx
+                steer[mv, _LAST_Y] = my
+                # còn lại: ghost vừa vào ngã rẽ, hoặc đứng yên mà mục tiêu đổi ô
+                rows = rows[head[rows] == 0]
+        self._decide(rows, cx[rows], cy[rows], tgx[rows], tgy[rows], is_blocked, map_w, map_h, nav, flows, junctions)
+
+        # mọi ghost đi từ ô quyết định theo hướng đã chọn
+        nx = steer[:, _LAST_X] + _FLOW_DX[head]
+        ny = steer[:, _LAST_Y] + _FLOW_DY[head]
+
+        # di chuyển hướng tới tâm ô kế tiếp (fright chậm hơn)
+        dx = (nx * TILE_SIZE + TILE_SIZE / 2) - f[:, _X]
+        dy = (ny * TILE_SIZE + TILE_SIZE / 2) - f[:, _Y]
+        # float_power gọi pow() như ** của Python (sqrt có thể lệch 1 ulp): trùng bit với Ghost.update
+        dist = np.maximum(1.0, np.float_power(dx * dx + dy * dy, 0.5))
+        speed_px = f[:, _SPEED] * TILE_SIZE * np.where(state == _FRIGHT, 0.6, 1.0)
+        f[:, _X] += speed_px * dx / dist * dt
+        f[:, _Y] += speed_px * dy / dist * dt
+
+    def update_scalar(self, dt: float, is_blocked, map_w: int, map_h: int, players: List,
+                      nav: Optional[NavTable], flows: Optional[List[FlowField]],
+                      junctions: Optional[JunctionGraph], rows: Sequence[int]):
+        """Cập nhật từng hàng trong rows bằng số thực Python (đọc mảng một lần, ghi lại một lần)."""
+        targets: List[List[int]] = []     # mục tiêu theo vai trò, chỉ tính khi có ghost cần đến
+        f = self.f
+        for i in rows:
+            x, y, _, _, speed, timer = f[i].tolist()
+            state = int(self.state[i])
+            if timer > 0:
+                timer = max(0.0, timer - dt)
+                f[i, _STATE_TIME] = timer
+            if state == _FRIGHT and timer <= 0:
+                state = self.state[i] = _CHASE
+            lx, ly, head = self._steer_row(i, int(x // TILE_SIZE), int(y // TILE_SIZE), targets,
+                                           is_blocked, map_w, map_h, players, nav, flows, junctions)
+            dx, dy = FLOW_DIRS[head]
+
+            # di chuyển hướng tới tâm ô kế tiếp (fright chậm hơn)
+            dx = ((lx + dx) * TILE_SIZE + TILE_SIZE / 2) - x
+            dy = ((ly + dy) * TILE_SIZE + TILE_SIZE / 2) - y
+            dist = max(1.0, (dx * dx + dy * dy) ** 0.5)
+            speed_px = speed * TILE_SIZE * (0.6 if state == _FRIGHT else 1.0)
+            f[i, _X] = x + speed_px * dx / dist * dt
+            f[i, _Y] = y + speed_px * dy / dist * dt
 
 
 class Boss:
@@ -100,10 +542,18 @@ class Boss:
         self.tx, self.ty = tile_pos
         self.x = self.tx * TILE_SIZE + TILE_SIZE / 2
         self.y = self.ty * TILE_SIZE + TILE_SIZE / 2
+        self.prev_x, self.prev_y = self.x, self.y
         self.speed_tiles = BOSS_SPEED * speed_mult
         self.charge_timer = 0.0
         self.health = BOSS_HEALTH
 
+    def save_state(self) -> tuple:
+        return _get_boss_state(self)
+
+    def load_state(self, state: tuple):
+        for name, v in zip(_BOSS_STATE, state):
+            setattr(self, name, v)
+
     def alive(self) -> bool:
         return self.health > 0
 
@@ -127,18 +577,31 @@ class Boss:
         self.x += speed_px * dx / dist * dt
         self.y += speed_px * dy / dist * dt
 
+    def near(self, x: float, y: float, r: float) -> bool:
+        dx = self.x - x
+        dy = self.y - y
+        return (dx * dx + dy * dy) <= (r * r)
+
     def hit_player(self, player) -> bool:
         px, py = player.pixel_center()
-        dx = self.x - px
-        dy = self.y - py
-        r = TILE_SIZE * 0.55
-        return (dx * dx + dy * dy) <= (r * r)
+        return self.near(px, py, TILE_SIZE * 0.55)
+
+    def render_pos(self, alpha: float) -> Tuple[float, float]:
+        return lerp(self.prev_x, self.x, alpha), lerp(self.prev_y, self.y, alpha)
+
+    def bounds(self, alpha: float = 1.0) -> pygame.Rect:
+        # thân tròn + thanh máu phía trên
+        x, y = self.render_pos(alpha)
+        return pygame.Rect(int(x) - 16, int(y) - TILE_SIZE - 1, 32, TILE_SIZE + TILE_SIZE // 2 + 4)
 
-    def draw(self, surf):
-        pygame.draw.circle(surf, COLOR_BOSS, (int(self.x), int(self.y)), TILE_SIZE // 2 + 2)
+    def draw(self, surf, alpha: float = 1.0, offset: Tuple[int, int] = (0, 0)):
+        x, y = self.render_pos(alpha)
+        x -= offset[0]
+        y -= offset[1]
+        pygame.draw.circle(surf, COLOR_BOSS, (int(x), int(y)), TILE_SIZE // 2 + 2)
         # vẽ máu boss
         bw = 30
-        br = pygame.Rect(int(self.x - bw / 2), int(self.y - TILE_SIZE), bw, 6)
+        br = pygame.Rect(int(x - bw / 2), int(y - TILE_SIZE), bw, 6)
         pygame.draw.rect(surf, (60, 60, 60), br, border_radius=2)
         if self.health > 0:
             frac = self.health / BOSS_HEALTH
@@ -0,0 +1,291 @@
+"""
+Vẽ màn chơi: nền map dựng sẵn, vật phẩm, ghost, boss, người chơi, hạt và HUD.
+Nền map được vẽ theo khối (ChunkCache): khối chỉ được raster hoá khi lần đầu lọt
+vào vùng nhìn và giữ trong LRU, nên map 1000x1000 ô vẫn tốn bộ nhớ cố định.
+Camera bám người chơi khi map lớn hơn cửa sổ; ảnh nền của vùng nhìn ghép lại từ
+các khối mỗi khi camera đổi vị trí. Ăn pellet chỉ xoá đúng ô đó trong khối và
+trên nền (O(1)), không dựng lại cả map.
+Hai chế độ trình chiếu để so sánh A/B:
+- full: tô lại cả màn hình và pygame.display.flip() mỗi khung.
+- dirty: xoá vùng cũ của sprite bằng nền, vẽ lại sprite, HUD chỉ vẽ khi đổi,
+  rồi pygame.display.update(rects) với đúng các vùng đó.
+Ở cả hai chế độ HUD là một panel vẽ sẵn (HudPanel), chỉ raster hoá lại khi nội dung đổi.
+Bảng phủ (overlay, ví dụ bảng profiler F3) vẽ sau cùng ở góc trên trái vùng chơi.
+"""
+
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+import pygame
+from settings import (
+    TILE_SIZE, HUD_HEIGHT, COLOR_BG, VIEWPORT_TILES, MAP_CHUNK_TILES, MAP_CHUNK_CACHE
+)
+from utils import clamp
+from profiler import Profiler
+from src.ui import HudPanel
+
+
+def window_size(gmap) -> Tuple[int, int]:
+    """Cỡ cửa sổ vừa khít map, tối đa VIEWPORT_TILES ô, cộng HUD."""
+    return (min(gmap.w, VIEWPORT_TILES[0]) * TILE_SIZE,
+            min(gmap.h, VIEWPORT_TILES[1]) * TILE_SIZE + HUD_HEIGHT)
+
+
+class Camera:
+    """Góc trên trái vùng nhìn (pixel thế giới), kẹp trong map; map nhỏ hơn vùng nhìn thì đứng yên ở 0."""
+
+    def __init__(self, view_w: int, view_h: int):
+        self.w = view_w
+        self.h = view_h
+        self.x = 0
+        self.y = 0
+
+    def follow(self, cx: float, cy: float, world_w: int, world_h: int):
+        self.x = int(clamp(cx - self.w / 2, 0, max(0, world_w - self.w)))
+        self.y = int(clamp(cy - self.h / 2, 0, max(0, world_h - self.h)))
+
+    @property
+    def offset(self) -> Tuple[int, int]:
+        return self.x, self.y
+
+    def rect(self) -> pygame.Rect:
+        return pygame.Rect(self.x, self.y, self.w, self.h)
+
+
+class ChunkCache:
+    """Ảnh nền (tường + pellet) của map theo khối size x size ô, vẽ lười, giữ tối đa capacity khối (LRU)."""
+
+    def __init__(self, gmap, size: int = MAP_CHUNK_TILES, capacity: int = MAP_CHUNK_CACHE):
+        self.gmap = gmap
+        self.size = size
+        self.px = size * TILE_SIZE
+        self.capacity = capacity
+        self.chunks: "OrderedDict[Tuple[int, int], pygame.Surface]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, cx: int, cy: int) -> pygame.Surface:
+        key = (cx, cy)
+        surf = self.chunks.get(key)
+        if surf is not None:
+            self.chunks.move_to_end(key)
+            self.hits += 1
+            return surf
+        self.misses += 1
+        n = self.size
+        surf = pygame.Surface((self.px, self.px))
+        surf.fill(COLOR_BG)
+        self.gmap.draw(surf, (cx * n, cy * n, cx * n + n, cy * n + n))
+        self.chunks[key] = surf
+        if len(self.chunks) > self.capacity:
+            self.chunks.popitem(last=False)
+        return surf
+
+    def erase_tile(self, x: int, y: int):
+        """Xoá pellet ô (x, y) khỏi khối chứa nó nếu khối đang được cache (khối chưa vẽ sẽ đọc lưới mới)."""
+        n = self.size
+        surf = self.chunks.get((x // n, y // n))
+        if surf is not None:
+            surf.fill(COLOR_BG, ((x % n) * TILE_SIZE, (y % n) * TILE_SIZE, TILE_SIZE, TILE_SIZE))
+
+    def redraw_tile(self, x: int, y: int) -> Tuple[pygame.Surface, pygame.Rect]:
+        """Vẽ lại ô (x, y) theo lưới hiện tại trong khối chứa nó; trả về (khối, vùng ô trong khối)."""
+        n = self.size
+        surf = self.get(x // n, y // n)
+        area = pygame.Rect((x % n) * TILE_SIZE, (y % n) * TILE_SIZE, TILE_SIZE, TILE_SIZE)
+        surf.fill(COLOR_BG, area)
+        self.gmap.draw(surf.subsurface(area), (x, y, x + 1, y + 1))
+        return surf, area
+
+    def blit_view(self, dst: pygame.Surface, view: pygame.Rect):
+        """Ghép các khối giao với view (pixel thế giới) lên dst, góc view tại (0, 0) của dst."""
+        px = self.px
+        max_cx = (self.gmap.w - 1) // self.size
+        max_cy = (self.gmap.h - 1) // self.size
+        for cy in range(max(0, view.top // px), min(max_cy, (view.bottom - 1) // px) + 1):
+            for cx in range(max(0, view.left // px), min(max_cx, (view.right - 1) // px) + 1):
+                dst.blit(self.get(cx, cy), (cx * px - view.left, cy * px - view.top))
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+
+class WorldRenderer:
+    def __init__(self, screen: pygame.Surface, font, dirty: bool = True,
+                 profiler: Optional[Profiler] = None):
+        self.screen = screen
+        self.font = font
+        self.dirty = dirty
+        self.world_rect = pygame.Rect(0, 0, screen.get_width(), screen.get_height() - HUD_HEIGHT)
+        self.hud_rect = pygame.Rect(0, self.world_rect.bottom, screen.get_width(), HUD_HEIGHT)
+        self.gmap = None
+        self.camera = Camera(self.world_rect.w, self.world_rect.h)
+        self.chunks: Optional[ChunkCache] = None
+        self.background = pygame.Surface(self.world_rect.size)  # nền map của vùng nhìn hiện tại
+        self._bg_origin: Optional[Tuple[int, int]] = None
+        self._full = True
+        self._prev_rects: List[pygame.Rect] = []
+        self._rects: List[pygame.Rect] = []
+        self.hud = HudPanel(screen.get_width(), font)
+        # bảng phủ vẽ trên cùng (None: không có) và vùng nó chiếm ở khung trước
+        self.overlay: Optional[pygame.Surface] = None
+        self._overlay_rect: Optional[pygame.Rect] = None
+        self.profiler = profiler or Profiler()
+        # thống kê fill-rate: tổng số pixel đẩy lên màn hình / số khung
+        self.frames = 0
+        self.pixels_pushed = 0
+
+    def set_dirty(self, dirty: bool):
+        self.dirty = dirty
+        self.invalidate()
+
+    def invalidate(self):
+        """Buộc khung tiếp theo vẽ và đẩy toàn màn hình (đổi map, đổi state, đổi chế độ)."""
+        self._full = True
+
+    def set_map(self, gmap):
+        self.gmap = gmap
+        gmap.drain_eaten()
+        gmap.drain_restored()
+        self.chunks = ChunkCache(gmap)
+        self._bg_origin = None
+        self.invalidate()
+
+    def _follow(self, sim, alpha: float):
+        """Đặt camera theo trung điểm hai người chơi; dựng lại nền vùng nhìn nếu camera đã đổi chỗ."""
+        pos = [pl.render_pos(alpha) for pl in sim.players]
+        cx = sum(p[0] for p in pos) / len(pos)
+        cy = sum(p[1] for p in pos) / len(pos)
+        cam = self.camera
+        cam.follow(cx, cy, self.gmap.w * TILE_SIZE, self.gmap.h * TILE_SIZE)
+        if cam.offset != self._bg_origin:
+            self._bg_origin = cam.offset
+            self.background.fill(COLOR_BG)
+            self.chunks.blit_view(self.background, cam.rect())
+            self.invalidate()
+
+    def _erase_eaten(self) -> List[pygame.Rect]:
+        """
+        Xoá các ô pellet vừa bị ăn khỏi khối nền và nền vùng nhìn, rồi vẽ lại các ô có pellet
+        trở lại do rollback (theo lưới hiện tại); trả về vùng màn hình đã đổi.
+        """
+        rects = []
+        ox, oy = self.camera.offset
+        for (x, y) in self.gmap.drain_eaten():
+            self.chunks.erase_tile(x, y)
+            r = self.gmap.tile_rect(x, y).move(-ox, -oy)
+            if r.colliderect(self.world_rect):
+                self.background.fill(COLOR_BG, r)
+                rects.append(r)
+        for (x, y) in self.gmap.drain_restored():
+            surf, area = self.chunks.redraw_tile(x, y)
+            r = self.gmap.tile_rect(x, y).move(-ox, -oy)
+            if r.colliderect(self.world_rect):
+                self.background.blit(surf, r, area)
+                rects.append(r)
+        return rects
+
+    def _visible_items(self, sim) -> list:
+        """Item có vùng vẽ giao vùng nhìn (map lớn có thể có rất nhiều ngoài màn hình)."""
+        view = self.camera.rect()
+        return [it for it in sim.items.items if view.colliderect(it.bounds())]
+
+    def _sprite_rects(self, sim, alpha: float) -> List[pygame.Rect]:
+        rects = [it.bounds() for it in self._visible_items(sim)]
+        # ghost lọc theo vùng nhìn trên mảng của đàn (horde có thể hàng nghìn con)
+        rects += sim.swarm.bounds(alpha, self.camera.rect())
+        if sim.boss and sim.boss.alive():
+            rects.append(sim.boss.bounds(alpha))
+        rects += [pl.bounds(alpha) for pl in sim.players]
+        pr = sim.particles.bounds()
+        if pr is not None:
+            rects.append(pr)
+        ox, oy = self.camera.offset
+        return [r.move(-ox, -oy).clip(self.world_rect) for r in rects]
+
+    def _draw_sprites(self, sim, alpha: float):
+        screen = self.screen
+        off = self.camera.offset
+        # sprite sát mép dưới không được lem xuống HUD
+        screen.set_clip(self.world_rect)
+        for it in self._visible_items(sim):
+            it.draw(screen, off)
+        sim.swarm.draw(screen, alpha, off, self.camera.rect())
+        if sim.boss and sim.boss.alive():
+            sim.boss.draw(screen, alpha, off)
+        for pl in sim.players:
+            pl.draw(screen, alpha, off)
+        sim.particles.draw(screen, off)
+        screen.set_clip(None)
+
+    def _draw_overlay(self) -> Optional[pygame.Rect]:
+        if self.overlay is None:
+            return None
+        self.screen.set_clip(self.world_rect)
+        r = self.screen.blit(self.overlay, (4, 4))
+        self.screen.set_clip(None)
+        return r
+
+    def draw(self, sim, alpha: float = 1.0):
+        """Vẽ một khung; alpha nội suy vị trí entity giữa bước logic trước và hiện tại."""
+        if sim.gmap is not self.gmap:
+            self.set_map(sim.gmap)
+        screen = self.screen
+        prof = self.profiler
+        t = prof.mark()
+        self._follow(sim, alpha)
+        eaten = self._erase_eaten()
+        if not self.dirty or self._full:
+            screen.blit(self.background, (0, 0))
+            self._draw_sprites(sim, alpha)
+            t = prof.lap("draw_world", t)
+            self.hud.update(sim.players, sim.level_idx)
+            screen.blit(self.hud.surface, self.hud_rect)
+            prof.lap("draw_hud", t)
+            self._prev_rects = self._sprite_rects(sim, alpha) if self.dirty else []
+            self._overlay_rect = self._draw_overlay()
+            self._rects = [screen.get_rect()]
+            return
+
+        # Xoá vị trí cũ, ô pellet vừa ăn và bảng phủ cũ bằng nền rồi vẽ lại toàn bộ sprite (rẻ, vùng nhỏ)
+        stale = self._prev_rects + eaten
+        if self._overlay_rect is not None:
+            stale.append(self._overlay_rect)
+        for r in stale:
+            screen.blit(self.background, r, r)
+        self._draw_sprites(sim, alpha)
+        cur = self._sprite_rects(sim, alpha)
+        rects = stale + cur
+        self._prev_rects = cur
+        t = prof.lap("draw_world", t)
+
+        if self.hud.update(sim.players, sim.level_idx):
+            screen.blit(self.hud.surface, self.hud_rect)
+            rects.append(self.hud_rect)
+        prof.lap("draw_hud", t)
+        self._overlay_rect = self._draw_overlay()
+        if self._overlay_rect is not None:
+            rects.append(self._overlay_rect)
+        self._rects = [r for r in rects if r.w > 0 and r.h > 0]
+
+    def present(self):
+        """Đẩy khung đã vẽ lên màn hình theo chế độ hiện tại."""
+        t = self.profiler.mark()
+        if not self.dirty or self._full:
+            pygame.display.flip()
+            self._full = False
+            pushed = self.screen.get_width() * self.screen.get_height()
+        else:
+            pygame.display.update(self._rects)
+            pushed = sum(r.w * r.h for r in self._rects)
+        self.profiler.lap("present", t)
+        self.frames += 1
+        self.pixels_pushed += pushed
+
+    def fill_ratio(self) -> float:
+        """Tỉ lệ pixel trung bình mỗi khung so với flip toàn màn hình (1.0 = full)."""
+        full = self.screen.get_width() * self.screen.get_height()
+        return self.pixels_pushed / max(1, self.frames * full)
+
+    def reset_stats(self):
+        self.frames = 0
+        self.pixels_pushed = 0
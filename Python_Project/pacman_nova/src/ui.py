@@ -1,15 +1,58 @@
 """
-Giao diện: Menu, Settings, HUD (máu, điểm, kỹ năng).
+Giao diện: Menu, Settings, HUD (máu, điểm, kỹ năng), bảng profiler (F3).
+Raster hoá chữ (font.render) là một trong các lệnh pygame đắt nhất, nên mọi chữ
+đi qua text_cache (LRU theo font, chuỗi, màu); HUD được vẽ sẵn lên một Surface
+riêng (HudPanel) và chỉ vẽ lại khi điểm, máu, level hay trạng thái kỹ năng đổi.
 """
 
-from typing import List
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
 import pygame
 from settings import (
     COLOR_UI_PANEL, COLOR_TEXT, COLOR_UI_ACCENT, HUD_HEIGHT,
-    COLOR_HEALTH_GOOD, COLOR_HEALTH_WARN, COLOR_HEALTH_LOW, DEFAULT_VOLUME
+    COLOR_HEALTH_GOOD, COLOR_HEALTH_WARN, COLOR_HEALTH_LOW, DEFAULT_VOLUME,
+    PROFILE_OVERLAY_REFRESH, TEXT_CACHE_SIZE
 )
 
 
+class TextCache:
+    """Cache LRU các Surface chữ đã render theo khoá (font, chuỗi, màu)."""
+
+    def __init__(self, max_items: int = TEXT_CACHE_SIZE):
+        self.max_items = max_items
+        self._items: "OrderedDict[tuple, pygame.Surface]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def render(self, font: pygame.font.Font, text: str, color: Tuple[int, int, int]) -> pygame.Surface:
+        key = (font, text, color)
+        surf = self._items.get(key)
+        if surf is not None:
+            self._items.move_to_end(key)
+            self.hits += 1
+            return surf
+        self.misses += 1
+        surf = self._items[key] = font.render(text, True, color)
+        if len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+        return surf
+
+    def clear(self):
+        self._items.clear()
+
+
+text_cache = TextCache()
+
+
+def render_text(font: pygame.font.Font, text: str, color: Tuple[int, int, int] = COLOR_TEXT) -> pygame.Surface:
+    """font.render(text, True, color) qua text_cache; Surface trả về dùng chung, không được vẽ đè lên."""
+    return text_cache.render(font, text, color)
+
+
 class Menu:
     def __init__(self, font, sound):
         self.font = font
@@ -30,11 +73,11 @@ class Menu:
 
     def draw(self, surf):
         surf.fill((6, 6, 12))
-        title = self.font["xl"].render("Pacman Nova", True, COLOR_UI_ACCENT)
+        title = render_text(self.font["xl"], "Pacman Nova", COLOR_UI_ACCENT)
         surf.blit(title, (surf.get_width() // 2 - title.get_width() // 2, 100))
         for i, it in enumerate(self.items):
             col = COLOR_UI_ACCENT if i == self.sel else COLOR_TEXT
-            txt = self.font["lg"].render(it, True, col)
+            txt = render_text(self.font["lg"], it, col)
             surf.blit(txt, (surf.get_width() // 2 - txt.get_width() // 2, 220 + i * 50))
 
     def selected(self) -> str:
@@ -56,7 +99,7 @@ def draw_hud(surf, font, p1, p2, level_idx: int):
     pygame.draw.rect(surf, COLOR_UI_PANEL, rect)
 
     # Điểm
-    txt = font["md"].render(f"Level {level_idx + 1}  |  P1: {p1.score}  P2: {p2.score}", True, COLOR_TEXT)
+    txt = render_text(font["md"], f"Level {level_idx + 1}  |  P1: {p1.score}  P2: {p2.score}")
     surf.blit(txt, (12, h - HUD_HEIGHT + 10))
 
     # Thanh máu
@@ -69,7 +112,7 @@ def draw_hud(surf, font, p1, p2, level_idx: int):
         fg = bar.copy()
         fg.width = int(bw * frac)
         pygame.draw.rect(surf, _health_color(frac), fg, border_radius=4)
-        s = font["sm"].render(label, True, COLOR_TEXT)
+        s = render_text(font["sm"], label)
         surf.blit(s, (px, py - 18))
 
     draw_hp(12, h - 48, p1, "P1 HP")
@@ -84,8 +127,63 @@ def draw_hud(surf, font, p1, p2, level_idx: int):
             st.append("SHD")
         if player.boost_timer.time_left > 0:
             st.append("SPD")
-        s = font["sm"].render(text + (" [" + ", ".join(st) + "]" if st else ""), True, COLOR_TEXT)
+        s = render_text(font["sm"], text + (" [" + ", ".join(st) + "]" if st else ""))
         surf.blit(s, (px, py))
 
     draw_status(w - 260, h - 48, p1, "P1 Skills")
-    draw_status(w - 260, h - 26, p2, "P2 Skills")
\ No newline at end of file
+    draw_status(w - 260, h - 26, p2, "P2 Skills")
+
+
+def hud_signature(players, level_idx: int) -> tuple:
+    """Mọi giá trị draw_hud hiển thị; HUD chỉ cần vẽ lại khi bộ này đổi."""
+    sig = [level_idx]
+    for pl in players:
+        sig += [pl.score, pl.health, pl.health_max, pl.is_invisible(), pl.has_shield(),
+                pl.boost_timer.time_left > 0]
+    return tuple(sig)
+
+
+class HudPanel:
+    """HUD vẽ sẵn trên Surface riêng (rộng width, cao HUD_HEIGHT); update() chỉ vẽ lại khi hud_signature đổi."""
+
+    def __init__(self, width: int, font):
+        self.font = font
+        self.surface = pygame.Surface((width, HUD_HEIGHT))
+        self.sig: Optional[tuple] = None
+        self.rebuilds = 0
+
+    def update(self, players, level_idx: int) -> bool:
+        """Vẽ lại panel nếu cần; trả True khi nội dung vừa đổi."""
+        sig = hud_signature(players, level_idx)
+        if sig == self.sig:
+            return False
+        self.sig = sig
+        draw_hud(self.surface, self.font, players[0], players[1], level_idx)
+        self.rebuilds += 1
+        return True
+
+
+class ProfilerOverlay:
+    """Bảng chữ p50/p99 của profiler; chỉ render lại mỗi PROFILE_OVERLAY_REFRESH giây."""
+
+    def __init__(self, refresh: float = PROFILE_OVERLAY_REFRESH):
+        self.font = pygame.font.SysFont("monospace", 13)
+        self.refresh = refresh
+        self.panel: Optional[pygame.Surface] = None
+        self._built_at = 0.0
+
+    def update(self, lines: List[str]):
+        now = time.perf_counter()
+        if self.panel is not None and now - self._built_at < self.refresh:
+            return
+        self._built_at = now
+        rows = [self.font.render(line, True, COLOR_TEXT) for line in lines]
+        lh = self.font.get_linesize()
+        # nền đục: chế độ dirty-rect không khôi phục vùng này mỗi khung nên không pha alpha được
+        self.panel = pygame.Surface((max(r.get_width() for r in rows) + 12, lh * len(rows) + 8))
+        self.panel.fill(COLOR_UI_PANEL)
+        for i, r in enumerate(rows):
+            self.panel.blit(r, (6, 4 + i * lh))
+
+    def draw(self, surf, pos=(4, 4)) -> pygame.Rect:
+        return surf.blit(self.panel, pos)
@@ -1,5 +1,6 @@
 """
-Tiện ích: toán học lưới, tìm đường A*, bộ đếm thời gian, easing đơn giản.
+Tiện ích: toán học lưới, tìm đường A*, bảng dẫn đường dựng sẵn, flow field,
+băm không gian (tìm vật phẩm gần người chơi), bộ đếm thời gian, easing đơn giản.
 """
 
 from __future__ import annotations
@@ -8,8 +9,12 @@ from dataclasses import dataclass
 import heapq
 from typing import Dict, Iterable, List, Optional, Set, Tuple, Callable
 
+import numpy as np
+
 GridPos = Tuple[int, int]
 
+UNREACHABLE = 0xFFFF
+
 
 def manhattan(a: GridPos, b: GridPos) -> int:
     return abs(a[0] - b[0]) + abs(a[1] - b[1])
@@ -79,10 +84,755 @@ def a_star(
     return None
 
 
+class NavTable:
+    """
+    Bảng dẫn đường cho một màn: khoảng cách BFS và ô kế tiếp giữa mọi cặp ô đi được.
+    Dựng một lần khi tạo map (mê cung không đổi trong màn), sau đó tra cứu O(1).
+    - index[y, x]: chỉ số nút của ô (x, y), -1 nếu là tường.
+    - tiles[i]: toạ độ (x, y) của nút i.
+    - dist[s, t]: số bước ngắn nhất từ s tới t (UNREACHABLE nếu không tới được).
+    - next_hop[s, t]: nút kế tiếp trên đường ngắn nhất từ s tới t (-1 nếu không có).
+    """
+
+    def __init__(self, walkable: np.ndarray):
+        self.h, self.w = walkable.shape
+        ys, xs = np.nonzero(walkable)
+        n = len(xs)
+        self.n = n
+        self.index = np.full((self.h, self.w), -1, dtype=np.int32)
+        self.index[ys, xs] = np.arange(n, dtype=np.int32)
+        self.tiles = np.stack([xs, ys], axis=1).astype(np.int32)
+        hop_dtype = np.int16 if n < 0x7FFF else np.int32
+        self.dist = np.full((n, n), UNREACHABLE, dtype=np.uint16)
+        self.next_hop = np.full((n, n), -1, dtype=hop_dtype)
+
+        # danh sách kề theo chỉ số nút
+        index = self.index
+        adj: List[List[int]] = []
+        for x, y in zip(xs.tolist(), ys.tolist()):
+            adj.append([int(index[ny, nx]) for nx, ny in neighbors_4(self.w, self.h, (x, y))
+                        if index[ny, nx] >= 0])
+
+        # Lưới 4 hướng vô hướng: BFS ngược từ mỗi đích t cho cả cột t.
+        # Ô v được phát hiện từ u thì u là bước kế tiếp của v khi đi về t.
+        for t in range(n):
+            dist_col = [UNREACHABLE] * n
+            hop_col = [-1] * n
+            dist_col[t] = 0
+            hop_col[t] = t
+            frontier = [t]
+            d = 0
+            while frontier:
+                d += 1
+                nxt_frontier = []
+                for u in frontier:
+                    for v in adj[u]:
+                        if dist_col[v] == UNREACHABLE:
+                            dist_col[v] = d
+                            hop_col[v] = u
+                            nxt_frontier.append(v)
+                frontier = nxt_frontier
+            self.dist[:, t] = dist_col
+            self.next_hop[:, t] = hop_col
+
+    @classmethod
+    def from_arrays(cls, index: np.ndarray, tiles: np.ndarray, dist: np.ndarray,
+                    next_hop: np.ndarray) -> "NavTable":
+        """Dựng lại bảng từ các mảng đã tính sẵn (ví dụ nạp từ cache trên đĩa), không chạy BFS."""
+        nav = cls.__new__(cls)
+        nav.h, nav.w = index.shape
+        nav.n = len(tiles)
+        nav.index, nav.tiles, nav.dist, nav.next_hop = index, tiles, dist, next_hop
+        return nav
+
+    def node(self, cell: GridPos) -> int:
+        x, y = cell
+        if 0 <= x < self.w and 0 <= y < self.h:
+            return int(self.index[y, x])
+        return -1
+
+    def distance(self, start: GridPos, goal: GridPos) -> Optional[int]:
+        s, g = self.node(start), self.node(goal)
+        if s < 0 or g < 0 or self.dist[s, g] == UNREACHABLE:
+            return None
+        return int(self.dist[s, g])
+
+    def next_step(self, start: GridPos, goal: GridPos) -> Optional[GridPos]:
+        """Ô kế tiếp trên đường ngắn nhất (start nếu đã tới), None nếu không có đường."""
+        s, g = self.node(start), self.node(goal)
+        if s < 0 or g < 0:
+            return None
+        h = int(self.next_hop[s, g])
+        if h < 0:
+            return None
+        return int(self.tiles[h, 0]), int(self.tiles[h, 1])
+
+
+# Mã hướng của flow field: 0 = đứng yên (đích hoặc không tới được)
+FLOW_DIRS: Tuple[GridPos, ...] = ((0, 0), (1, 0), (-1, 0), (0, 1), (0, -1))
+
+
+class FlowField:
+    """
+    Trường hướng về một ô đích: BFS ngược từ đích cho mỗi ô một hướng đi tiếp.
+    Mọi ghost nhắm cùng đích đọc chung một trường thay vì tự tìm đường.
+    Chỉ tính lại khi đích đổi ô (retarget với ô cũ là no-op), và chỉ khi dist/dirs
+    được đọc: ghost chỉ tra ở ngã rẽ nên đích có thể đổi nhiều lần giữa hai lần đọc.
+    """
+
+    def __init__(self, walkable: np.ndarray):
+        self.h, self.w = walkable.shape
+        self._open = walkable.ravel().tolist()
+        self.target: Optional[GridPos] = None
+        self._dist = np.full((self.h, self.w), UNREACHABLE, dtype=np.uint16)
+        self._dirs = np.zeros((self.h, self.w), dtype=np.int8)
+        self._stale = False
+        self.recomputes = 0
+
+    def retarget(self, target: GridPos) -> bool:
+        """Đặt đích mới; trả True nếu đích đổi (trường sẽ tính lại khi được đọc)."""
+        if target == self.target:
+            return False
+        self.target = target
+        self._stale = True
+        return True
+
+    @property
+    def dist(self) -> np.ndarray:
+        if self._stale:
+            self._compute()
+        return self._dist
+
+    @property
+    def dirs(self) -> np.ndarray:
+        if self._stale:
+            self._compute()
+        return self._dirs
+
+    def _compute(self):
+        w, h = self.w, self.h
+        dist = [UNREACHABLE] * (w * h)
+        dirs = [0] * (w * h)
+        tx, ty = self.target
+        if 0 <= tx < w and 0 <= ty < h and self._open[ty * w + tx]:
+            # Hướng của ô v là hướng từ v về ô u đã phát hiện ra nó
+            t = ty * w + tx
+            dist[t] = 0
+            frontier = [t]
+            d = 0
+            while frontier:
+                d += 1
+                nxt_frontier = []
+                for u in frontier:
+                    ux = u % w
+                    for v, code, ok in (
+                        (u + 1, 2, ux < w - 1),   # v bên phải -> đi trái về u
+                        (u - 1, 1, ux > 0),       # v bên trái -> đi phải
+                        (u + w, 4, u + w < w * h),  # v bên dưới -> đi lên
+                        (u - w, 3, u >= w),       # v bên trên -> đi xuống
+                    ):
+                        if ok and self._open[v] and dist[v] == UNREACHABLE:
+                            dist[v] = d
+                            dirs[v] = code
+                            nxt_frontier.append(v)
+                frontier = nxt_frontier
+        self._dist = np.array(dist, dtype=np.uint16).reshape(h, w)
+        self._dirs = np.array(dirs, dtype=np.int8).reshape(h, w)
+        self._stale = False
+        self.recomputes += 1
+
+    def next_step(self, cell: GridPos) -> Optional[GridPos]:
+        """Ô kế tiếp về đích (cell nếu đã tới), None nếu không tới được."""
+        x, y = cell
+        if not (0 <= x < self.w and 0 <= y < self.h) or self.dist[y, x] == UNREACHABLE:
+            return None
+        dx, dy = FLOW_DIRS[self.dirs[y, x]]
+        return x + dx, y + dy
+
+
+# hướng ngược của từng mã FLOW_DIRS
+FLOW_OPPOSITE = (0, 2, 1, 4, 3)
+
+
+_DX = np.array([d[0] for d in FLOW_DIRS], dtype=np.intp)
+_DY = np.array([d[1] for d in FLOW_DIRS], dtype=np.intp)
+_OPPOSITE = np.array(FLOW_OPPOSITE, dtype=np.int8)
+_POPCOUNT = np.array([bin(mask).count("1") for mask in range(16)], dtype=np.int8)
+# hai mã lối ra (thấp trước) của ô có đúng hai lối ra
+_CORRIDOR_EXITS = np.array([([c for c in range(1, 5) if mask >> (c - 1) & 1] + [0, 0])[:2]
+                            for mask in range(16)], dtype=np.int8)
+
+
+def _continue_table() -> np.ndarray:
+    """[lối ra, hướng vào] -> mã hướng đi tiếp không cần quyết định (0: ô ngã rẽ)."""
+    table = np.zeros((16, 5), dtype=np.int8)
+    for mask in range(16):
+        codes = [c for c in range(1, 5) if mask >> (c - 1) & 1]
+        for d_in in range(1, 5):
+            back = FLOW_OPPOSITE[d_in]
+            if back not in codes:
+                continue
+            if len(codes) == 1:
+                table[mask, d_in] = back            # ngõ cụt: quay đầu
+            elif len(codes) == 2:
+                table[mask, d_in] = codes[0] if codes[1] == back else codes[1]
+    return table
+
+
+CORRIDOR_CONTINUE = _continue_table()
+
+
+class JunctionGraph:
+    """
+    Đồ thị ngã rẽ của một màn: nút là ô đi được có số lối ra khác 2 (ngã ba, ngã tư,
+    ngõ cụt), cạnh là hành lang nối hai nút, trọng số là số bước.
+    - exits[y, x]: bit (mã - 1) bật nếu đi theo FLOW_DIRS[mã] được; 0 với tường.
+    - node[y, x]: chỉ số nút, -1 nếu không phải nút. tiles[i]: toạ độ nút i.
+    - link[i, mã - 1], cost[i, mã - 1]: nút ở đầu kia hành lang ra từ i theo hướng mã, số bước.
+    - corridor[y, x]: chỉ số ô hành lang k; ends[k, j], ends_dist[k, j], ends_exit[k, j]:
+      nút cuối khi đi theo lối ra thứ j của ô, số bước, và hướng ra từ nút đó quay lại ô.
+    Trong hành lang chỉ có một đường (CORRIDOR_CONTINUE); chỉ ở nút mới cần tìm đường.
+    Hành lang được dò bằng nhảy con trỏ (gấp đôi bước mỗi vòng) trên mảng, không duyệt từng ô.
+    """
+
+    def __init__(self, walkable: np.ndarray):
+        self.h, self.w = h, w = walkable.shape
+        walk = np.pad(walkable, 1)
+        exits = np.zeros((h, w), dtype=np.uint8)
+        for code in range(1, 5):
+            dx, dy = FLOW_DIRS[code]
+            exits |= (walk[1 + dy:h + 1 + dy, 1 + dx:w + 1 + dx] & walkable).astype(np.uint8) << (code - 1)
+        self.exits = exits
+        degree = _POPCOUNT[exits]
+        is_node = walkable & (degree != 2)
+        ys, xs = np.nonzero(is_node)
+        self.n = len(xs)
+        self.node = np.full((h, w), -1, dtype=np.int32)
+        self.node[ys, xs] = np.arange(self.n, dtype=np.int32)
+        self.tiles = np.stack([xs, ys], axis=1).astype(np.int32)
+
+        # tra theo chỉ số phẳng y * w + x (nhanh hơn chỉ số hai chiều trên map lớn)
+        flat_exits = exits.ravel()
+        flat_node = self.node.ravel()
+        step = np.array([dx + dy * w for dx, dy in FLOW_DIRS], dtype=np.int64)
+        # ô hành lang k có hai lối ra (mã thấp trước); trạng thái 2k + j: đứng ở ô k, sắp ra theo lối j
+        cells = np.flatnonzero(walkable & (degree == 2))
+        m = len(cells)
+        self.corridor = np.full((h, w), -1, dtype=np.int32)
+        flat_corridor = self.corridor.ravel()
+        flat_corridor[cells] = np.arange(m, dtype=np.int32)
+        dirs = _CORRIDOR_EXITS[flat_exits[cells]].ravel()
+        nb = np.repeat(cells, 2) + step[dirs]
+        # ô kế tiếp là nút: trạng thái kết thúc sau 1 bước; là hành lang: đi tiếp theo lối còn lại
+        term = flat_node[nb]
+        arrive = dirs.copy()
+        dist = np.ones(2 * m, dtype=np.int32)
+        nxt = np.full(2 * m, -1, dtype=np.int32)
+        inner = np.flatnonzero(term < 0)
+        nxt[inner] = self._state(flat_corridor, flat_exits, nb[inner], dirs[inner], dirs)
+        live = np.flatnonzero(nxt >= 0)
+        for _ in range(max(1, int(m).bit_length() + 1)):
+            if not len(live):
+                break
+            to = nxt[live]
+            dist[live] += dist[to]
+            term[live] = term[to]
+            arrive[live] = arrive[to]
+            nxt[live] = nxt[to]
+            live = live[nxt[live] >= 0]
+        term[live] = -1                                               # vòng kín không có nút
+        self.ends = term.reshape(m, 2)
+        self.ends_dist = dist.reshape(m, 2)
+        self.ends_exit = _OPPOSITE[arrive].reshape(m, 2)
+
+        # cạnh từ mỗi nút theo từng lối ra
+        nodes = ys.astype(np.int64) * w + xs
+        self.link = np.full((self.n, 4), -1, dtype=np.int32)
+        self.cost = np.zeros((self.n, 4), dtype=np.int32)
+        for code in range(1, 5):
+            has = np.flatnonzero(flat_exits[nodes] & (1 << (code - 1)))
+            nb = nodes[has] + step[code]
+            link = flat_node[nb]
+            cost = np.ones(len(has), dtype=np.int32)
+            via = np.flatnonzero(link < 0)
+            st = self._state(flat_corridor, flat_exits, nb[via], np.full(len(via), code, dtype=np.int8), dirs)
+            link[via] = term[st]
+            cost[via] = dist[st] + 1
+            self.link[has, code - 1] = link
+            self.cost[has, code - 1] = cost
+        # list phẳng cho A* (tra từng phần tử nhanh hơn numpy; list lồng tạo rất chậm khi map lớn)
+        self._link = self.link.ravel().tolist()
+        self._cost = self.cost.ravel().tolist()
+        self._xs = xs.tolist()
+        self._ys = ys.tolist()
+        # HPA* (SectorGraph) cho map lớn; GameMap gắn vào khi map không có bảng dẫn đường
+        self.sectors: Optional[SectorGraph] = None
+
+    @staticmethod
+    def _state(flat_corridor: np.ndarray, flat_exits: np.ndarray, cells: np.ndarray,
+               d_in: np.ndarray, dirs: np.ndarray) -> np.ndarray:
+        """Trạng thái 2k + j khi đi vào ô hành lang cells theo hướng d_in (ra ở lối không quay về)."""
+        k = flat_corridor[cells]
+        onward = CORRIDOR_CONTINUE[flat_exits[cells], d_in]
+        return 2 * k + (dirs[2 * k + 1] == onward)
+
+    def is_junction(self, cell: GridPos) -> bool:
+        x, y = cell
+        return 0 <= x < self.w and 0 <= y < self.h and self.node[y, x] >= 0
+
+    def _goals(self, goal: GridPos) -> Dict[int, Tuple[int, int]]:
+        """{nút: (số bước từ nút tới goal, mã hướng ra khỏi nút)} cho goal là nút hoặc ô hành lang."""
+        x, y = goal
+        if not (0 <= x < self.w and 0 <= y < self.h):
+            return {}
+        g = int(self.node[y, x])
+        if g >= 0:
+            return {g: (0, 0)}
+        k = int(self.corridor[y, x])
+        out: Dict[int, Tuple[int, int]] = {}
+        if k >= 0:
+            for j in range(2):
+                end = int(self.ends[k, j])
+                d = int(self.ends_dist[k, j])
+                if end >= 0 and (end not in out or d < out[end][0]):
+                    out[end] = (d, int(self.ends_exit[k, j]))
+        return out
+
+    def next_step(self, start: GridPos, goal: GridPos, max_expansions: int = 3000) -> Optional[GridPos]:
+        """
+        Ô kế tiếp từ nút start về goal theo A* trên đồ thị ngã rẽ (start nếu đã tới);
+        None nếu start không phải nút, không có đường hoặc vượt max_expansions nút.
+        """
+        if not self.is_junction(start):
+            return None
+        if start == goal:
+            return start
+        goals = self._goals(goal)
+        if not goals:
+            return None
+        s = int(self.node[start[1], start[0]])
+        gx, gy = goal
+        xs, ys, link, cost = self._xs, self._ys, self._link, self._cost
+        # (f, g, nút, mã hướng đầu tiên từ start); nút -1 là chính goal
+        open_heap: List[Tuple[int, int, int, int]] = [(abs(start[0] - gx) + abs(start[1] - gy), 0, s, 0)]
+        best: Dict[int, int] = {s: 0}
+        done: Set[int] = set()
+        expansions = 0
+        while open_heap and expansions < max_expansions:
+            _, g, u, first = heapq.heappop(open_heap)
+            if u < 0:
+                dx, dy = FLOW_DIRS[first]
+                return start[0] + dx, start[1] + dy
+            if u in done:
+                continue
+            done.add(u)
+            expansions += 1
+            hit = goals.get(u)
+            if hit is not None:
+                heapq.heappush(open_heap, (g + hit[0], g + hit[0], -1, first or hit[1]))
+            base = 4 * u
+            for j in range(4):
+                v = link[base + j]
+                if v < 0:
+                    continue
+                ng = g + cost[base + j]
+                old = best.get(v)
+                if old is None or ng < old:
+                    best[v] = ng
+                    heapq.heappush(open_heap, (ng + abs(xs[v] - gx) + abs(ys[v] - gy), ng, v, first or j + 1))
+        return None
+
+
+class SectorGraph:
+    """
+    HPA* trên đồ thị ngã rẽ cho map lớn (500x500 trở lên).
+    - Map chia thành các khu size x size ô; nút ngã rẽ có hành lang sang khu khác là cửa.
+    - Bảng của khu (dist[nút, cửa]: số bước trong khu từ nút tới từng cửa) tính lần đầu
+      khu được dùng rồi giữ lại; bộ nhớ cỡ số nút x số cửa mỗi khu.
+    - Tìm đường: A* trên các cửa (cạnh trong khu tra bảng, cạnh giữa hai khu là hành lang),
+      bước đầu tiên lấy từ tìm kiếm cục bộ trong khu của ô xuất phát.
+    - Mở quá max_expansions cửa thì đi về phía cửa gần đích nhất đã mở thay vì đứng yên.
+    """
+
+    def __init__(self, graph: JunctionGraph, size: int = 16, max_expansions: int = 1000):
+        self.graph = graph
+        self.size = size
+        self.max_expansions = max_expansions
+        self.cols = (graph.w + size - 1) // size
+        tiles = graph.tiles
+        sector = (tiles[:, 1] // size) * self.cols + tiles[:, 0] // size
+        self.sector = sector.astype(np.int32)
+        # nút của từng khu, liền nhau theo khu; local[i]: vị trí của nút i trong khu
+        order = np.argsort(sector, kind="stable").astype(np.int32)
+        n_sectors = self.cols * ((graph.h + size - 1) // size)
+        bounds = np.searchsorted(sector[order], np.arange(n_sectors + 1)).tolist()
+        self.local = np.empty(graph.n, dtype=np.int32)
+        self.local[order] = np.arange(graph.n, dtype=np.int32) - np.repeat(bounds[:-1], np.diff(bounds))
+        flat = order.tolist()
+        self._members = [flat[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+        # cạnh sang khu khác: hai đầu đều là cửa
+        link = graph.link
+        cross = (link >= 0) & (sector[np.maximum(link, 0)] != sector[:, None])
+        gate = cross.any(axis=1)
+        self._gates = [[i for i in nodes if gate[i]] for nodes in self._members]
+        self.gates = int(np.count_nonzero(gate))
+        # gate_no[i]: cột của cửa i trong bảng khu của nó
+        self._gate_no = [-1] * graph.n
+        for nodes in self._gates:
+            for k, i in enumerate(nodes):
+                self._gate_no[i] = k
+        self._cross = np.where(cross, link, -1).ravel().tolist()
+        self._sector = self.sector.tolist()
+        self._local = self.local.tolist()
+        self._tables: Dict[int, List[List[int]]] = {}
+
+    def _search(self, src: int) -> Tuple[Dict[int, int], Dict[int, int]]:
+        """Dijkstra từ nút src, chỉ trong khu của src: {nút: số bước}, {nút: mã hướng đầu tiên từ src}."""
+        graph = self.graph
+        link, cost, sector = graph._link, graph._cost, self._sector
+        home = sector[src]
+        dist = {src: 0}
+        first = {src: 0}
+        heap = [(0, src)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            base = 4 * u
+            for j in range(4):
+                v = link[base + j]
+                if v < 0 or sector[v] != home:
+                    continue
+                nd = d + cost[base + j]
+                if nd < dist.get(v, nd + 1):
+                    dist[v] = nd
+                    first[v] = first[u] or j + 1
+                    heapq.heappush(heap, (nd, v))
+        return dist, first
+
+    def table(self, sec: int) -> List[List[int]]:
+        """Bảng của khu sec: hàng theo vị trí nút trong khu, cột theo cửa (-1: không tới được trong khu)."""
+        rows = self._tables.get(sec)
+        if rows is not None:
+            return rows
+        graph = self.graph
+        link, cost, sector, local = graph._link, graph._cost, self._sector, self._local
+        # kề trong khu theo vị trí nút trong khu
+        adj = []
+        for u in self._members[sec]:
+            base = 4 * u
+            adj.append([(local[link[base + j]], cost[base + j]) for j in range(4)
+                        if link[base + j] >= 0 and sector[link[base + j]] == sec])
+        gates = self._gates[sec]
+        size = len(adj)
+        rows = [[-1] * len(gates) for _ in range(size)]
+        never = 1 << 30
+        # đồ thị vô hướng: Dijkstra từ mỗi cửa cho khoảng cách từ mọi nút tới cửa đó
+        for k, g in enumerate(gates):
+            dist = [never] * size
+            src = local[g]
+            dist[src] = 0
+            heap = [(0, src)]
+            while heap:
+                d, u = heapq.heappop(heap)
+                if d > dist[u]:
+                    continue
+                rows[u][k] = d
+                for v, c in adj[u]:
+                    nd = d + c
+                    if nd < dist[v]:
+                        dist[v] = nd
+                        heapq.heappush(heap, (nd, v))
+        self._tables[sec] = rows
+        return rows
+
+    def _segment(self, k: int) -> Tuple[Tuple[int, int], ...]:
+        """Khoá của hành lang chứa ô hành lang k: hai (nút đầu, lối ra của nút vào hành lang)."""
+        graph = self.graph
+        return tuple(sorted(zip(graph.ends[k].tolist(), graph.ends_exit[k].tolist())))
+
+    def _along(self, start: GridPos, goal: GridPos) -> Optional[Tuple[int, int]]:
+        """start và goal cùng hành lang: (số bước, mã hướng đầu) đi thẳng trong hành lang; None nếu không gặp."""
+        graph = self.graph
+        codes = _CORRIDOR_EXITS[graph.exits[start[1], start[0]]].tolist()
+        for first in codes:
+            x, y = start
+            d = first
+            for steps in range(1, graph.w * graph.h):
+                dx, dy = FLOW_DIRS[d]
+                x, y = x + dx, y + dy
+                if (x, y) == goal:
+                    return steps, first
+                if (x, y) == start or graph.node[y, x] >= 0:
+                    break
+                d = int(CORRIDOR_CONTINUE[graph.exits[y, x], d])
+        return None
+
+    def next_step(self, start: GridPos, goal: GridPos, max_expansions: Optional[int] = None) -> Optional[GridPos]:
+        """Ô kế tiếp từ start (nút hoặc ô hành lang) về goal; start nếu đã tới, None nếu không có đường."""
+        return self.route(start, goal, max_expansions)[0]
+
+    def route(self, start: GridPos, goal: GridPos,
+              max_expansions: Optional[int] = None) -> Tuple[Optional[GridPos], List[int]]:
+        """
+        (ô kế tiếp như next_step, các cửa trên đường theo thứ tự). Vượt giới hạn thì
+        đường chỉ tới cửa gần đích nhất đã mở; tới đó (follow hết cửa) thì tìm tiếp.
+        """
+        if start == goal:
+            return start, []
+        graph = self.graph
+        x, y = start
+        if not (0 <= x < graph.w and 0 <= y < graph.h):
+            return None, []
+        goals = graph._goals(goal)
+        s = int(graph.node[y, x])
+        direct = None
+        if s >= 0:
+            sources = [(s, 0, 0)]
+        else:
+            k = int(graph.corridor[y, x])
+            if k < 0:
+                return None, []
+            kg = int(graph.corridor[goal[1], goal[0]])
+            if kg >= 0 and self._segment(kg) == self._segment(k):
+                direct = self._along(start, goal)
+            # ô hành lang: xuất phát từ hai nút ở hai đầu, bước đầu là lối ra tương ứng
+            sources = [(int(graph.ends[k, j]), int(graph.ends_dist[k, j]), int(_CORRIDOR_EXITS[graph.exits[y, x], j]))
+                       for j in range(2) if graph.ends[k, j] >= 0]
+        if not goals and direct is None:
+            return None, []
+
+        gx, gy = goal
+        xs, ys, sector, local = graph._xs, graph._ys, self._sector, self._local
+        cross, cost = self._cross, graph._cost
+        # nút đích theo khu: [(vị trí trong khu, số bước tới goal, mã hướng ra nếu đứng ngay tại nút)]
+        goal_at: Dict[int, List[Tuple[int, int, int]]] = {}
+        for v, (d, exit_code) in goals.items():
+            goal_at.setdefault(sector[v], []).append((local[v], d, exit_code))
+
+        # (f, g, nút, mã hướng đầu tiên từ start, cửa trước đó); nút -1 là chính goal, cửa -2 là start
+        heap: List[Tuple[int, int, int, int, int]] = []
+        best: Dict[int, int] = {}
+        if direct is not None:
+            # cùng hành lang: đi thẳng tới goal, trừ khi vòng qua hai đầu lại ngắn hơn
+            heap.append((direct[0], direct[0], -1, direct[1], -2))
+
+        def push(v: int, g: int, first: int, prev: int):
+            if g < best.get(v, g + 1):
+                best[v] = g
+                heapq.heappush(heap, (g + abs(xs[v] - gx) + abs(ys[v] - gy), g, v, first, prev))
+
+        # tìm cục bộ trong khu của điểm xuất phát: tới các cửa và nút đích cùng khu
+        for src, g0, first0 in sources:
+            dist, first = self._search(src)
+            home = sector[src]
+            for v in self._gates[home]:
+                if v == src and not first0:
+                    best[v] = 0         # chính start: cạnh ra đã có ở trên và dưới
+                elif v in dist:
+                    push(v, g0 + dist[v], first0 or first[v], -2)
+            for lv, d, exit_code in goal_at.get(home, ()):
+                v = self._members[home][lv]
+                if v in dist:
+                    g = g0 + dist[v] + d
+                    heapq.heappush(heap, (g, g, -1, first0 or first[v] or exit_code, -2))
+            base = 4 * src
+            for j in range(4):
+                v = cross[base + j]
+                if v >= 0:
+                    push(v, g0 + cost[base + j], first0 or j + 1, -2)
+
+        came: Dict[int, int] = {}
+        # cửa đã mở gần đích nhất (theo Manhattan): đích tạm khi vượt giới hạn
+        nearest: Tuple[float, int, int, int] = (float("inf"), 0, 0, -2)
+        limit = self.max_expansions if max_expansions is None else max_expansions
+        gate_no = self._gate_no
+        while heap:
+            f, g, u, first, prev = heapq.heappop(heap)
+            if u < 0:
+                break
+            if u in came or g > best[u]:
+                continue
+            if len(came) >= limit:
+                _, _, first, prev = nearest
+                break
+            came[u] = prev
+            h = f - g
+            if (h, g) < nearest[:2]:
+                nearest = (h, g, first, u)
+            sec = sector[u]
+            rows = self.table(sec)
+            row = rows[local[u]]
+            for lv, d, _ in goal_at.get(sec, ()):
+                # cửa u tới nút đích trong khu: đọc ở hàng của nút đích, cột của u
+                du = rows[lv][gate_no[u]]
+                if du >= 0:
+                    heapq.heappush(heap, (g + du + d, g + du + d, -1, first, u))
+            for v, d in zip(self._gates[sec], row):
+                if d > 0:
+                    push(v, g + d, first, u)
+            base = 4 * u
+            for j in range(4):
+                v = cross[base + j]
+                if v >= 0:
+                    push(v, g + cost[base + j], first, u)
+        else:
+            return None, []     # đã duyệt hết: không có đường
+        if not first:
+            return None, []
+        gates = []
+        while prev >= 0:
+            gates.append(prev)
+            prev = came[prev]
+        gates.reverse()
+        dx, dy = FLOW_DIRS[first]
+        return (x + dx, y + dy), gates
+
+    def follow(self, cell: GridPos, gate: int) -> Optional[GridPos]:
+        """
+        Ô kế tiếp từ nút cell tới cửa gate (cùng khu: tra bảng, khu bên cạnh: hành lang nối thẳng);
+        None nếu cell không phải nút hoặc không tới thẳng được (cần tìm lại đường).
+        """
+        graph = self.graph
+        x, y = cell
+        if not (0 <= x < graph.w and 0 <= y < graph.h):
+            return None
+        u = int(graph.node[y, x])
+        if u < 0 or u == gate:
+            return None
+        link, cost, sector = graph._link, graph._cost, self._sector
+        home = sector[u]
+        rows = self.table(home) if sector[gate] == home else None
+        col = self._gate_no[gate]
+        best_d, best_j = -1, -1
+        for j in range(4):
+            v = link[4 * u + j]
+            if v < 0:
+                continue
+            if v == gate:
+                d = cost[4 * u + j]
+            elif rows is not None and sector[v] == home and rows[self._local[v]][col] >= 0:
+                d = cost[4 * u + j] + rows[self._local[v]][col]
+            else:
+                continue
+            if best_j < 0 or d < best_d:
+                best_d, best_j = d, j
+        if best_j < 0:
+            return None
+        dx, dy = FLOW_DIRS[best_j + 1]
+        return x + dx, y + dy
+
+    def sector_of(self, cell: GridPos) -> Tuple[int, int]:
+        return cell[0] // self.size, cell[1] // self.size
+
+    def table_stats(self) -> Tuple[int, int, int]:
+        """(số bảng khu đã dựng, số khu, tổng số ô trong các bảng đã dựng)."""
+        cells = sum(len(rows) * len(rows[0]) for rows in self._tables.values() if rows)
+        return len(self._tables), len(self._members), cells
+
+
+class SpatialHash:
+    """
+    Băm không gian theo ô: mỗi đối tượng nằm trong bucket của ô chứa tâm nó.
+    move() chỉ đổi bucket khi đối tượng sang ô khác, nên cập nhật mỗi bước rẻ.
+    Truy vấn chỉ duyệt các ô giao với vùng hỏi thay vì mọi đối tượng.
+    Game dùng cho item (ItemsManager); va chạm ghost tra thẳng trên mảng GhostSwarm.
+    """
+
+    def __init__(self, cell_size: float):
+        self.cell = cell_size
+        # dict dùng như tập có thứ tự để xoá O(1) mà vẫn duyệt ổn định
+        self.buckets: Dict[GridPos, Dict[object, None]] = {}
+        self.pos: Dict[object, Tuple[float, float, GridPos]] = {}
+
+    def _key(self, x: float, y: float) -> GridPos:
+        return int(x // self.cell), int(y // self.cell)
+
+    def insert(self, obj, x: float, y: float):
+        key = self._key(x, y)
+        self.pos[obj] = (x, y, key)
+        self.buckets.setdefault(key, {})[obj] = None
+
+    def move(self, obj, x: float, y: float):
+        old = self.pos.get(obj)
+        if old is None:
+            self.insert(obj, x, y)
+            return
+        key = (int(x // self.cell), int(y // self.cell))
+        if key != old[2]:
+            bucket = self.buckets[old[2]]
+            del bucket[obj]
+            if not bucket:
+                del self.buckets[old[2]]
+            self.buckets.setdefault(key, {})[obj] = None
+        self.pos[obj] = (x, y, key)
+
+    def remove(self, obj):
+        old = self.pos.pop(obj, None)
+        if old is not None:
+            bucket = self.buckets[old[2]]
+            del bucket[obj]
+            if not bucket:
+                del self.buckets[old[2]]
+
+    def clear(self):
+        self.buckets.clear()
+        self.pos.clear()
+
+    def __len__(self) -> int:
+        return len(self.pos)
+
+    def __contains__(self, obj) -> bool:
+        return obj in self.pos
+
+    def _cells(self, x0: float, y0: float, x1: float, y1: float) -> List[Dict[object, None]]:
+        buckets = self.buckets
+        if not buckets:
+            return []
+        c = self.cell
+        cx0, cy0 = int(x0 // c), int(y0 // c)
+        cx1, cy1 = int(x1 // c), int(y1 // c)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(buckets):
+            # vùng hỏi phủ nhiều ô hơn số bucket đang có: duyệt bucket thì rẻ hơn
+            return [b for (cx, cy), b in buckets.items() if cx0 <= cx <= cx1 and cy0 <= cy <= cy1]
+        get = buckets.get
+        return [b for cy in range(cy0, cy1 + 1) for cx in range(cx0, cx1 + 1) if (b := get((cx, cy)))]
+
+    def query_radius(self, x: float, y: float, r: float) -> List:
+        """Các đối tượng có tâm cách (x, y) không quá r."""
+        pos = self.pos
+        r2 = r * r
+        out = []
+        for bucket in self._cells(x - r, y - r, x + r, y + r):
+            for obj in bucket:
+                ox, oy, _ = pos[obj]
+                dx = ox - x
+                dy = oy - y
+                if dx * dx + dy * dy <= r2:
+                    out.append(obj)
+        return out
+
+    def query_rect(self, rect) -> List:
+        """Các đối tượng có tâm nằm trong rect (left <= x < right, top <= y < bottom như pygame)."""
+        pos = self.pos
+        left, top, right, bottom = rect.left, rect.top, rect.right, rect.bottom
+        out = []
+        for bucket in self._cells(left, top, right, bottom):
+            for obj in bucket:
+                ox, oy, _ = pos[obj]
+                if left <= ox < right and top <= oy < bottom:
+                    out.append(obj)
+        return out
+
+
 def clamp(value: float, min_value: float, max_value: float) -> float:
     return max(min_value, min(value, max_value))
 
 
+def lerp(a: float, b: float, t: float) -> float:
+    return a + (b - a) * t
+
+
 def approach(current: float, target: float, delta: float) -> float:
     """Di chuyển current tới target tối đa delta."""
     if current < target: